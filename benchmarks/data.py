@@ -0,0 +1,97 @@
+"""Usuarios y actualizaciones sintéticas de Telegram para pruebas de carga"""
+
+import random
+import time
+from typing import Dict, List, Optional
+
+FIRST_NAMES = ["Ana", "Luis", "Sofía", "Mateo", "Valentina", "Diego", "Camila", "Joaquín", "Lucía", "Tomás"]
+
+MEAL_TEXTS = [
+    "desayuné café con leche y dos tostadas con manteca",
+    "almorcé pollo a la plancha con arroz y ensalada",
+    "cené una porción de pizza y una cerveza",
+    "merienda: yogur con granola y una banana",
+    "dos huevos revueltos con pan integral",
+    "milanesa con puré de papas",
+    "ensalada de atún, lechuga, tomate y maíz",
+    "un sándwich de jamón y queso con jugo de naranja",
+    "fideos con salsa bolognesa y queso rallado",
+    "unas galletas de chocolate con té",
+    "pescado al horno con verduras asadas",
+    "empanadas de carne, dos unidades",
+    "avena con leche, frutillas y miel",
+    "tarta de verduras y una manzana",
+    "lentejas guisadas con chorizo",
+]
+
+
+def generate_users(count: int, first_id: int = 900000000) -> List[Dict]:
+    """Genera usuarios sintéticos con IDs deterministas"""
+    return [
+        {
+            "id": first_id + index,
+            "is_bot": False,
+            "first_name": FIRST_NAMES[index % len(FIRST_NAMES)],
+            "username": f"bench_user_{index}"
+        }
+        for index in range(count)
+    ]
+
+
+class UpdateFactory:
+    """Construye actualizaciones de Telegram (formato JSON de la API de Bots)"""
+
+    def __init__(self, seed: int = 42, first_update_id: int = 1):
+        self.random = random.Random(seed)
+        self.next_update_id = first_update_id
+        self.next_message_id: Dict[int, int] = {}
+
+    def _message(self, user: Dict, text: str, entities: Optional[List[Dict]] = None) -> Dict:
+        chat_id = user["id"]
+        message_id = self.next_message_id.get(chat_id, 1)
+        self.next_message_id[chat_id] = message_id + 1
+
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": text
+        }
+        if entities:
+            message["entities"] = entities
+
+        update = {"update_id": self.next_update_id, "message": message}
+        self.next_update_id += 1
+        return update
+
+    def command(self, user: Dict, command: str, args: str = "") -> Dict:
+        """Actualización con un comando (ej. /start)"""
+        text = f"/{command}" + (f" {args}" if args else "")
+        entities = [{"type": "bot_command", "offset": 0, "length": len(command) + 1}]
+        return self._message(user, text, entities)
+
+    def callback(self, user: Dict, data: str, message_id: int = 1) -> Dict:
+        """Actualización de un botón inline (CallbackQuery) sobre un mensaje del bot"""
+        update = {
+            "update_id": self.next_update_id,
+            "callback_query": {
+                "id": str(self.next_update_id),
+                "from": user,
+                "chat_instance": str(user["id"]),
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user["id"], "type": "private", "first_name": user["first_name"]},
+                    "from": {"id": 1, "is_bot": True, "first_name": "NutriBot", "username": "nutribot_fake_bot"},
+                    "text": "..."
+                }
+            }
+        }
+        self.next_update_id += 1
+        return update
+
+    def meal(self, user: Dict, text: Optional[str] = None) -> Dict:
+        """Actualización con un mensaje de comida"""
+        return self._message(user, text or self.random.choice(MEAL_TEXTS))
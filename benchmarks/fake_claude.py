@@ -0,0 +1,193 @@
+"""Servidor falso y determinista de la API de Anthropic (mensajes y Message Batches) con latencia configurable"""
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from benchmarks.http_server import MiniHTTPServer, json_response
+
+FOOD_WORDS = [
+    "café", "leche", "tostadas", "manteca", "pollo", "arroz", "ensalada", "pizza", "cerveza",
+    "yogur", "granola", "banana", "huevos", "pan", "milanesa", "puré", "atún", "lechuga",
+    "tomate", "maíz", "sándwich", "jamón", "queso", "jugo", "fideos", "galletas", "chocolate",
+    "té", "pescado", "verduras", "empanadas", "carne", "avena", "frutillas", "miel", "tarta",
+    "manzana", "lentejas", "chorizo"
+]
+LEVELS = ["bajo", "medio", "alto"]
+
+class LatencyModel:
+    """Distribución de latencias: fixed, uniform o lognormal (mediana y sigma)"""
+
+    def __init__(self, distribution: str = "lognormal", median_ms: float = 800.0, sigma: float = 0.4, seed: int = 7):
+        self.distribution = distribution
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.random = random.Random(seed)
+
+    def sample(self) -> float:
+        """Devuelve una latencia en segundos"""
+        if self.distribution == "fixed":
+            value = self.median_ms
+        elif self.distribution == "uniform":
+            value = self.random.uniform(self.median_ms * (1 - self.sigma), self.median_ms * (1 + self.sigma))
+        else:
+            value = self.random.lognormvariate(math.log(max(self.median_ms, 0.001)), self.sigma)
+        return max(value, 0.0) / 1000
+
+def _prompt_text(payload: Dict) -> str:
+    parts = []
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(block.get("text", "") for block in content or [])
+    return "\n".join(parts)
+
+def fake_analysis(meal_text: str) -> Dict:
+    """Análisis determinista derivado del texto de la comida"""
+    digest = hashlib.sha256(meal_text.encode("utf-8")).digest()
+    lowered = meal_text.lower()
+    return {
+        "foods": [food for food in FOOD_WORDS if food in lowered] or ["comida no identificada"],
+        "nutrients": {
+            nutrient: LEVELS[digest[index] % 3]
+            for index, nutrient in enumerate(["protein", "carbs", "fats", "fiber"])
+        },
+        "calories": 200 + digest[4] * 3,
+        "summary": f"Comida con {len(lowered.split())} componentes descritos."
+    }
+
+def fake_message_response(payload: Dict) -> Dict:
+    """Respuesta con la forma de la API de Mensajes"""
+    prompt = _prompt_text(payload)
+    if "Comida registrada:" in prompt:
+        match = re.search(r"Comida registrada:\s*(.*)", prompt)
+        meal_text = match.group(1).strip() if match else prompt
+        text = "```json\n" + json.dumps(fake_analysis(meal_text), ensure_ascii=False) + "\n```"
+    else:
+        text = (
+            "Tu alimentación reciente es variada. Te recomiendo:\n"
+            "1. Sumar verduras en el almuerzo\n2. Elegir frutas como postre\n3. Tomar más agua"
+        )
+
+    return {
+        "id": "msg_" + hashlib.md5(prompt.encode("utf-8")).hexdigest()[:24],
+        "type": "message",
+        "role": "assistant",
+        "model": payload.get("model", "claude-3-haiku-20240307"),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": max(1, len(prompt) // 4), "output_tokens": max(1, len(text) // 4)}
+    }
+
+def _timestamp(moment: datetime) -> str:
+    return moment.isoformat().replace("+00:00", "Z")
+
+class FakeBatch:
+    """Un lote de mensajes: termina a los batch_seconds y calcula los resultados al terminar"""
+
+    def __init__(self, batch_id: str, requests: List[Dict], batch_seconds: float):
+        self.id = batch_id
+        self.requests = requests
+        self.created_at = datetime.now(timezone.utc)
+        self.ends_at = time.monotonic() + batch_seconds
+        self.results: Optional[List[Dict]] = None
+
+    def ended(self) -> bool:
+        return time.monotonic() >= self.ends_at
+
+    def finish(self, random_source: random.Random, error_rate: float, forced: Dict[str, str]) -> None:
+        if self.results is not None:
+            return
+        self.results = []
+        for request in self.requests:
+            if forced.get(request.get("custom_id")) in ("canceled", "expired"):
+                result = {"type": forced[request["custom_id"]]}
+            elif forced.get(request.get("custom_id")) == "errored" or random_source.random() < error_rate:
+                result = {"type": "errored", "error": {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}}
+            else:
+                result = {"type": "succeeded", "message": fake_message_response(request.get("params", {}))}
+            self.results.append({"custom_id": request.get("custom_id"), "result": result})
+
+    def to_dict(self, base_url: str) -> Dict:
+        ended = self.results is not None
+        counts = {"processing": 0 if ended else len(self.requests), "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}
+        for item in self.results or []:
+            counts[item["result"]["type"]] += 1
+        return {
+            "id": self.id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": counts,
+            "created_at": _timestamp(self.created_at),
+            "expires_at": _timestamp(self.created_at + timedelta(hours=24)),
+            "ended_at": _timestamp(datetime.now(timezone.utc)) if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{base_url}/v1/messages/batches/{self.id}/results" if ended else None
+        }
+
+class FakeAnthropicServer:
+    def __init__(self, latency: LatencyModel, host: str = "127.0.0.1", port: int = 0,
+                 batch_seconds: float = 1.0, batch_error_rate: float = 0.0, seed: int = 7):
+        self.latency = latency
+        self.server = MiniHTTPServer(self._handle, host, port)
+        self.requests = 0
+        self.batch_seconds = batch_seconds
+        self.batch_error_rate = batch_error_rate
+        self.batches: Dict[str, FakeBatch] = {}
+        # Resultado fijo de algunos elementos por custom_id ("errored", "canceled" o "expired")
+        self.batch_results: Dict[str, str] = {}
+        self.random = random.Random(seed)
+
+    async def start(self) -> None:
+        await self.server.start()
+
+    async def stop(self) -> None:
+        await self.server.stop()
+
+    @property
+    def base_url(self) -> str:
+        """Valor para ANTHROPIC_BASE_URL"""
+        return self.server.url
+
+    async def _handle(self, http_method: str, path: str, headers: Dict[str, str], body: bytes):
+        route = path.split("?", 1)[0].rstrip("/")
+        if http_method == "POST" and route == "/v1/messages":
+            self.requests += 1
+            payload = json.loads(body or b"{}")
+            await asyncio.sleep(self.latency.sample())
+            return json_response(fake_message_response(payload))
+
+        if route.startswith("/v1/messages/batches"):
+            return self._handle_batches(http_method, route[len("/v1/messages/batches"):].strip("/").split("/"), body)
+
+        return json_response({"type": "error", "error": {"type": "not_found_error", "message": route}}, 404)
+
+    def _handle_batches(self, http_method: str, parts: List[str], body: bytes):
+        """POST /v1/messages/batches, GET /v1/messages/batches/{id} y GET .../{id}/results"""
+        if http_method == "POST" and parts == [""]:
+            payload = json.loads(body or b"{}")
+            batch_id = "msgbatch_" + hashlib.md5(f"{len(self.batches)}:{len(body)}".encode("utf-8")).hexdigest()[:24]
+            self.batches[batch_id] = FakeBatch(batch_id, payload.get("requests", []), self.batch_seconds)
+            return json_response(self.batches[batch_id].to_dict(self.base_url))
+
+        batch = self.batches.get(parts[0])
+        if http_method != "GET" or batch is None:
+            return json_response({"type": "error", "error": {"type": "not_found_error", "message": "/".join(parts)}}, 404)
+        if batch.ended():
+            batch.finish(self.random, self.batch_error_rate, self.batch_results)
+        if parts[1:] == ["results"]:
+            if batch.results is None:
+                return json_response({"type": "error", "error": {"type": "invalid_request_error", "message": "Batch in progress"}}, 400)
+            lines = "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in batch.results)
+            return 200, {"Content-Type": "application/binary"}, lines.encode("utf-8")
+        return json_response(batch.to_dict(self.base_url))
@@ -0,0 +1,250 @@
+"""API de Bots de Telegram falsa y emisor de actualizaciones al webhook para medir la latencia del bot"""
+
+import argparse
+import asyncio
+import json
+import re
+import statistics
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional
+from urllib.parse import parse_qs
+
+import httpx
+
+from benchmarks.data import UpdateFactory, generate_users
+from benchmarks.http_server import MiniHTTPServer, json_response
+
+# Métodos cuya llamada cuenta como respuesta visible para el usuario
+REPLY_METHODS = {"sendMessage", "editMessageText", "sendDocument"}
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "NutriBot", "username": "nutribot_fake_bot"}
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_report(latencies: List[float]) -> Dict[str, float]:
+    """Resume una lista de latencias (en segundos) en milisegundos"""
+    return {
+        "count": len(latencies),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0
+    }
+
+
+class FakeBotAPI:
+    """Servidor que imita la API de Bots y registra las respuestas del bot"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081):
+        self.server = MiniHTTPServer(self._handle, host, port)
+        self.calls: Counter = Counter()
+        self.latencies: List[float] = []
+        self.webhook_registered = asyncio.Event()
+        self.webhook_url: Optional[str] = None
+        self._pending: Dict[int, Deque[float]] = {}
+        self._replied = asyncio.Condition()
+        self._next_message_id = 1
+
+    async def start(self) -> None:
+        await self.server.start()
+
+    async def stop(self) -> None:
+        await self.server.stop()
+
+    @property
+    def base_url(self) -> str:
+        """Valor para TELEGRAM_BASE_URL"""
+        return f"{self.server.url}/bot"
+
+    def mark_sent(self, chat_id: int) -> None:
+        """Registra que se envió una actualización al bot para ese chat"""
+        self._pending.setdefault(chat_id, deque()).append(time.perf_counter())
+
+    @property
+    def pending_count(self) -> int:
+        return sum(len(queue) for queue in self._pending.values())
+
+    async def wait_for_replies(self, timeout: float) -> bool:
+        """Espera a que todas las actualizaciones enviadas tengan respuesta"""
+        async def _wait():
+            async with self._replied:
+                await self._replied.wait_for(lambda: self.pending_count == 0)
+        try:
+            await asyncio.wait_for(_wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def wait_for_chat(self, chat_id: int, timeout: float) -> bool:
+        """Espera a que el bot responda todas las actualizaciones enviadas a un chat"""
+        async def _wait():
+            async with self._replied:
+                await self._replied.wait_for(lambda: not self._pending.get(chat_id))
+        try:
+            await asyncio.wait_for(_wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            self._pending.pop(chat_id, None)
+            return False
+
+    def _parse_params(self, headers: Dict[str, str], body: bytes) -> Dict:
+        content_type = headers.get("content-type", "")
+        if not body:
+            return {}
+        if content_type.startswith("application/json"):
+            return json.loads(body)
+        if content_type.startswith("multipart/form-data"):
+            match = re.search(rb'name="chat_id"\r\n\r\n(-?\d+)', body)
+            return {"chat_id": match.group(1).decode()} if match else {}
+        return {name: values[0] for name, values in parse_qs(body.decode("utf-8")).items()}
+
+    def _message(self, chat_id: int, text: str = "") -> Dict:
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text
+        }
+
+    async def _handle(self, http_method: str, path: str, headers: Dict[str, str], body: bytes):
+        method = path.rstrip("/").rsplit("/", 1)[-1]
+        params = self._parse_params(headers, body)
+        self.calls[method] += 1
+
+        if method == "getMe":
+            return json_response({"ok": True, "result": BOT_USER})
+
+        if method == "setWebhook":
+            self.webhook_url = params.get("url")
+            self.webhook_registered.set()
+            return json_response({"ok": True, "result": True})
+
+        if method == "getUpdates":
+            # Long polling sin actualizaciones: evitar un bucle activo del bot
+            await asyncio.sleep(min(float(params.get("timeout", 1) or 1), 1.0))
+            return json_response({"ok": True, "result": []})
+
+        if method in REPLY_METHODS:
+            chat_id = int(params.get("chat_id", 0) or 0)
+            queue = self._pending.get(chat_id)
+            if queue:
+                self.latencies.append(time.perf_counter() - queue.popleft())
+                async with self._replied:
+                    self._replied.notify_all()
+            return json_response({"ok": True, "result": self._message(chat_id, params.get("text", ""))})
+
+        return json_response({"ok": True, "result": True})
+
+
+class UpdateSender:
+    """Envía actualizaciones sintéticas al webhook del bot"""
+
+    def __init__(self, webhook_url: str, api: FakeBotAPI, secret_token: str = "", concurrency: int = 50):
+        self.webhook_url = webhook_url
+        self.api = api
+        self.secret_token = secret_token
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.errors = 0
+        self.client = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        )
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    async def send(self, update: Dict) -> None:
+        headers = {}
+        if self.secret_token:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.secret_token
+
+        async with self.semaphore:
+            self.api.mark_sent(update["message"]["chat"]["id"])
+            try:
+                response = await self.client.post(self.webhook_url, json=update, headers=headers)
+                if response.status_code != 200:
+                    self.errors += 1
+            except httpx.HTTPError:
+                self.errors += 1
+
+    async def send_all(self, updates: List[Dict]) -> float:
+        """Envía todas las actualizaciones y devuelve los segundos empleados"""
+        started = time.perf_counter()
+        await asyncio.gather(*(self.send(update) for update in updates))
+        return time.perf_counter() - started
+
+
+async def run_load(args: argparse.Namespace) -> Dict:
+    api = FakeBotAPI(port=args.api_port)
+    await api.start()
+    print(f"API falsa escuchando. Inicia el bot con TELEGRAM_BASE_URL={api.base_url}")
+
+    try:
+        await asyncio.wait_for(api.webhook_registered.wait(), args.startup_timeout)
+    except asyncio.TimeoutError:
+        await api.stop()
+        raise SystemExit("El bot no registró su webhook a tiempo")
+
+    webhook_url = args.webhook_url or api.webhook_url
+    sender = UpdateSender(webhook_url, api, args.secret, args.concurrency)
+    factory = UpdateFactory(seed=args.seed)
+    users = generate_users(args.users)
+
+    try:
+        # Registrar a los usuarios sintéticos (no forma parte de la medición)
+        await sender.send_all([factory.command(user, "start") for user in users])
+        await api.wait_for_replies(args.timeout)
+        api.latencies.clear()
+
+        updates = [factory.meal(user) for _ in range(args.messages) for user in users]
+        started = time.perf_counter()
+        send_seconds = await sender.send_all(updates)
+        completed = await api.wait_for_replies(args.timeout)
+        total_seconds = time.perf_counter() - started
+    finally:
+        await sender.close()
+        await api.stop()
+
+    return {
+        "updates": len(updates),
+        "completed": completed,
+        "unanswered": api.pending_count,
+        "send_errors": sender.errors,
+        "ingest_per_second": round(len(updates) / send_seconds, 2) if send_seconds else 0.0,
+        "replies_per_second": round(len(api.latencies) / total_seconds, 2) if total_seconds else 0.0,
+        "latency": latency_report(api.latencies),
+        "api_calls": dict(api.calls)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Emisor de actualizaciones sintéticas para NutriBot")
+    parser.add_argument("--api-port", type=int, default=8081, help="Puerto de la API de Bots falsa")
+    parser.add_argument("--webhook-url", default="", help="URL del webhook (por defecto la que registre el bot)")
+    parser.add_argument("--secret", default="", help="Valor de WEBHOOK_SECRET_TOKEN del bot")
+    parser.add_argument("--users", type=int, default=20, help="Cantidad de usuarios sintéticos")
+    parser.add_argument("--messages", type=int, default=5, help="Mensajes de comida por usuario")
+    parser.add_argument("--concurrency", type=int, default=50, help="Peticiones simultáneas al webhook")
+    parser.add_argument("--timeout", type=float, default=300, help="Segundos máximos de espera por respuestas")
+    parser.add_argument("--startup-timeout", type=float, default=120, help="Segundos de espera al arranque del bot")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
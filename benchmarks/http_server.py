@@ -0,0 +1,79 @@
+"""Servidor HTTP/1.1 mínimo sobre asyncio para los dobles de prueba (Telegram y Claude falsos)"""
+
+import asyncio
+import json
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+Response = Tuple[int, Dict[str, str], bytes]
+RequestHandler = Callable[[str, str, Dict[str, str], bytes], Awaitable[Response]]
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 500: "Internal Server Error"}
+
+
+def json_response(payload, status: int = 200) -> Response:
+    """Construye una respuesta JSON"""
+    return status, {"Content-Type": "application/json"}, json.dumps(payload).encode("utf-8")
+
+
+class MiniHTTPServer:
+    def __init__(self, handler: RequestHandler, host: str = "127.0.0.1", port: int = 0):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """Inicia el servidor; si port es 0 se asigna uno libre"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Detiene el servidor"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Atiende peticiones en una conexión keep-alive hasta que el cliente la cierre"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode("latin-1").split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+
+                body = b""
+                length = int(headers.get("content-length", "0"))
+                if length:
+                    body = await reader.readexactly(length)
+
+                try:
+                    status, response_headers, response_body = await self.handler(method, path, headers, body)
+                except Exception as e:
+                    status, response_headers, response_body = json_response({"ok": False, "description": str(e)}, 500)
+
+                head = f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'OK')}\r\n"
+                response_headers = {**response_headers, "Content-Length": str(len(response_body))}
+                head += "".join(f"{name}: {value}\r\n" for name, value in response_headers.items())
+                writer.write(head.encode("latin-1") + b"\r\n" + response_body)
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,253 @@
+"""
+Benchmark de NutriBot con los handlers reales.
+
+Levanta una API de Bots falsa, un servidor de Anthropic falso y determinista, y usa
+un mongod local (--db mongo) o un sustituto embebido (--db mock, requiere mongomock).
+Cada usuario sintético recorre un guion de pasos (comidas, /resumen, /recomendacion
+y las conversaciones de preferencias y recordatorios) esperando la respuesta de cada
+paso antes del siguiente. Se informan throughput, latencias p50/p95/p99 por paso y
+uso de recursos, y el resultado se guarda para compararlo con una línea base.
+
+Uso:
+    python -m benchmarks.run --users 50 --steps 20 --claude-latency-ms 800
+    python -m benchmarks.run --save-baseline
+    python -m benchmarks.run --baseline benchmarks/results/baseline.json
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import resource
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.data import UpdateFactory, generate_users
+from benchmarks.fake_claude import FakeAnthropicServer, LatencyModel
+from benchmarks.fake_telegram import FakeBotAPI, latency_report
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# Peso relativo de cada tipo de paso en el guion de un usuario
+STEP_WEIGHTS = [
+    ("meal", 70),
+    ("summary", 10),
+    ("recommendation", 5),
+    ("preferences", 8),
+    ("reminders", 7)
+]
+
+def _configure_environment(args: argparse.Namespace, telegram: FakeBotAPI, claude: FakeAnthropicServer) -> None:
+    """Variables de entorno del bot: deben fijarse antes de importar main"""
+    os.environ.update({
+        "TELEGRAM_TOKEN": "123456:BENCHMARK",
+        "ANTHROPIC_API_KEY": "sk-ant-benchmark",
+        "TELEGRAM_BASE_URL": telegram.base_url,
+        "ANTHROPIC_BASE_URL": claude.base_url,
+        "ANTHROPIC_MAX_RETRIES": "0",
+        "MONGODB_URI": args.mongodb_uri,
+        "BOT_MODE": "polling",
+        "MEAL_BURST_WINDOW_SECONDS": str(args.burst_window),
+        "CONCURRENT_UPDATES": str(args.concurrency),
+        "REPLY_TYPING_ACTION": "true",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING")
+    })
+
+    if args.db == "mock":
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("--db mock requiere el paquete mongomock (pip install mongomock)")
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+
+def _build_script(factory: UpdateFactory, user: Dict, steps: int, rng: random.Random) -> List[Tuple[str, List[Dict]]]:
+    """Guion de un usuario: lista de (nombre del paso, actualizaciones del paso)"""
+    names = [name for name, _ in STEP_WEIGHTS]
+    weights = [weight for _, weight in STEP_WEIGHTS]
+    script = []
+    for _ in range(steps):
+        step = rng.choices(names, weights)[0]
+        if step == "meal":
+            script.append(("meal", [factory.meal(user)]))
+        elif step == "summary":
+            script.append(("summary", [factory.command(user, "resumen")]))
+        elif step == "recommendation":
+            script.append(("recommendation", [factory.command(user, "recomendacion")]))
+        elif step == "preferences":
+            script.append(("preferences", [
+                factory.command(user, "preferencias"),
+                factory.callback(user, "pref_restrictions"),
+                factory.callback(user, rng.choice(["rest_vegetariano", "rest_sin_gluten", "rest_keto"])),
+                factory.callback(user, "rest_save")
+            ]))
+        else:
+            script.append(("reminders", [
+                factory.command(user, "recordatorios"),
+                factory.callback(user, "rem_times"),
+                factory.callback(user, rng.choice(["time_08:00", "time_13:00", "time_20:00"])),
+                factory.callback(user, "time_save")
+            ]))
+    return script
+
+async def _run_user(application, telegram: FakeBotAPI, user: Dict, script, latencies: Dict[str, List[float]],
+                    failures: Dict[str, int], timeout: float) -> None:
+    from telegram import Update
+
+    for step, updates in script:
+        for data in updates:
+            telegram.mark_sent(user["id"])
+            started = time.perf_counter()
+            await application.update_queue.put(Update.de_json(data, application.bot))
+            if await telegram.wait_for_chat(user["id"], timeout):
+                latencies.setdefault(step, []).append(time.perf_counter() - started)
+            else:
+                failures[step] = failures.get(step, 0) + 1
+
+def _resource_snapshot() -> Dict[str, float]:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {"cpu_seconds": usage.ru_utime + usage.ru_stime, "max_rss_mb": usage.ru_maxrss / 1024}
+
+async def run_benchmark(args: argparse.Namespace) -> Dict:
+    telegram = FakeBotAPI(port=0)
+    claude = FakeAnthropicServer(LatencyModel(args.claude_distribution, args.claude_latency_ms, args.claude_sigma, args.seed))
+    await telegram.start()
+    await claude.start()
+    _configure_environment(args, telegram, claude)
+
+    bot_main = importlib.import_module("main")
+    application = bot_main.build_application()
+
+    users = generate_users(args.users)
+    factory = UpdateFactory(seed=args.seed)
+    rng = random.Random(args.seed)
+    latencies: Dict[str, List[float]] = {}
+    failures: Dict[str, int] = {}
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    try:
+        # Registro de los usuarios (no se mide)
+        await asyncio.gather(*(
+            _run_user(application, telegram, user, [("start", [factory.command(user, "start")])], {}, failures, args.timeout)
+            for user in users
+        ))
+
+        scripts = [_build_script(factory, user, args.steps, rng) for user in users]
+        resources_before = _resource_snapshot()
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            _run_user(application, telegram, user, script, latencies, failures, args.timeout)
+            for user, script in zip(users, scripts)
+        ))
+        elapsed = time.perf_counter() - started
+        resources_after = _resource_snapshot()
+    finally:
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await claude.stop()
+        await telegram.stop()
+
+    total_updates = sum(len(values) for values in latencies.values())
+    all_latencies = [value for values in latencies.values() for value in values]
+    meals = len(latencies.get("meal", []))
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "users": args.users,
+            "steps": args.steps,
+            "concurrency": args.concurrency,
+            "db": args.db,
+            "claude_latency": {
+                "distribution": args.claude_distribution,
+                "median_ms": args.claude_latency_ms,
+                "sigma": args.claude_sigma
+            },
+            "burst_window": args.burst_window,
+            "seed": args.seed
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "updates_per_second": round(total_updates / elapsed, 2) if elapsed else 0.0,
+        "meals_per_second": round(meals / elapsed, 2) if elapsed else 0.0,
+        "latency": latency_report(all_latencies),
+        "latency_by_step": {step: latency_report(values) for step, values in sorted(latencies.items())},
+        "failures": failures,
+        "resources": {
+            "cpu_seconds": round(resources_after["cpu_seconds"] - resources_before["cpu_seconds"], 3),
+            "cpu_percent": round(
+                100 * (resources_after["cpu_seconds"] - resources_before["cpu_seconds"]) / elapsed, 1
+            ) if elapsed else 0.0,
+            "max_rss_mb": round(resources_after["max_rss_mb"], 1)
+        },
+        "claude_requests": claude.requests,
+        "telegram_calls": dict(telegram.calls)
+    }
+
+def compare(result: Dict, baseline: Dict) -> List[str]:
+    """Líneas con la variación de cada métrica respecto de la línea base"""
+    def delta(current: float, previous: float) -> str:
+        if not previous:
+            return "n/a"
+        return f"{(current - previous) / previous:+.1%}"
+
+    lines = [
+        f"updates/s: {result['updates_per_second']} (base {baseline['updates_per_second']}, "
+        f"{delta(result['updates_per_second'], baseline['updates_per_second'])})"
+    ]
+    for step, report in result["latency_by_step"].items():
+        base_report = baseline.get("latency_by_step", {}).get(step)
+        if not base_report:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            lines.append(
+                f"{step} {key}: {report[key]} (base {base_report[key]}, {delta(report[key], base_report[key])})"
+            )
+    return lines
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de NutriBot con Telegram y Claude falsos")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=10, help="Pasos por usuario")
+    parser.add_argument("--concurrency", type=int, default=32, help="CONCURRENT_UPDATES del bot")
+    parser.add_argument("--db", choices=["mongo", "mock"], default="mongo")
+    parser.add_argument("--mongodb-uri", default=os.getenv("BENCH_MONGODB_URI", "mongodb://localhost:27017/nutribot_bench"))
+    parser.add_argument("--claude-distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--claude-latency-ms", type=float, default=800.0, help="Latencia mediana de Claude")
+    parser.add_argument("--claude-sigma", type=float, default=0.4)
+    parser.add_argument("--burst-window", type=float, default=0.0, help="MEAL_BURST_WINDOW_SECONDS del bot")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Espera máxima por respuesta")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="", help="Archivo de resultados (por defecto benchmarks/results/)")
+    parser.add_argument("--baseline", default="", help="Resultados previos con los que comparar")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar también como línea base")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = Path(args.output) if args.output else RESULTS_DIR / f"run-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.save_baseline:
+        (RESULTS_DIR / "baseline.json").write_text(json.dumps(result, indent=2, ensure_ascii=False))
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"\nResultados guardados en {output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        print("\nComparación con la línea base:")
+        for line in compare(result, baseline):
+            print(f"  {line}")
+
+if __name__ == "__main__":
+    sys.exit(main())
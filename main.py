@@ -1,16 +1,29 @@
-import logging
+from src.utils.startup import startup_timer
+
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from telegram import Update
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, filters,
-    ConversationHandler, CallbackQueryHandler
+    ConversationHandler, CallbackQueryHandler, TypeHandler
 )
 
-from src.config.settings import TELEGRAM_TOKEN
+from src.config.settings import (
+    validate_settings, TELEGRAM_TOKEN, TELEGRAM_BASE_URL, BOT_MODE,
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH,
+    WEBHOOK_SECRET_TOKEN, WEBHOOK_MAX_CONNECTIONS, CONCURRENT_UPDATES, METRICS_PORT, BOT_WORKERS,
+    PRECOMPUTE_ENABLED
+)
 from src.handlers.command_handlers import (
     start_command, help_command, preferences_command,
-    summary_command, recommendation_command
+    summary_command, week_command, month_command, recommendation_command, export_command
+)
+from src.handlers.admin_handlers import profile_command
+from src.handlers.import_handlers import import_command, handle_import_document
+from src.handlers.message_handlers import (
+    handle_message, flush_pending_meals, meal_buffer, persist_unprocessed_update, resume_pending_meals,
+    run_deferred_analyses
 )
-from src.handlers.message_handlers import handle_message
 from src.handlers.preference_handlers import (
     preference_selection, handle_restriction_selection, handle_goal_selection,
     SELECTING_PREFERENCE, ADDING_RESTRICTION, ADDING_GOAL
@@ -19,27 +32,146 @@ from src.handlers.reminder_handlers import (
     reminders_command, handle_reminder_action, handle_reminder_times,
     SELECTING_REMINDER_ACTION, SETTING_REMINDER_TIMES
 )
-from src.services.scheduler_service import SchedulerService
-from src.utils.logger import log_info
+from src.services.container import services
+from src.services.shutdown import ShutdownCoordinator
+from src.services.admission import admission
+from src.services.precompute import precomputer
+from src.services.import_service import import_analyzer
+from src.services.batch_analysis import batch_analyzer
+from src.services.dedup import deduplicator, drop_duplicate_updates
+from src.cluster.dispatcher import Dispatcher, build_dispatcher_application
+from src.services.http_clients import build_telegram_request, log_connection_stats, connection_stats
+from src.utils.logger import log_info, configure_logging
+from src.utils.update_processor import ChatSequentialUpdateProcessor
+from src.utils.metrics import registry, start_metrics_server
 
-def main() -> None:
-    """Función principal que inicia el bot"""
-    # Configurar logging
-    logging.basicConfig(
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        level=logging.INFO
+startup_timer.mark("imports")
+
+def _register_runtime_metrics(application: Application) -> None:
+    """Registra los gauges de colas y conexiones que se calculan al exponer las métricas"""
+    processor = application.update_processor
+    registry.gauge(
+        "nutribot_updates_in_progress", "Actualizaciones procesándose en este momento",
+        lambda: processor.current_concurrent_updates
+    )
+    registry.gauge(
+        "nutribot_updates_queued", "Actualizaciones en curso o esperando su turno en su chat",
+        lambda: processor.waiting_updates
+    )
+    registry.gauge(
+        "nutribot_update_queue_size", "Actualizaciones recibidas pendientes de despachar",
+        lambda: application.update_queue.qsize()
+    )
+    registry.gauge(
+        "nutribot_meal_bursts_pending", "Usuarios con mensajes de comida esperando a agruparse",
+        lambda: meal_buffer.pending_count
+    )
+    registry.gauge(
+        "nutribot_http_requests", "Peticiones HTTP salientes por cliente",
+        lambda: {(client,): stats["requests"] for client, stats in connection_stats.snapshot().items()},
+        labels=["client"]
+    )
+    registry.gauge(
+        "nutribot_http_connections_opened", "Conexiones HTTP nuevas abiertas por cliente",
+        lambda: {(client,): stats["connections"] for client, stats in connection_stats.snapshot().items()},
+        labels=["client"]
+    )
+
+async def post_init(application: Application) -> None:
+    """Prepara el event loop antes de empezar a recibir actualizaciones"""
+    # Las llamadas bloqueantes (MongoDB, Claude) corren en hilos: el pool debe acompañar la concurrencia
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=CONCURRENT_UPDATES + 4, thread_name_prefix="nutribot")
     )
     
-    log_info("Iniciando NutriBot...")
+    # Servicios (MongoDB, Claude, planificador): se crean aquí y no al importar los módulos
+    with startup_timer.phase("services"):
+        await services.initialize(application.bot)
+    
+    # Métricas en formato Prometheus
+    _register_runtime_metrics(application)
+    metrics_port = application.bot_data.get("metrics_port", METRICS_PORT)
+    if metrics_port:
+        application.bot_data["metrics_server"] = start_metrics_server(metrics_port)
+    
+    # Apagado ordenado (SIGTERM/SIGINT) y comidas que quedaron pendientes en el apagado anterior
+    coordinator = ShutdownCoordinator(application, meal_buffer, persist_unprocessed_update)
+    application.bot_data["shutdown"] = coordinator
+    if application.updater:
+        coordinator.install_signal_handlers()
+    coordinator.track(asyncio.create_task(resume_pending_meals(application.bot)))
+    
+    # Control de admisión: retraso del event loop y comidas con análisis preliminar por completar
+    admission.attach(application)
+    coordinator.track_periodic(asyncio.create_task(admission.monitor()))
+    coordinator.track_periodic(asyncio.create_task(run_deferred_analyses(application.bot)))
+    coordinator.track_periodic(asyncio.create_task(import_analyzer.run()))
+    
+    # Precálculo en horas de poca actividad (en modo multiproceso solo lo hace el worker 0)
+    if PRECOMPUTE_ENABLED and application.bot_data.get("worker_index", 0) == 0:
+        coordinator.track_periodic(asyncio.create_task(precomputer.run()))
     
-    # Crear la aplicación
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    # Resultados de los lotes de análisis (importaciones y scripts/reanalyze_meals.py --batch)
+    if application.bot_data.get("worker_index", 0) == 0:
+        coordinator.track_periodic(asyncio.create_task(batch_analyzer.run()))
+    
+    startup_timer.log()
+
+async def post_shutdown(application: Application) -> None:
+    """Libera recursos y registra estadísticas al apagar el bot"""
+    log_connection_stats()
+    
+    coordinator = application.bot_data.get("shutdown")
+    if coordinator:
+        coordinator.cancel_periodic()
+    
+    await services.close()
+    
+    metrics_server = application.bot_data.pop("metrics_server", None)
+    if metrics_server:
+        metrics_server.shutdown()
+
+def build_application(receive_updates: bool = True) -> Application:
+    """
+    Crea la aplicación con todos sus manejadores registrados (sin iniciarla).
+    Con receive_updates=False no tiene Updater: las actualizaciones se ponen en su update_queue
+    (workers del modo multiproceso).
+    """
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .base_url(TELEGRAM_BASE_URL)
+        .request(build_telegram_request("api"))
+        .concurrent_updates(ChatSequentialUpdateProcessor(CONCURRENT_UPDATES))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if receive_updates:
+        builder = builder.get_updates_request(build_telegram_request("updates"))
+    else:
+        builder = builder.updater(None)
+    application = builder.build()
+    
+    # Las actualizaciones reenviadas por Telegram se descartan antes que nada; cada una se
+    # registra como procesada cuando termina (o cuando se guarda su comida, si va en una ráfaga)
+    application.add_handler(TypeHandler(Update, drop_duplicate_updates), group=-2)
+    application.update_processor.done_callbacks.append(deduplicator.mark_done)
+    
+    # Antes de cualquier comando se procesan las comidas agrupadas pendientes del usuario
+    application.add_handler(MessageHandler(filters.COMMAND, flush_pending_meals), group=-1)
     
     # Registrar manejadores de comandos simples
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("ayuda", help_command))
     application.add_handler(CommandHandler("resumen", summary_command))
+    application.add_handler(CommandHandler("semana", week_command))
+    application.add_handler(CommandHandler("mes", month_command))
     application.add_handler(CommandHandler("recomendacion", recommendation_command))
+    application.add_handler(CommandHandler("exportar", export_command))
+    application.add_handler(CommandHandler("importar", import_command))
+    
+    # Comandos de administración (solo ADMIN_USER_IDS)
+    application.add_handler(CommandHandler("perfil", profile_command))
     
     # Manejador de conversación para preferencias
     preferences_conv_handler = ConversationHandler(
@@ -66,10 +198,45 @@ def main() -> None:
     
     # Registrar manejador de mensajes de texto
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(MessageHandler(filters.Document.ALL, handle_import_document))
+    
+    return application
+
+def main() -> None:
+    """Función principal que inicia el bot"""
+    # Configurar logging (JSON/texto, escritura en segundo plano)
+    configure_logging()
+    
+    log_info("Iniciando NutriBot...")
+    validate_settings()
+    
+    # Crear la aplicación: con varios workers este proceso solo recibe y reparte las actualizaciones
+    with startup_timer.phase("build_application"):
+        if BOT_WORKERS > 1:
+            dispatcher = Dispatcher(BOT_WORKERS)
+            dispatcher.start()
+            application = build_dispatcher_application(dispatcher)
+        else:
+            application = build_application()
+    
+    # Las señales de apagado las maneja ShutdownCoordinator (ver post_init); el dispatcher usa las de PTB
+    run_options = {"stop_signals": None} if BOT_WORKERS == 1 else {}
     
     # Iniciar el bot
-    log_info("NutriBot está en funcionamiento!")
-    application.run_polling()
+    if BOT_MODE == "webhook":
+        log_info(f"NutriBot está en funcionamiento en modo webhook ({WEBHOOK_LISTEN}:{WEBHOOK_PORT})!")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET_TOKEN or None,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            **run_options
+        )
+    else:
+        log_info("NutriBot está en funcionamiento!")
+        application.run_polling(**run_options)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
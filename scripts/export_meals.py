@@ -0,0 +1,48 @@
+"""
+Exporta el historial de comidas de un usuario a CSV o JSONL.
+
+Lee las comidas por lotes de un cursor y escribe cada fila en cuanto la convierte
+(con gzip opcional), así que la memoria usada no depende del tamaño del historial.
+Sin --output escribe en la salida estándar.
+
+Uso:
+    python -m scripts.export_meals 123456789 --format jsonl --gzip --output usuario.jsonl.gz
+    python -m scripts.export_meals 123456789 > usuario.csv
+"""
+
+import argparse
+import sys
+
+from src.config.settings import EXPORT_BATCH_SIZE
+from src.services.container import services
+from src.services.export_service import EXPORT_FORMATS, write_export
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("telegram_id", type=int)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--gzip", action="store_true", help="Comprimir la salida con gzip")
+    parser.add_argument("--output", help="Archivo de salida (por defecto, la salida estándar)")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    user = services.db.get_user(args.telegram_id)
+    if user is None:
+        print(f"No existe el usuario {args.telegram_id}", file=sys.stderr)
+        return 1
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        rows = write_export(
+            services.db.iter_user_meals(args.telegram_id, args.batch_size), output, args.format, user.timezone, args.gzip
+        )
+    finally:
+        if args.output:
+            output.close()
+        services.db.close()
+
+    print(f"Se exportaron {rows} comidas del usuario {args.telegram_id}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Migra las comidas guardadas con los niveles de nutrientes como texto.
+
+Convierte analysis.nutrients (y calories/grams si los hay) al campo numérico
+nutrients, guarda en nutrients_raw los textos que no eran el nombre canónico del
+nivel y los quita del análisis. Es idempotente y se puede interrumpir: solo toma las
+comidas que todavía no tienen el campo nutrients.
+
+Uso:
+    python -m scripts.migrate_nutrient_levels --dry-run
+    python -m scripts.migrate_nutrient_levels --batch-size 500
+"""
+
+import argparse
+import sys
+from collections import Counter
+from typing import Dict, List
+
+import bson
+from pymongo import UpdateOne
+
+from src.models.nutrients import UNKNOWN, encode_analysis
+from src.services.container import services
+
+def _flush(collection, operations: List[UpdateOne], dry_run: bool) -> int:
+    if not operations:
+        return 0
+    if dry_run:
+        return len(operations)
+    return collection.bulk_write(operations, ordered=False).modified_count
+
+def migrate(collection, batch_size: int, dry_run: bool) -> Dict:
+    stats = {"meals": 0, "migrated": 0, "bytes_before": 0, "bytes_after": 0}
+    unrecognized: Counter = Counter()
+    operations: List[UpdateOne] = []
+
+    cursor = collection.find({"nutrients": {"$exists": False}}, {"analysis": 1}).batch_size(batch_size)
+    for document in cursor:
+        old_analysis = document.get("analysis") or {}
+        analysis, nutrients, nutrients_raw = encode_analysis(old_analysis)
+        fields = {"analysis": analysis, "nutrients": nutrients}
+        if nutrients_raw:
+            fields["nutrients_raw"] = nutrients_raw
+        for nutrient, text in nutrients_raw.items():
+            if nutrients.get(nutrient) == UNKNOWN:
+                unrecognized[text] += 1
+
+        stats["meals"] += 1
+        stats["bytes_before"] += len(bson.encode({"analysis": old_analysis}))
+        stats["bytes_after"] += len(bson.encode(fields))
+        # El filtro repite la condición: si otro proceso ya la migró, no se pisa
+        operations.append(UpdateOne({"_id": document["_id"], "nutrients": {"$exists": False}}, {"$set": fields}))
+        if len(operations) >= batch_size:
+            stats["migrated"] += _flush(collection, operations, dry_run)
+            operations = []
+            print(f"  {stats['meals']} comidas procesadas")
+
+    stats["migrated"] += _flush(collection, operations, dry_run)
+    stats["unrecognized"] = unrecognized.most_common(20)
+    return stats
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Solo calcular lo que cambiaría")
+    args = parser.parse_args()
+
+    stats = migrate(services.db.meals_collection, args.batch_size, args.dry_run)
+    services.db.close()
+
+    action = "Se migrarían" if args.dry_run else "Se migraron"
+    print(f"{action} {stats['migrated']} de {stats['meals']} comidas")
+    if stats["meals"]:
+        print(f"Análisis y nutrientes: {stats['bytes_before']} -> {stats['bytes_after']} bytes")
+    if stats["unrecognized"]:
+        print("Niveles no reconocidos (cuentan como el valor por defecto):")
+        for text, count in stats["unrecognized"]:
+            print(f"  {text!r}: {count}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Reanaliza con Claude las comidas con un análisis fallido, sin análisis o hecho con una
+versión anterior del prompt (ANALYSIS_PROMPT_VERSION en src/services/claude_service.py).
+
+Motivos (--only, separados por comas; por defecto unanalyzed,errored):
+    unanalyzed  comidas sin análisis completo que ya no están en las colas automáticas
+    errored     comidas cuyo análisis guardó un error de Claude o una respuesta sin interpretar
+    stale       comidas analizadas con una versión anterior del prompt (no las importadas con análisis)
+
+Las llamadas se hacen con una concurrencia acotada y un máximo por minuto. El progreso
+se guarda en el checkpoint tras cada lote: si el trabajo se interrumpe, al volver a
+lanzarlo con la misma selección continúa donde quedó (--reset empieza de cero y vuelve a
+intentar las comidas que fallaron). --dry-run estima tokens, coste y duración de lo que
+queda sin llamar a Claude.
+
+Con --batch (por defecto si ANALYSIS_BATCH_ENABLED) las comidas se envían a la API de
+Message Batches, a mitad de precio y sin límite por minuto; el script espera los
+resultados salvo con --no-wait, y en ese caso los aplica el bot o la siguiente ejecución.
+
+Uso:
+    python -m scripts.reanalyze_meals --dry-run
+    python -m scripts.reanalyze_meals --only errored,stale --per-minute 30
+    python -m scripts.reanalyze_meals --user 123456789 --checkpoint usuario.json --reset
+    python -m scripts.reanalyze_meals --only stale --batch --no-wait
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+from src.config.settings import (
+    REANALYSIS_BATCH_SIZE, REANALYSIS_CONCURRENCY, REANALYSIS_PER_MINUTE, ANALYSIS_BATCH_ENABLED, ANALYSIS_BATCH_MAX_REQUESTS
+)
+from src.services.claude_service import ANALYSIS_PROMPT_VERSION
+from src.services.container import services
+from src.services.reanalysis import REANALYSIS_REASONS, Checkpoint, Reanalyzer, selection_query
+
+def _print_estimate(estimate: dict) -> None:
+    print(f"Comidas a reanalizar: {estimate['meals']} de {estimate['users']} usuarios")
+    for reason in REANALYSIS_REASONS:
+        if estimate[reason]:
+            print(f"  {reason}: {estimate[reason]}")
+    print(f"Tokens estimados: {estimate['input_tokens']} de entrada y {estimate['output_tokens']} de salida")
+    print(f"Coste estimado: {estimate['cost_usd']:.4f} USD")
+    if estimate["minutes"] is None:
+        print("Duración: la de los lotes de la API (menos de 24 h)")
+    else:
+        print(f"Duración estimada al ritmo configurado: {estimate['minutes']:.1f} minutos")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default="unanalyzed,errored", help="Motivos de selección separados por comas")
+    parser.add_argument("--user", type=int, help="Solo las comidas de este usuario")
+    parser.add_argument("--limit", type=int, help="Máximo de comidas en esta ejecución")
+    parser.add_argument("--concurrency", type=int, default=REANALYSIS_CONCURRENCY)
+    parser.add_argument("--per-minute", type=float, default=REANALYSIS_PER_MINUTE)
+    parser.add_argument("--batch-size", type=int, help="Comidas por lote de la selección y por checkpoint")
+    parser.add_argument("--batch", action=argparse.BooleanOptionalAction, default=ANALYSIS_BATCH_ENABLED,
+                        help="Usar la API de Message Batches")
+    parser.add_argument("--no-wait", action="store_true", help="En modo por lotes, no esperar los resultados")
+    parser.add_argument("--checkpoint", default="reanalysis_checkpoint.json", help="Archivo de progreso")
+    parser.add_argument("--reset", action="store_true", help="Ignorar el progreso guardado")
+    parser.add_argument("--dry-run", action="store_true", help="Solo estimar tokens, coste y duración")
+    args = parser.parse_args()
+
+    reasons = [reason.strip() for reason in args.only.split(",") if reason.strip()]
+    try:
+        query = selection_query(reasons, args.user)
+    except ValueError as e:
+        print(f"{e}. Opciones: {', '.join(REANALYSIS_REASONS)}", file=sys.stderr)
+        return 2
+
+    checkpoint = Checkpoint(
+        args.checkpoint, {"reasons": sorted(reasons), "user": args.user, "prompt_version": ANALYSIS_PROMPT_VERSION}
+    )
+    if args.reset and not args.dry_run and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    try:
+        if not args.reset and checkpoint.load():
+            print(f"Se reanuda desde el checkpoint {args.checkpoint} ({checkpoint.stats.get('meals', 0)} comidas procesadas)")
+    except ValueError as e:
+        print(f"{e}. Usa --reset o otro --checkpoint", file=sys.stderr)
+        return 2
+
+    batch_size = args.batch_size or (ANALYSIS_BATCH_MAX_REQUESTS if args.batch else REANALYSIS_BATCH_SIZE)
+    reanalyzer = Reanalyzer(query, checkpoint, args.concurrency, args.per_minute, batch_size, batch=args.batch)
+    try:
+        if args.dry_run:
+            _print_estimate(reanalyzer.estimate(args.limit))
+            return 0
+        stats = asyncio.run(reanalyzer.run(
+            args.limit, on_batch=lambda stats: print(f"  {stats.get('meals', 0)} comidas procesadas", file=sys.stderr),
+            wait=not args.no_wait
+        ))
+    except KeyboardInterrupt:
+        print(f"Interrumpido; se reanuda desde el último lote guardado en {args.checkpoint}", file=sys.stderr)
+        return 130
+    finally:
+        # Cierra MongoDB y, si se llegó a crear, el cliente de Claude
+        asyncio.run(services.close())
+
+    updated = sum(count for key, count in stats.items() if key.endswith("_updated"))
+    failed = sum(count for key, count in stats.items() if key.endswith("_failed"))
+    print(f"Reanalizadas {updated} comidas; {failed} fallaron (se reintentan con --reset)")
+    if checkpoint.jobs:
+        print(f"{len(checkpoint.jobs)} lotes siguen en curso; sus resultados los aplica el bot o la próxima ejecución")
+    for key, count in sorted(stats.items()):
+        if key != "meals":
+            print(f"  {key}: {count}")
+    return 1 if reanalyzer.stopped else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
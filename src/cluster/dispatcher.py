@@ -0,0 +1,232 @@
+"""Dispatcher del modo multiproceso: reparte las actualizaciones entre los workers por usuario
+y reenvía las que un worker caído no confirmó"""
+
+import asyncio
+import multiprocessing
+import threading
+import time
+from typing import Dict, Optional
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+from src.cluster.hash_ring import HashRing
+from src.cluster.worker import run_worker
+from src.config.settings import (
+    TELEGRAM_TOKEN, TELEGRAM_BASE_URL, METRICS_PORT, WORKER_HEARTBEAT_INTERVAL,
+    WORKER_HEARTBEAT_TIMEOUT, WORKER_START_TIMEOUT, WORKER_STOP_TIMEOUT
+)
+from src.services.http_clients import build_telegram_request
+from src.utils.logger import log_info, log_error
+from src.utils.metrics import registry, start_metrics_server
+
+WORKER_RESTARTS = registry.counter("nutribot_worker_restarts_total", "Reinicios de workers", ["worker"])
+UPDATES_REROUTED = registry.counter(
+    "nutribot_updates_rerouted_total", "Actualizaciones reenviadas a otro worker tras una caída"
+)
+
+class WorkerHandle:
+    """Proceso worker y las colas con las que se comunica"""
+    def __init__(self, index: int):
+        self.index = index
+        self.name = str(index)
+        self.process: Optional[multiprocessing.Process] = None
+        self.inbox = None
+        self.heartbeat = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.next_start = 0.0
+        self.in_ring = False
+        # Actualizaciones enviadas y todavía no confirmadas: se reenvían si el worker cae
+        self.pending: Dict[int, Dict] = {}
+
+    def healthy(self, now: float) -> bool:
+        if self.process is None or not self.process.is_alive():
+            return False
+        last_beat = self.heartbeat.value
+        if not last_beat:
+            return now - self.started_at < WORKER_START_TIMEOUT
+        return now - last_beat < WORKER_HEARTBEAT_TIMEOUT
+
+    @property
+    def ready(self) -> bool:
+        """El worker ya latió al menos una vez desde su último arranque"""
+        return self.heartbeat is not None and self.heartbeat.value > 0
+
+class Dispatcher:
+    def __init__(self, workers: int):
+        # forkserver: los workers nacen de un proceso limpio (sin hilos) con los módulos ya importados
+        self._context = multiprocessing.get_context("forkserver")
+        self._context.set_forkserver_preload(["main"])
+        self.workers = [WorkerHandle(index) for index in range(workers)]
+        self.ring = HashRing()
+        self._acks = self._context.Queue()
+        self._lock = threading.Lock()
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        registry.gauge(
+            "nutribot_worker_up", "1 si el worker está en el anillo recibiendo usuarios",
+            lambda: {(worker.name,): int(worker.in_ring) for worker in self.workers},
+            labels=["worker"]
+        )
+        registry.gauge(
+            "nutribot_worker_pending_updates", "Actualizaciones enviadas al worker sin confirmar",
+            lambda: {(worker.name,): len(worker.pending) for worker in self.workers},
+            labels=["worker"]
+        )
+
+    def start(self) -> None:
+        """Arranca todos los workers y el hilo que recibe sus confirmaciones"""
+        for worker in self.workers:
+            self._spawn(worker)
+            self._join_ring(worker)
+        threading.Thread(target=self._read_acks, name="nutribot-dispatcher-acks", daemon=True).start()
+        log_info(f"Dispatcher iniciado con {len(self.workers)} workers")
+
+    def _spawn(self, worker: WorkerHandle) -> None:
+        # Cola nueva en cada arranque: la anterior pudo quedar bloqueada por el proceso caído
+        worker.inbox = self._context.Queue()
+        worker.heartbeat = self._context.Value("d", 0.0)
+        worker.process = self._context.Process(
+            target=run_worker,
+            args=(worker.index, worker.inbox, self._acks, worker.heartbeat),
+            name=f"nutribot-worker-{worker.index}",
+            daemon=True
+        )
+        worker.process.start()
+        worker.started_at = time.time()
+
+    def _join_ring(self, worker: WorkerHandle) -> None:
+        self.ring.add(worker.name)
+        worker.in_ring = True
+
+    def _leave_ring(self, worker: WorkerHandle) -> None:
+        self.ring.remove(worker.name)
+        worker.in_ring = False
+
+    @staticmethod
+    def routing_key(update: Update) -> str:
+        """Usuario de la actualización (o chat; en último caso el update_id)"""
+        if update.effective_user:
+            return str(update.effective_user.id)
+        if update.effective_chat:
+            return str(update.effective_chat.id)
+        return str(update.update_id)
+
+    def route(self, update_id: int, key: str, data: Dict) -> bool:
+        """Envía la actualización al worker que le corresponde; False si no hay ninguno disponible"""
+        with self._lock:
+            node = self.ring.get_node(key)
+            if node is None:
+                return False
+            worker = self.workers[int(node)]
+            worker.pending[update_id] = data
+        worker.inbox.put(data)
+        return True
+
+    async def handle_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handler único del dispatcher: reenvía cada actualización a su worker"""
+        if not self.route(update.update_id, self.routing_key(update), update.to_dict()):
+            log_error(f"No hay workers disponibles; se descarta la actualización {update.update_id}")
+
+    def _read_acks(self) -> None:
+        while True:
+            try:
+                index, update_id = self._acks.get()
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                self.workers[index].pending.pop(update_id, None)
+
+    async def monitor(self) -> None:
+        """Comprueba periódicamente la salud de los workers y reinicia los caídos"""
+        while not self._stopping:
+            await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+            now = time.time()
+            for worker in self.workers:
+                if worker.healthy(now):
+                    if not worker.in_ring and worker.ready:
+                        with self._lock:
+                            self._join_ring(worker)
+                        log_info(f"Worker {worker.index} recuperado; vuelve a recibir a sus usuarios")
+                    continue
+
+                if worker.in_ring:
+                    self._evict(worker)
+                if now >= worker.next_start:
+                    await self._restart(worker)
+
+    def _evict(self, worker: WorkerHandle) -> None:
+        """Saca al worker del anillo y reenvía lo que tenía sin confirmar a los vecinos"""
+        with self._lock:
+            self._leave_ring(worker)
+            pending = list(worker.pending.items())
+            worker.pending.clear()
+
+        exit_code = worker.process.exitcode if worker.process else None
+        log_error(
+            f"Worker {worker.index} no responde (código de salida {exit_code}); "
+            f"se reenvían {len(pending)} actualizaciones pendientes"
+        )
+        for update_id, data in pending:
+            update = Update.de_json(data, None)
+            if self.route(update_id, self.routing_key(update), data):
+                UPDATES_REROUTED.inc()
+
+    async def _restart(self, worker: WorkerHandle) -> None:
+        if worker.process and worker.process.is_alive():
+            # Proceso colgado (sin latido; los workers ignoran SIGTERM): se mata antes de reemplazarlo
+            worker.process.kill()
+            await asyncio.to_thread(worker.process.join, 5)
+
+        worker.restarts += 1
+        worker.next_start = time.time() + min(2 ** worker.restarts, 60)
+        WORKER_RESTARTS.inc(worker.name)
+        log_info(f"Reiniciando worker {worker.index} (reinicio número {worker.restarts})")
+        self._spawn(worker)
+
+    def stop(self) -> None:
+        """Pide a los workers que terminen lo recibido y espera hasta WORKER_STOP_TIMEOUT"""
+        self._stopping = True
+        for worker in self.workers:
+            if worker.process and worker.process.is_alive():
+                worker.inbox.put(None)
+
+        deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            worker.process.join(max(deadline - time.monotonic(), 0))
+            if worker.process.is_alive():
+                log_error(f"Worker {worker.index} no terminó a tiempo; se fuerza su cierre")
+                worker.process.kill()
+        log_info("Dispatcher detenido")
+
+    async def post_init(self, application: Application) -> None:
+        self._monitor_task = asyncio.create_task(self.monitor())
+        if METRICS_PORT:
+            application.bot_data["metrics_server"] = start_metrics_server(METRICS_PORT)
+
+    async def post_shutdown(self, application: Application) -> None:
+        if self._monitor_task:
+            self._monitor_task.cancel()
+        await asyncio.to_thread(self.stop)
+        metrics_server = application.bot_data.pop("metrics_server", None)
+        if metrics_server:
+            metrics_server.shutdown()
+
+def build_dispatcher_application(dispatcher: Dispatcher) -> Application:
+    """Aplicación del proceso principal: solo recibe actualizaciones y las reparte"""
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .base_url(TELEGRAM_BASE_URL)
+        .request(build_telegram_request("api"))
+        .get_updates_request(build_telegram_request("updates"))
+        .post_init(dispatcher.post_init)
+        .post_shutdown(dispatcher.post_shutdown)
+        .build()
+    )
+    application.add_handler(TypeHandler(Update, dispatcher.handle_update))
+    return application
@@ -0,0 +1,76 @@
+"""Proceso worker del modo multiproceso: procesa las actualizaciones que recibe del dispatcher y las confirma"""
+
+import asyncio
+import signal
+import threading
+import time
+from multiprocessing.queues import Queue
+from multiprocessing.sharedctypes import Synchronized
+from typing import Dict
+
+from telegram import Update
+
+from src.config.settings import METRICS_PORT, WORKER_HEARTBEAT_INTERVAL
+from src.utils.logger import log_info, log_context
+
+def run_worker(index: int, inbox: Queue, acks: Queue, heartbeat: Synchronized) -> None:
+    """Punto de entrada del proceso worker"""
+    # Las señales de apagado llegan a todo el grupo de procesos: es el dispatcher quien decide cuándo parar
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    with log_context(worker=index):
+        asyncio.run(_serve(index, inbox, acks, heartbeat))
+
+async def _beat(heartbeat: Synchronized) -> None:
+    while True:
+        heartbeat.value = time.time()
+        await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+
+async def _serve(index: int, inbox: Queue, acks: Queue, heartbeat: Synchronized) -> None:
+    # Se importa aquí para que el dispatcher no cargue los handlers al importar este módulo
+    from main import build_application
+
+    application = build_application(receive_updates=False)
+    # Cada worker expone sus propias métricas en el puerto siguiente al del dispatcher
+    application.bot_data["metrics_port"] = METRICS_PORT + index + 1 if METRICS_PORT else 0
+    application.bot_data["worker_index"] = index
+
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+
+    def enqueue(data: Dict) -> None:
+        application.update_queue.put_nowait(Update.de_json(data, application.bot))
+
+    def read_inbox() -> None:
+        while True:
+            data = inbox.get()
+            if data is None:
+                loop.call_soon_threadsafe(stopped.set)
+                return
+            loop.call_soon_threadsafe(enqueue, data)
+
+    def acknowledge(update: object) -> None:
+        if isinstance(update, Update):
+            acks.put((index, update.update_id))
+
+    await application.initialize()
+    application.update_processor.done_callbacks.append(acknowledge)
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    threading.Thread(target=read_inbox, name=f"nutribot-worker-{index}-inbox", daemon=True).start()
+    heartbeat_task = asyncio.create_task(_beat(heartbeat))
+    log_info(f"Worker {index} listo")
+
+    try:
+        await stopped.wait()
+        # Terminar (con plazo) lo recibido; lo que no alcance queda pendiente para el próximo arranque
+        await application.bot_data["shutdown"].drain()
+    finally:
+        heartbeat_task.cancel()
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        log_info(f"Worker {index} detenido")
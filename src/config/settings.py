@@ -6,15 +6,177 @@ load_dotenv()
 
 # config de las variables de entorno 
 
+# Las credenciales se validan al arrancar el bot (validate_settings), no al importar:
+# así los módulos se pueden importar en pruebas y benchmarks sin ellas
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
-if not TELEGRAM_TOKEN:
-    raise ValueError("No se ha especificado el token de telegram en las variables de entorno")
 
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-if not ANTHROPIC_API_KEY:
-    raise ValueError("No se ha espeficiado la clave API de Anthropic en el archivo .env")
 
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/nutribot")
 
+# URL base de la API de Anthropic (vacía = la oficial; permite usar un servidor falso en benchmarks)
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL") or None
 
-DEFAULT_TIMEZONE = "America/Argentina/Buenos_Aires"
\ No newline at end of file
+
+DEFAULT_TIMEZONE = "America/Argentina/Buenos_Aires"
+
+# Modo de recepción de actualizaciones: "polling" o "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+
+# URL base de la API de Bots (permite apuntar a un servidor falso en pruebas de carga)
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")
+
+# Configuración del servidor webhook
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8443")))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Cantidad máxima de actualizaciones procesadas en paralelo (los mensajes de un mismo chat siempre van en orden)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))
+
+# Ventana (segundos) para agrupar mensajes consecutivos de un usuario en una sola comida. 0 la desactiva
+MEAL_BURST_WINDOW_SECONDS = float(os.getenv("MEAL_BURST_WINDOW_SECONDS", "2.0"))
+MEAL_BURST_MAX_WAIT_SECONDS = float(os.getenv("MEAL_BURST_MAX_WAIT_SECONDS", "8.0"))
+
+# Mostrar la acción "escribiendo..." mientras se procesa una respuesta
+REPLY_TYPING_ACTION = os.getenv("REPLY_TYPING_ACTION", "true").lower() == "true"
+
+# Clientes HTTP compartidos (Telegram y Anthropic)
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "64"))
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", "10"))
+TELEGRAM_WRITE_TIMEOUT = float(os.getenv("TELEGRAM_WRITE_TIMEOUT", "10"))
+TELEGRAM_POOL_TIMEOUT = float(os.getenv("TELEGRAM_POOL_TIMEOUT", "5"))
+ANTHROPIC_POOL_SIZE = int(os.getenv("ANTHROPIC_POOL_SIZE", "32"))
+ANTHROPIC_CONNECT_TIMEOUT = float(os.getenv("ANTHROPIC_CONNECT_TIMEOUT", "5"))
+ANTHROPIC_ANALYSIS_TIMEOUT = float(os.getenv("ANTHROPIC_ANALYSIS_TIMEOUT", "30"))
+ANTHROPIC_RECOMMENDATION_TIMEOUT = float(os.getenv("ANTHROPIC_RECOMMENDATION_TIMEOUT", "60"))
+ANTHROPIC_MAX_RETRIES = int(os.getenv("ANTHROPIC_MAX_RETRIES", "2"))
+
+# Puerto del endpoint de métricas Prometheus (/metrics). 0 lo desactiva
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Trazas por actualización: se exportan las que superan el umbral (ms)
+TRACE_SLOW_THRESHOLD_MS = float(os.getenv("TRACE_SLOW_THRESHOLD_MS", "2000"))
+TRACE_SINK_PATH = os.getenv("TRACE_SINK_PATH", "")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")
+
+# Logging: formato "text" o "json", escritura en hilo aparte y muestreo de eventos info de alto volumen
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() == "true"
+LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1.0"))
+
+# Perfilado por muestreo de actualizaciones lentas (activable también con /perfil)
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.1"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_SLOW_THRESHOLD_MS = float(os.getenv("PROFILE_SLOW_THRESHOLD_MS", "1000"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# Usuarios de Telegram con acceso a los comandos de administración (separados por comas)
+ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+
+# Modo multiproceso: con BOT_WORKERS > 1 un proceso recibe las actualizaciones y las reparte
+# entre N workers por hash consistente del usuario
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+WORKER_HEARTBEAT_INTERVAL = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", "1"))
+WORKER_HEARTBEAT_TIMEOUT = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", "10"))
+WORKER_START_TIMEOUT = float(os.getenv("WORKER_START_TIMEOUT", "30"))
+WORKER_STOP_TIMEOUT = float(os.getenv("WORKER_STOP_TIMEOUT", "30"))
+
+# Apagado ordenado: tiempo máximo para terminar el trabajo en curso antes de guardarlo como pendiente
+# (menor que el margen que da la plataforma entre SIGTERM y SIGKILL)
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "20"))
+
+# Comidas pendientes de análisis que se retoman al arrancar
+PENDING_MEAL_MAX_ATTEMPTS = int(os.getenv("PENDING_MEAL_MAX_ATTEMPTS", "3"))
+PENDING_MEAL_CLAIM_SECONDS = float(os.getenv("PENDING_MEAL_CLAIM_SECONDS", "600"))
+PENDING_MEAL_CONCURRENCY = int(os.getenv("PENDING_MEAL_CONCURRENCY", "4"))
+
+# Deduplicación de actualizaciones reenviadas por Telegram
+DEDUP_MEMORY_SIZE = int(os.getenv("DEDUP_MEMORY_SIZE", "10000"))
+DEDUP_TTL_SECONDS = int(os.getenv("DEDUP_TTL_SECONDS", "86400"))
+
+# Control de admisión: por encima de estos umbrales las comidas reciben un análisis local
+# preliminar al instante y el análisis completo con Claude se hace cuando baja la carga
+OVERLOAD_MAX_INFLIGHT_ANALYSES = int(os.getenv("OVERLOAD_MAX_INFLIGHT_ANALYSES", str(max(CONCURRENT_UPDATES * 3 // 4, 1))))
+OVERLOAD_MAX_LOOP_LAG_MS = float(os.getenv("OVERLOAD_MAX_LOOP_LAG_MS", "250"))
+OVERLOAD_MAX_QUEUE_DEPTH = int(os.getenv("OVERLOAD_MAX_QUEUE_DEPTH", str(CONCURRENT_UPDATES * 4)))
+OVERLOAD_CHECK_INTERVAL = float(os.getenv("OVERLOAD_CHECK_INTERVAL", "0.5"))
+DEFERRED_ANALYSIS_INTERVAL = float(os.getenv("DEFERRED_ANALYSIS_INTERVAL", "30"))
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "2000"))
+
+# Precálculo en horas de poca actividad: resumen del día y recomendaciones de los usuarios
+# que registraron comidas ese día, en ventanas de hora local "HH:MM-HH:MM" separadas por comas
+PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "true").lower() == "true"
+PRECOMPUTE_WINDOWS = os.getenv("PRECOMPUTE_WINDOWS", "21:00-23:59")
+PRECOMPUTE_INTERVAL = float(os.getenv("PRECOMPUTE_INTERVAL", "900"))
+PRECOMPUTE_CONCURRENCY = int(os.getenv("PRECOMPUTE_CONCURRENCY", "2"))
+PRECOMPUTE_TTL_SECONDS = int(os.getenv("PRECOMPUTE_TTL_SECONDS", "172800"))
+
+# Caché en memoria de recomendaciones (por usuario; se invalida al guardar comidas o preferencias)
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "5000"))
+RECOMMENDATION_CACHE_MAX_AGE = float(os.getenv("RECOMMENDATION_CACHE_MAX_AGE", "21600"))
+
+# Perfil nutricional acumulado con el que se generan las recomendaciones
+PROFILE_WINDOW_DAYS = int(os.getenv("PROFILE_WINDOW_DAYS", "28"))
+PROFILE_SHORT_WINDOW_DAYS = int(os.getenv("PROFILE_SHORT_WINDOW_DAYS", "7"))
+PROFILE_MAX_FOODS = int(os.getenv("PROFILE_MAX_FOODS", "60"))
+PROFILE_TOP_FOODS = int(os.getenv("PROFILE_TOP_FOODS", "12"))
+
+# Exportación de comidas (/exportar y scripts/export_meals.py)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+# Límite de Telegram para los documentos que envía un bot
+EXPORT_MAX_BYTES = int(os.getenv("EXPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+EXPORT_UPLOAD_TIMEOUT = float(os.getenv("EXPORT_UPLOAD_TIMEOUT", "120"))
+
+# Importación de historiales de otras aplicaciones (/importar)
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_MAX_MEALS = int(os.getenv("IMPORT_MAX_MEALS", "20000"))
+# Límite de Telegram para los archivos que descarga un bot
+IMPORT_MAX_FILE_BYTES = int(os.getenv("IMPORT_MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+IMPORT_PROGRESS_INTERVAL = float(os.getenv("IMPORT_PROGRESS_INTERVAL", "3"))
+# Análisis con Claude de las comidas importadas: en segundo plano y con baja prioridad
+IMPORT_ANALYSIS_INTERVAL = float(os.getenv("IMPORT_ANALYSIS_INTERVAL", "60"))
+IMPORT_ANALYSIS_CONCURRENCY = int(os.getenv("IMPORT_ANALYSIS_CONCURRENCY", "1"))
+IMPORT_ANALYSES_PER_MINUTE = float(os.getenv("IMPORT_ANALYSES_PER_MINUTE", "30"))
+
+# Reanálisis de comidas con análisis fallidos u obsoletos (scripts/reanalyze_meals.py)
+REANALYSIS_BATCH_SIZE = int(os.getenv("REANALYSIS_BATCH_SIZE", "100"))
+REANALYSIS_CONCURRENCY = int(os.getenv("REANALYSIS_CONCURRENCY", "4"))
+# Comparte el límite de la cuenta de Anthropic con el bot: dejar margen para los usuarios
+REANALYSIS_PER_MINUTE = float(os.getenv("REANALYSIS_PER_MINUTE", "40"))
+# Fallos seguidos de Claude tras los que el trabajo se detiene (se reanuda desde el checkpoint)
+REANALYSIS_MAX_CONSECUTIVE_FAILURES = int(os.getenv("REANALYSIS_MAX_CONSECUTIVE_FAILURES", "10"))
+# Estimación de coste: precios por millón de tokens y tokens de salida típicos de un análisis
+ANTHROPIC_INPUT_PRICE_PER_MTOK = float(os.getenv("ANTHROPIC_INPUT_PRICE_PER_MTOK", "0.25"))
+ANTHROPIC_OUTPUT_PRICE_PER_MTOK = float(os.getenv("ANTHROPIC_OUTPUT_PRICE_PER_MTOK", "1.25"))
+ANALYSIS_OUTPUT_TOKENS_ESTIMATE = int(os.getenv("ANALYSIS_OUTPUT_TOKENS_ESTIMATE", "300"))
+
+# Análisis por lotes con la API de Message Batches (trabajos en segundo plano: importaciones y reanálisis)
+ANALYSIS_BATCH_ENABLED = os.getenv("ANALYSIS_BATCH_ENABLED", "false").lower() == "true"
+ANALYSIS_BATCH_MAX_REQUESTS = int(os.getenv("ANALYSIS_BATCH_MAX_REQUESTS", "1000"))
+ANALYSIS_BATCH_POLL_INTERVAL = float(os.getenv("ANALYSIS_BATCH_POLL_INTERVAL", "60"))
+ANALYSIS_BATCH_TIMEOUT = float(os.getenv("ANALYSIS_BATCH_TIMEOUT", "120"))
+# Un lote caduca a las 24 h; pasado este tiempo sus comidas se pueden volver a enviar
+ANALYSIS_BATCH_CLAIM_SECONDS = float(os.getenv("ANALYSIS_BATCH_CLAIM_SECONDS", str(25 * 3600)))
+
+def validate_settings() -> None:
+    """Comprueba la configuración obligatoria antes de arrancar el bot"""
+    if not TELEGRAM_TOKEN:
+        raise ValueError("No se ha especificado el token de telegram en las variables de entorno")
+    if not ANTHROPIC_API_KEY:
+        raise ValueError("No se ha espeficiado la clave API de Anthropic en el archivo .env")
+    if BOT_MODE not in ("polling", "webhook"):
+        raise ValueError(f"BOT_MODE inválido: {BOT_MODE}. Usa 'polling' o 'webhook'")
+    if BOT_MODE == "webhook" and not WEBHOOK_URL:
+        raise ValueError("El modo webhook requiere WEBHOOK_URL en las variables de entorno")
+    if BOT_WORKERS < 1:
+        raise ValueError(f"BOT_WORKERS inválido: {BOT_WORKERS}. Debe ser al menos 1")
@@ -0,0 +1,52 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from src.config.settings import ADMIN_USER_IDS
+from src.utils.logger import log_user_action
+from src.utils.metrics import timed
+from src.utils.profiling import SamplingProfiler
+from src.utils.replies import send_reply
+
+def is_admin(user_id: int) -> bool:
+    """Indica si el usuario puede usar los comandos de administración"""
+    return user_id in ADMIN_USER_IDS
+
+@timed("handler")
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Manejador del comando /perfil [on [tasa] | off] para administradores"""
+    user = update.effective_user
+    chat_id = update.effective_chat.id
+
+    # Para el resto de usuarios el comando no existe
+    if not is_admin(user.id):
+        return
+
+    profiler = SamplingProfiler()
+    args = context.args or []
+    action = args[0].lower() if args else ""
+
+    if action == "on":
+        try:
+            sample_rate = float(args[1]) if len(args) > 1 else None
+        except ValueError:
+            await send_reply(context.bot, chat_id, "La tasa debe ser un número entre 0 y 1, por ejemplo: /perfil on 0.2")
+            return
+        profiler.enable(sample_rate)
+        log_user_action(user.id, "activó el perfilado", f"tasa {profiler.sample_rate}")
+    elif action == "off":
+        profiler.disable()
+        log_user_action(user.id, "desactivó el perfilado")
+    elif action:
+        await send_reply(context.bot, chat_id, "Uso: /perfil [on [tasa] | off]")
+        return
+
+    status = profiler.status()
+    await send_reply(
+        context.bot, chat_id,
+        f"Perfilado: {'activo' if status['enabled'] else 'inactivo'}\n"
+        f"Tasa de muestreo: {status['sample_rate']:.0%}\n"
+        f"Intervalo: {status['interval_ms']:.0f} ms\n"
+        f"Umbral de actualización lenta: {status['threshold_ms']:.0f} ms\n"
+        f"Sesiones en curso: {status['active_sessions']}\n"
+        f"Perfiles guardados: {status['dumped']} (en {status['directory']})"
+    )
@@ -1,18 +1,26 @@
+import asyncio
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from src.services.db_service import DatabaseService
+from src.config.settings import EXPORT_MAX_BYTES, EXPORT_UPLOAD_TIMEOUT
+from src.handlers.admin_handlers import is_admin
+from src.services.container import services
+from src.services.admission import admission
+from src.services.export_service import EXPORT_FORMATS, export_meals, export_filename
 from src.models.user import User
 from src.utils.logger import log_user_action, log_info, log_error
+from src.utils.metrics import timed
+from src.utils.replies import send_reply, send_document, start_typing
 
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, CallbackQueryHandler
-from src.services.summary_service import get_day_summary, format_day_summary, generate_daily_recommendations
-
-# Inicializamos el servicio de base de datos
-db_service = DatabaseService()
+from src.services.summary_service import (
+    get_day_summary, format_day_summary, get_range_summary, format_range_summary, generate_daily_recommendations,
+    find_precomputed_summary, find_ready_recommendations
+)
 
+@timed("handler")
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Manejador del comando /start"""
     user = update.effective_user
@@ -25,7 +33,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             username=user.username or "",
             first_name=user.first_name
         )
-        db_service.save_user(db_user)
+        await asyncio.to_thread(services.db.save_user, db_user)
         
         # Mensaje de bienvenida
         welcome_message = (
@@ -40,14 +48,15 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             "/resumen - Ver un resumen de tus comidas del día actual"
         )
         
-        await context.bot.send_message(chat_id=chat_id, text=welcome_message)
+        await send_reply(context.bot, chat_id, welcome_message)
         log_user_action(user.id, "inicio bot")
         
     except Exception as e:
         error_message = "Lo siento, ha ocurrido un error al iniciar. Por favor, intenta de nuevo más tarde."
-        await context.bot.send_message(chat_id=chat_id, text=error_message)
+        await send_reply(context.bot, chat_id, error_message)
         log_error(f"Error en comando start para usuario {user.id}", e)
 
+@timed("handler")
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Manejador del comando /ayuda"""
     user = update.effective_user
@@ -58,7 +67,11 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "/start - Iniciar o reiniciar el bot\n"
         "/ayuda - Mostrar esta guía de ayuda\n"
         "/resumen - Ver resumen de comidas del día\n"
+        "/semana - Ver tu progreso de los últimos 7 días\n"
+        "/mes - Ver tu progreso de los últimos 30 días\n"
         "/recomendacion - Recibir recomendaciones personalizadas\n"
+        "/exportar - Descargar tu historial de comidas (csv o jsonl, gz para comprimir)\n"
+        "/importar - Importar tu historial desde otra aplicación\n"
         "/preferencias - Configurar preferencias alimenticias\n"
         "/recordatorios - Configurar recordatorios\n\n"
         
@@ -71,62 +84,13 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "Si tienes alguna pregunta o sugerencia, ¡no dudes en contactarnos!"
     )
     
-    await context.bot.send_message(chat_id=chat_id, text=help_message, parse_mode="Markdown")
+    await send_reply(context.bot, chat_id, help_message, parse_mode="Markdown")
     log_user_action(user.id, "solicitó ayuda")
 
-async def preferences_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Manejador para el comando /preferencias"""
-    # Este es un placeholder - implementaremos esto completamente más adelante
-    user = update.effective_user
-    chat_id = update.effective_chat.id
-    
-    await context.bot.send_message(
-        chat_id=chat_id, 
-        text="Próximamente podrás configurar tus preferencias alimenticias aquí. Esta función está en desarrollo."
-    )
-    log_user_action(user.id, "intentó acceder a preferencias")
-
-async def reminders_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Manejador para el comando /recordatorios"""
-    # Este es un placeholder - implementaremos esto completamente más adelante
-    user = update.effective_user
-    chat_id = update.effective_chat.id
-    
-    await context.bot.send_message(
-        chat_id=chat_id, 
-        text="Próximamente podrás configurar recordatorios aquí. Esta función está en desarrollo."
-    )
-    log_user_action(user.id, "intentó acceder a recordatorios")
-
-async def summary_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Manejador para el comando /resumen"""
-    # Este es un placeholder - implementaremos esto completamente más adelante
-    user = update.effective_user
-    chat_id = update.effective_chat.id
-    
-    await context.bot.send_message(
-        chat_id=chat_id, 
-        text="Próximamente podrás ver un resumen de tus comidas aquí. Esta función está en desarrollo."
-    )
-    log_user_action(user.id, "intentó acceder a resumen")
-
-async def recommendation_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Manejador para el comando /recomendacion"""
-    # Este es un placeholder - implementaremos esto completamente más adelante
-    user = update.effective_user
-    chat_id = update.effective_chat.id
-    
-    await context.bot.send_message(
-        chat_id=chat_id, 
-        text="Próximamente podrás recibir recomendaciones personalizadas aquí. Esta función está en desarrollo."
-    )
-    log_user_action(user.id, "intentó acceder a recomendaciones")
-
-
-
 # Constantes para el ConversationHandler
 SELECTING_PREFERENCE, ADDING_RESTRICTION, ADDING_GOAL = range(3)
 
+@timed("handler")
 async def preferences_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Manejador para el comando /preferencias"""
     user = update.effective_user
@@ -134,11 +98,11 @@ async def preferences_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     try:
         # Obtener usuario de la base de datos
-        db_user = db_service.get_user(user.id)
+        db_user = await asyncio.to_thread(services.db.get_user, user.id)
         if not db_user:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text="Por favor, inicia el bot primero con el comando /start"
+            await send_reply(
+                context.bot, chat_id,
+                "Por favor, inicia el bot primero con el comando /start"
             )
             return ConversationHandler.END
         
@@ -156,9 +120,9 @@ async def preferences_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         context.user_data["current_preferences"] = db_user.preferences
         
         # Enviar mensaje con opciones
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text="¿Qué preferencias te gustaría configurar?",
+        await send_reply(
+            context.bot, chat_id,
+            "¿Qué preferencias te gustaría configurar?",
             reply_markup=reply_markup
         )
         
@@ -167,15 +131,16 @@ async def preferences_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         
     except Exception as e:
         log_error(f"Error al acceder a preferencias para usuario {user.id}", e)
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text="Lo siento, hubo un problema al acceder a las preferencias. Por favor, intenta de nuevo más tarde."
+        await send_reply(
+            context.bot, chat_id,
+            "Lo siento, hubo un problema al acceder a las preferencias. Por favor, intenta de nuevo más tarde."
         )
         return ConversationHandler.END
     
 
 
 
+@timed("handler")
 async def summary_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Manejador para el comando /resumen"""
     user = update.effective_user
@@ -183,42 +148,75 @@ async def summary_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     try:
         # Verificar si el usuario existe en la base de datos
-        db_user = db_service.get_user(user.id)
+        db_user = await asyncio.to_thread(services.db.get_user, user.id)
         if not db_user:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text="Por favor, inicia el bot primero con el comando /start"
+            await send_reply(
+                context.bot, chat_id,
+                "Por favor, inicia el bot primero con el comando /start"
             )
             return
         
-        # Enviar mensaje de procesamiento
-        processing_message = await context.bot.send_message(
-            chat_id=chat_id,
-            text="Generando resumen del día, espera un momento... 📊"
-        )
+        # Indicar que estamos procesando
+        start_typing(context.bot, chat_id)
         
-        # Obtener resumen del día
-        summary = get_day_summary(user.id, db_user.timezone)
+        # Obtener resumen del día (el precalculado si sus comidas no cambiaron)
+        summary = await asyncio.to_thread(find_precomputed_summary, user.id, db_user.timezone)
+        if summary is None:
+            summary = await asyncio.to_thread(get_day_summary, user.id, db_user.timezone)
         
         # Formatear y enviar resumen
         formatted_summary = format_day_summary(summary)
         
-        await context.bot.edit_message_text(
-            chat_id=chat_id,
-            message_id=processing_message.message_id,
-            text=formatted_summary,
-            parse_mode="Markdown"
-        )
+        await send_reply(context.bot, chat_id, formatted_summary, parse_mode="Markdown")
         
         log_user_action(user.id, "solicitó resumen diario")
         
     except Exception as e:
         log_error(f"Error al generar resumen para usuario {user.id}", e)
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text="Lo siento, hubo un problema al generar el resumen. Por favor, intenta de nuevo más tarde."
+        await send_reply(
+            context.bot, chat_id,
+            "Lo siento, hubo un problema al generar el resumen. Por favor, intenta de nuevo más tarde."
         )
 
+async def _send_range_summary(update: Update, context: ContextTypes.DEFAULT_TYPE, days: int) -> None:
+    """Envía el resumen de los últimos días (comandos /semana y /mes)"""
+    user = update.effective_user
+    chat_id = update.effective_chat.id
+    
+    try:
+        db_user = await asyncio.to_thread(services.db.get_user, user.id)
+        if not db_user:
+            await send_reply(
+                context.bot, chat_id,
+                "Por favor, inicia el bot primero con el comando /start"
+            )
+            return
+        
+        start_typing(context.bot, chat_id)
+        
+        summary = await asyncio.to_thread(get_range_summary, user.id, days, db_user.timezone)
+        await send_reply(context.bot, chat_id, format_range_summary(summary), parse_mode="Markdown")
+        
+        log_user_action(user.id, f"solicitó resumen de {days} días")
+        
+    except Exception as e:
+        log_error(f"Error al generar resumen de {days} días para usuario {user.id}", e)
+        await send_reply(
+            context.bot, chat_id,
+            "Lo siento, hubo un problema al generar el resumen. Por favor, intenta de nuevo más tarde."
+        )
+
+@timed("handler")
+async def week_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Manejador para el comando /semana"""
+    await _send_range_summary(update, context, 7)
+
+@timed("handler")
+async def month_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Manejador para el comando /mes"""
+    await _send_range_summary(update, context, 30)
+
+@timed("handler")
 async def recommendation_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Manejador para el comando /recomendacion"""
     user = update.effective_user
@@ -226,35 +224,94 @@ async def recommendation_command(update: Update, context: ContextTypes.DEFAULT_T
     
     try:
         # Verificar si el usuario existe en la base de datos
-        db_user = db_service.get_user(user.id)
+        db_user = await asyncio.to_thread(services.db.get_user, user.id)
         if not db_user:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text="Por favor, inicia el bot primero con el comando /start"
+            await send_reply(
+                context.bot, chat_id,
+                "Por favor, inicia el bot primero con el comando /start"
             )
             return
         
-        # Enviar mensaje de procesamiento
-        processing_message = await context.bot.send_message(
-            chat_id=chat_id,
-            text="Generando recomendaciones personalizadas basadas en tus comidas recientes y preferencias... 🧠"
-        )
+        # Indicar que estamos procesando
+        start_typing(context.bot, chat_id)
         
-        # Generar recomendaciones
-        recommendations = generate_daily_recommendations(user.id)
+        # Las ya generadas (en caché o precalculadas) sirven mientras no cambien el perfil nutricional ni las preferencias
+        recommendations, fingerprint = await asyncio.to_thread(find_ready_recommendations, db_user)
         
-        await context.bot.edit_message_text(
-            chat_id=chat_id,
-            message_id=processing_message.message_id,
-            text=recommendations,
-            parse_mode="Markdown"
-        )
+        if recommendations is None:
+            # Con el bot sobrecargado no se encola otra llamada a Claude
+            if admission.overload_reason():
+                await send_reply(
+                    context.bot, chat_id,
+                    "⏳ Hay mucha demanda en este momento. Pide tus recomendaciones de nuevo en unos minutos; "
+                    "mientras tanto puedes ver tu día con /resumen."
+                )
+                return
+            
+            # Generar recomendaciones
+            with admission.track_analysis():
+                recommendations = await asyncio.to_thread(generate_daily_recommendations, user.id, fingerprint)
+        
+        await send_reply(context.bot, chat_id, recommendations, parse_mode="Markdown")
         
         log_user_action(user.id, "solicitó recomendaciones")
         
     except Exception as e:
         log_error(f"Error al generar recomendaciones para usuario {user.id}", e)
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text="Lo siento, hubo un problema al generar las recomendaciones. Por favor, intenta de nuevo más tarde."
-        )
\ No newline at end of file
+        await send_reply(
+            context.bot, chat_id,
+            "Lo siento, hubo un problema al generar las recomendaciones. Por favor, intenta de nuevo más tarde."
+        )
+
+@timed("handler")
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Manejador para el comando /exportar [csv|jsonl] [gz] (los administradores pueden indicar un ID de usuario)"""
+    user = update.effective_user
+    chat_id = update.effective_chat.id
+    
+    args = [arg.lower() for arg in context.args or []]
+    export_format = next((arg for arg in args if arg in EXPORT_FORMATS), "csv")
+    compress = any(arg in ("gz", "gzip") for arg in args)
+    target_ids = [int(arg) for arg in args if arg.isdigit()]
+    if any(arg not in EXPORT_FORMATS and arg not in ("gz", "gzip") and not arg.isdigit() for arg in args) \
+            or (target_ids and not is_admin(user.id)):
+        await send_reply(context.bot, chat_id, "Uso: /exportar [csv|jsonl] [gz]")
+        return
+    target_id = target_ids[0] if target_ids else user.id
+    
+    output = None
+    try:
+        db_user = await asyncio.to_thread(services.db.get_user, target_id)
+        if not db_user:
+            await send_reply(context.bot, chat_id, "Por favor, inicia el bot primero con el comando /start")
+            return
+        
+        start_typing(context.bot, chat_id)
+        output, rows, size = await asyncio.to_thread(
+            export_meals, target_id, db_user.timezone, export_format, compress
+        )
+        if rows == 0:
+            await send_reply(context.bot, chat_id, "Todavía no hay comidas registradas para exportar.")
+            return
+        if size > EXPORT_MAX_BYTES:
+            hint = "" if compress else " Prueba con la versión comprimida: /exportar " + export_format + " gz"
+            await send_reply(context.bot, chat_id, f"El historial es demasiado grande para enviarlo por Telegram.{hint}")
+            return
+        
+        await send_document(
+            context.bot, chat_id, output,
+            filename=export_filename(target_id, export_format, compress, db_user.timezone),
+            caption=f"📦 {rows} comidas exportadas",
+            write_timeout=EXPORT_UPLOAD_TIMEOUT
+        )
+        log_user_action(user.id, "exportó su historial", f"{rows} comidas, {size} bytes, {export_format}")
+        
+    except Exception as e:
+        log_error(f"Error al exportar las comidas del usuario {target_id}", e)
+        await send_reply(
+            context.bot, chat_id,
+            "Lo siento, hubo un problema al exportar tu historial. Por favor, intenta de nuevo más tarde."
+        )
+    finally:
+        if output is not None:
+            output.close()
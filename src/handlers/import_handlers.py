@@ -0,0 +1,117 @@
+import asyncio
+import os
+import tempfile
+import time
+from typing import Dict, Set
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from src.config.settings import IMPORT_MAX_FILE_BYTES, IMPORT_MAX_MEALS, IMPORT_PROGRESS_INTERVAL
+from src.services.container import services
+from src.services.import_service import detect_format, import_meals
+from src.utils.logger import log_user_action, log_error
+from src.utils.metrics import timed
+from src.utils.replies import send_reply, edit_message
+
+# Usuarios con una importación en curso (una a la vez por usuario)
+_active_imports: Set[int] = set()
+
+IMPORT_HELP = (
+    "📥 *Importar tu historial*\n\n"
+    "Envíame un archivo CSV, JSON o JSONL (puede estar comprimido con gzip) con una comida por fila. "
+    "Columnas reconocidas:\n"
+    "• `fecha` (o date): 2024-05-01 13:30 o 01/05/2024 13:30, en tu hora local\n"
+    "• `comida` (o text): lo que comiste\n"
+    "• Opcionales: `tipo` (desayuno, almuerzo, cena, merienda), `proteinas`, `carbohidratos`, "
+    "`grasas`, `fibra` (alto, medio o bajo) y `kcal`\n\n"
+    "También sirve un archivo generado con /exportar."
+)
+
+def _progress_text(stats: Dict, done: bool = False) -> str:
+    text = (
+        f"{'✅ Importación terminada' if done else '⏳ Importando tu historial...'}\n\n"
+        f"Filas leídas: {stats['rows']}\n"
+        f"Comidas guardadas: {stats['imported']}"
+    )
+    if stats["invalid"]:
+        text += f"\nFilas descartadas (sin fecha o sin comida): {stats['invalid']}"
+    if stats["duplicates"]:
+        text += f"\nComidas que ya estaban registradas: {stats['duplicates']}"
+    if done:
+        if stats["error"]:
+            text += f"\n\n⚠️ El archivo tiene un error de formato ({stats['error']}); se importaron las filas anteriores."
+        if stats["truncated"]:
+            text += f"\n\nSolo se importan {IMPORT_MAX_MEALS} comidas por archivo; divide el resto en otro archivo."
+        if stats["local"]:
+            text += (
+                f"\n\n{stats['local']} comidas tienen un análisis preliminar; "
+                "el análisis detallado se completará poco a poco en segundo plano."
+            )
+    return text
+
+@timed("handler")
+async def import_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Manejador del comando /importar: explica el formato del archivo"""
+    await send_reply(context.bot, update.effective_chat.id, IMPORT_HELP, parse_mode="Markdown")
+    log_user_action(update.effective_user.id, "consultó la importación")
+
+@timed("handler")
+async def handle_import_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Importa el historial de comidas de un documento enviado al bot"""
+    user = update.effective_user
+    chat_id = update.effective_chat.id
+    document = update.message.document
+
+    import_format = detect_format(document.file_name or "")
+    if import_format is None:
+        await send_reply(context.bot, chat_id, "Solo puedo importar archivos .csv, .json o .jsonl (opcionalmente .gz). Usa /importar para ver el formato.")
+        return
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_BYTES:
+        await send_reply(context.bot, chat_id, "El archivo es demasiado grande para descargarlo desde Telegram (máximo 20 MB). Prueba comprimirlo con gzip.")
+        return
+    if user.id in _active_imports:
+        await send_reply(context.bot, chat_id, "Ya hay una importación en curso. Espera a que termine para enviar otro archivo.")
+        return
+
+    db_user = await asyncio.to_thread(services.db.get_user, user.id)
+    if not db_user:
+        await send_reply(context.bot, chat_id, "Por favor, inicia el bot primero con el comando /start")
+        return
+
+    _active_imports.add(user.id)
+    # La importación sigue en segundo plano: no ocupa el turno del chat ni un hueco de
+    # CONCURRENT_UPDATES, y el apagado ordenado la espera como al resto de tareas
+    task = asyncio.create_task(_run_import(context.bot, user.id, chat_id, document, import_format, db_user))
+    context.application.bot_data["shutdown"].track(task)
+
+async def _run_import(bot, user_id: int, chat_id: int, document, import_format: str, db_user) -> None:
+    """Descarga el documento e importa sus comidas, informando del progreso en un único mensaje"""
+    descriptor, path = tempfile.mkstemp(suffix=".import")
+    os.close(descriptor)
+    try:
+        telegram_file = await bot.get_file(document.file_id)
+        await telegram_file.download_to_drive(custom_path=path)
+
+        # Un solo mensaje de progreso que se edita, como mucho cada IMPORT_PROGRESS_INTERVAL segundos
+        progress = await send_reply(bot, chat_id, "⏳ Importando tu historial...")
+        last_edit = time.monotonic()
+
+        async def on_progress(stats: Dict) -> None:
+            nonlocal last_edit
+            if time.monotonic() - last_edit >= IMPORT_PROGRESS_INTERVAL:
+                last_edit = time.monotonic()
+                await edit_message(bot, chat_id, progress.message_id, _progress_text(stats))
+
+        stats = await import_meals(path, import_format, db_user, chat_id, on_progress)
+        await edit_message(bot, chat_id, progress.message_id, _progress_text(stats, done=True))
+        log_user_action(user_id, "importó su historial", f"{stats['imported']} comidas de {stats['rows']} filas")
+
+    except Exception as e:
+        log_error(f"Error al importar el historial del usuario {user_id}", e)
+        await send_reply(
+            bot, chat_id,
+            "Lo siento, no pude leer el archivo. Revisa que tenga el formato de /importar e intenta de nuevo."
+        )
+    finally:
+        _active_imports.discard(user_id)
+        os.remove(path)
@@ -1,20 +1,27 @@
+import asyncio
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from src.services.db_service import DatabaseService
-from src.services.claude_service import ClaudeService
+from src.services.container import services
+from src.services.meal_buffer import MealBurstBuffer
+from src.services.admission import admission, DEGRADED_ANALYSES
+from src.services.local_analysis import analysis_cache, analyze_locally
 from src.models.meal import Meal
-from src.utils.logger import log_meal_record, log_error
+from src.config.settings import (
+    MEAL_BURST_WINDOW_SECONDS, MEAL_BURST_MAX_WAIT_SECONDS,
+    PENDING_MEAL_MAX_ATTEMPTS, PENDING_MEAL_CLAIM_SECONDS, PENDING_MEAL_CONCURRENCY,
+    DEFERRED_ANALYSIS_INTERVAL
+)
+from src.utils.logger import log_meal_record, log_error, log_info
+from src.utils.metrics import timed
+from src.utils.replies import send_reply, start_typing
+from src.utils.time_utils import local_now, meal_type_for_hour
 
-# Inicializamos los servicios
-db_service = DatabaseService()
-claude_service = ClaudeService()
-
-def _detect_meal_type(text: str, time: datetime) -> str:
+def _detect_meal_type(text: str, local_time: datetime) -> str:
     """
-    Detecta el tipo de comida basado en el texto y la hora
+    Detecta el tipo de comida basado en el texto y la hora local del usuario
     """
     # Detectar por palabras clave en el texto
     text_lower = text.lower()
@@ -27,20 +34,10 @@ def _detect_meal_type(text: str, time: datetime) -> str:
     elif any(word in text_lower for word in ["snack", "merienda", "bocadillo", "tentempié"]):
         return "snack"
     
-    # Si no se encuentra en el texto, intentar inferir por la hora
-    hour = time.hour
-    if 5 <= hour < 11:
-        return "breakfast"
-    elif 11 <= hour < 15:
-        return "lunch"
-    elif 15 <= hour < 18:
-        return "snack"
-    elif 18 <= hour <= 23 or 0 <= hour < 5:
-        return "dinner"
-    
-    # Valor por defecto
-    return "meal"
+    # Si no se encuentra en el texto, inferirlo por la hora local
+    return meal_type_for_hour(local_time.hour)
 
+@timed("handler")
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Maneja los mensajes de texto que describen comidas
@@ -49,63 +46,233 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     chat_id = update.effective_chat.id
     message_text = update.message.text
     
+    # Los mensajes seguidos se agrupan en una sola comida antes de analizarse. La
+    # actualización no se confirma al terminar el handler sino al guardarse la comida
+    if meal_buffer.enabled:
+        on_saved = context.application.update_processor.hold(update)
+        await meal_buffer.add(user.id, chat_id, message_text, context, on_saved)
+        return
+    
+    await process_meal(user.id, chat_id, message_text, context)
+
+@timed("handler")
+async def flush_pending_meals(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Procesa de inmediato las comidas agrupadas del usuario antes de ejecutar un comando
+    """
+    if update.effective_user:
+        await meal_buffer.flush(update.effective_user.id)
+
+@timed("handler")
+async def process_meal(user_id: int, chat_id: int, message_text: str, context: ContextTypes.DEFAULT_TYPE,
+                       on_saved: Optional[Callable[[], None]] = None) -> None:
+    """
+    Registra, analiza y responde una comida (uno o varios mensajes agrupados).
+    on_saved se invoca en cuanto la comida queda guardada
+    """
+    meal_id = None
     try:
         # Verificar si el usuario existe en la base de datos
-        db_user = db_service.get_user(user.id)
+        db_user = await asyncio.to_thread(services.db.get_user, user_id)
         if not db_user:
             # Si no existe, le pedimos que inicie el bot primero
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text="Por favor, inicia el bot primero con el comando /start"
-            )
+            await send_reply(context.bot, chat_id, "Por favor, inicia el bot primero con el comando /start")
             return
         
-        # Enviar mensaje de procesamiento
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text="Estoy analizando tu comida, dame un momento... 🔍"
-        )
+        # Indicar que estamos procesando (acción "escribiendo", sin mensaje extra)
+        start_typing(context.bot, chat_id)
         
-        # Detectar el tipo de comida
+        # Detectar el tipo de comida (por la hora local del usuario, no la del servidor)
         timestamp = datetime.utcnow()
-        meal_type = _detect_meal_type(message_text, timestamp)
+        meal_type = _detect_meal_type(message_text, local_now(db_user.timezone, timestamp))
         
-        # Crear y guardar el registro de comida
+        # Con el bot sobrecargado se responde al instante sin esperar turno para Claude
+        overload_reason = admission.overload_reason()
+        if overload_reason:
+            await _reply_degraded(
+                context.bot, user_id, chat_id, message_text, meal_type, timestamp, db_user.preferences, overload_reason
+            )
+            return
+        
+        # Crear y guardar el registro de comida (queda pendiente hasta que se guarde su análisis)
         meal = Meal(
-            telegram_id=user.id,
+            telegram_id=user_id,
             text=message_text,
             meal_type=meal_type,
-            timestamp=timestamp
+            timestamp=timestamp,
+            chat_id=chat_id,
+            pending_analysis=True
         )
-        meal_id = db_service.save_meal(meal)
+        # Queda reservada por este proceso para que otro worker que arranque no la retome
+        meal_id = await asyncio.to_thread(services.db.save_meal, meal, True)
+        if on_saved:
+            on_saved()
         
         # Registrar en logs
-        log_meal_record(user.id, meal_type, message_text)
+        log_meal_record(user_id, meal_type, message_text)
         
-        # Analizar la comida con Claude
-        analysis = claude_service.analyze_meal(
-            meal_text=message_text,
-            user_preferences=db_user.preferences
-        )
+        await _analyze_and_reply(context.bot, meal_id, meal_type, message_text, db_user.preferences, chat_id)
         
-        # Actualizar el análisis en la base de datos
-        if meal_id and analysis:
-            db_service.update_meal_analysis(meal_id, analysis)
-        
-        # Preparar y enviar respuesta
-        response = _format_meal_analysis_response(meal_type, analysis)
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=response,
-            parse_mode="Markdown"
+    except asyncio.CancelledError:
+        # El bot se está apagando: si la comida no llegó a guardarse, se guarda pendiente para retomarla
+        if meal_id is None:
+            await persist_pending_meal(user_id, chat_id, message_text)
+        else:
+            await asyncio.to_thread(services.db.release_pending_meal, meal_id)
+        raise
+    except Exception as e:
+        log_error(f"Error al procesar mensaje para usuario {user_id}", e)
+        await send_reply(
+            context.bot, chat_id,
+            "Lo siento, hubo un problema al analizar tu comida. Por favor, intenta de nuevo más tarde."
         )
-        
+
+# Buffer de ráfagas: se declara después de process_meal, que es su callback
+meal_buffer = MealBurstBuffer(MEAL_BURST_WINDOW_SECONDS, MEAL_BURST_MAX_WAIT_SECONDS, process_meal)
+
+async def _reply_degraded(bot, user_id: int, chat_id: int, message_text: str, meal_type: str, timestamp: datetime,
+                          preferences: Dict, reason: str) -> None:
+    """Responde con un análisis local y deja la comida pendiente del análisis completo"""
+    # Un análisis completo reciente del mismo texto vale tal cual; si no, uno preliminar por palabras clave
+    analysis = analysis_cache.get(message_text, preferences)
+    source = "cache" if analysis else "keywords"
+    if analysis is None:
+        analysis = analyze_locally(message_text)
+    
+    pending = source == "keywords"
+    meal = Meal(
+        telegram_id=user_id,
+        text=message_text,
+        meal_type=meal_type,
+        timestamp=timestamp,
+        analyzed=not pending,
+        analysis=analysis,
+        chat_id=chat_id,
+        pending_analysis=pending
+    )
+    # Sin reservar: la toma el proceso de análisis diferidos cuando baje la carga
+    await asyncio.to_thread(services.db.save_meal, meal)
+    log_meal_record(user_id, meal_type, message_text)
+    DEGRADED_ANALYSES.inc(reason, source)
+    
+    response = _format_meal_analysis_response(meal_type, analysis)
+    if pending:
+        response = "⏳ Hay mucha demanda en este momento: te dejo un análisis preliminar.\n\n" + response
+    await send_reply(bot, chat_id, response, parse_mode="Markdown")
+
+async def _analyze_and_reply(bot, meal_id: str, meal_type: str, meal_text: str, preferences: Dict, chat_id: int,
+                             intro: str = "", reply: bool = True, reply_errors: bool = True) -> bool:
+    """Analiza una comida ya guardada, guarda el análisis y responde al usuario; False si Claude falló"""
+    # Analizar la comida con Claude
+    with admission.track_analysis():
+        analysis = await asyncio.to_thread(
+            services.claude.analyze_meal,
+            meal_text=meal_text,
+            user_preferences=preferences
+        )
+    
+    # Actualizar el análisis en la base de datos; si Claude falló, la comida sigue pendiente
+    # (con el análisis preliminar que tuviera) y se reintenta hasta PENDING_MEAL_MAX_ATTEMPTS
+    valid = bool(analysis) and "error" not in analysis and not analysis.get("error_parsing")
+    if meal_id:
+        if valid:
+            await asyncio.to_thread(services.db.update_meal_analysis, meal_id, analysis)
+        else:
+            await asyncio.to_thread(services.db.release_pending_meal, meal_id)
+    if valid:
+        analysis_cache.put(meal_text, preferences, analysis)
+    
+    if not reply or not (valid or reply_errors):
+        return valid
+    
+    # Preparar y enviar respuesta
+    response = intro + _format_meal_analysis_response(meal_type, analysis)
+    await send_reply(bot, chat_id, response, parse_mode="Markdown")
+    return valid
+
+def _save_pending_meal(user_id: int, chat_id: int, message_text: str, timestamp: datetime) -> None:
+    db_user = services.db.get_user(user_id)
+    meal = Meal(
+        telegram_id=user_id,
+        text=message_text,
+        meal_type=_detect_meal_type(message_text, local_now(db_user.timezone if db_user else "UTC", timestamp)),
+        timestamp=timestamp,
+        chat_id=chat_id,
+        pending_analysis=True
+    )
+    services.db.save_meal(meal)
+
+async def persist_pending_meal(user_id: int, chat_id: int, message_text: str) -> None:
+    """Guarda una comida sin analizar para retomarla en el próximo arranque"""
+    try:
+        await asyncio.to_thread(_save_pending_meal, user_id, chat_id, message_text, datetime.utcnow())
     except Exception as e:
-        log_error(f"Error al procesar mensaje para usuario {user.id}", e)
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text="Lo siento, hubo un problema al analizar tu comida. Por favor, intenta de nuevo más tarde."
+        log_error(f"No se pudo guardar la comida pendiente del usuario {user_id}", e)
+
+async def persist_unprocessed_update(update: object) -> None:
+    """Guarda las comidas de actualizaciones que no llegaron a procesarse antes del apagado"""
+    if not isinstance(update, Update) or not update.message or not update.message.text:
+        return
+    if update.message.text.startswith("/") or not update.effective_user:
+        log_info(f"Se descarta el comando sin procesar de la actualización {update.update_id}")
+        return
+    await persist_pending_meal(update.effective_user.id, update.effective_chat.id, update.message.text)
+
+async def _resume_meal(bot, meal_data: Dict) -> bool:
+    """Completa una comida pendiente ya reservada; False si no se pudo analizar"""
+    user_id = meal_data["telegram_id"]
+    chat_id = meal_data.get("chat_id") or user_id
+    try:
+        db_user = await asyncio.to_thread(services.db.get_user, user_id)
+        preferences = db_user.preferences if db_user else {}
+        # Si ya recibió un análisis preliminar (sobrecarga), el completo solo se guarda
+        return await _analyze_and_reply(
+            bot, str(meal_data["_id"]), meal_data["meal_type"], meal_data["text"], preferences, chat_id,
+            intro="🔄 Retomé el análisis de una comida que había quedado pendiente.\n\n",
+            reply=not meal_data.get("analysis"), reply_errors=False
         )
+    except asyncio.CancelledError:
+        # Nuevo apagado: se libera para retomarla en el siguiente arranque
+        await asyncio.to_thread(services.db.release_pending_meal, str(meal_data["_id"]))
+        raise
+    except Exception as e:
+        log_error(f"Error al retomar la comida pendiente del usuario {user_id}", e)
+        return False
+
+async def resume_pending_meals(bot, should_continue: Optional[Callable[[], bool]] = None) -> int:
+    """Analiza las comidas que quedaron pendientes en un apagado o caída anterior"""
+    async def consume() -> int:
+        resumed = 0
+        while should_continue is None or should_continue():
+            # Cada comida se reserva antes de analizarla: varios workers pueden retomar a la vez
+            meal_data = await asyncio.to_thread(
+                services.db.claim_pending_meal, PENDING_MEAL_MAX_ATTEMPTS, PENDING_MEAL_CLAIM_SECONDS
+            )
+            if not meal_data:
+                return resumed
+            if not await _resume_meal(bot, meal_data):
+                # La comida liberada se podría volver a reservar enseguida y agotar sus intentos:
+                # con Claude fallando se deja para la siguiente pasada
+                return resumed
+            resumed += 1
+        return resumed
+    
+    resumed = sum(await asyncio.gather(*(consume() for _ in range(PENDING_MEAL_CONCURRENCY))))
+    if resumed:
+        log_info(f"Se retomaron {resumed} comidas pendientes de análisis")
+    return resumed
+
+async def run_deferred_analyses(bot, interval: float = DEFERRED_ANALYSIS_INTERVAL) -> None:
+    """Completa con Claude, cuando baja la carga, las comidas que recibieron un análisis preliminar"""
+    while True:
+        await asyncio.sleep(interval)
+        if admission.overload_reason():
+            continue
+        try:
+            # Se detiene en cuanto vuelve la sobrecarga para no competir con los mensajes nuevos
+            await resume_pending_meals(bot, should_continue=lambda: admission.overload_reason() is None)
+        except Exception as e:
+            log_error("Error al completar los análisis diferidos", e)
 
 def _format_meal_analysis_response(meal_type: str, analysis: Dict[str, Any]) -> str:
     """
@@ -1,12 +1,12 @@
+import asyncio
 from typing import Dict, List
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
-from src.services.db_service import DatabaseService
+from src.services.container import services
 from src.utils.logger import log_user_action, log_error
-
-# Inicializamos el servicio de base de datos
-db_service = DatabaseService()
+from src.utils.metrics import timed
+from src.utils.replies import edit_reply
 
 # Estados para la conversación
 SELECTING_PREFERENCE, ADDING_RESTRICTION, ADDING_GOAL = range(3)
@@ -22,6 +22,7 @@ NUTRITIONAL_GOALS = [
     "más_proteína", "más_fibra", "menos_grasas", "control_glucémico"
 ]
 
+@timed("handler")
 async def preference_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Maneja la selección de tipo de preferencia"""
     query = update.callback_query
@@ -30,7 +31,7 @@ async def preference_selection(update: Update, context: ContextTypes.DEFAULT_TYP
     user = update.effective_user
     
     if query.data == "pref_cancel":
-        await query.edit_message_text(text="Configuración de preferencias cancelada.")
+        await edit_reply(query, text="Configuración de preferencias cancelada.")
         return ConversationHandler.END
     
     elif query.data == "pref_restrictions":
@@ -48,7 +49,8 @@ async def preference_selection(update: Update, context: ContextTypes.DEFAULT_TYP
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await query.edit_message_text(
+        await edit_reply(
+            query,
             text="Selecciona tus restricciones dietéticas (puedes elegir varias):",
             reply_markup=reply_markup
         )
@@ -70,7 +72,8 @@ async def preference_selection(update: Update, context: ContextTypes.DEFAULT_TYP
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await query.edit_message_text(
+        await edit_reply(
+            query,
             text="Selecciona tus objetivos nutricionales (puedes elegir varios):",
             reply_markup=reply_markup
         )
@@ -79,6 +82,7 @@ async def preference_selection(update: Update, context: ContextTypes.DEFAULT_TYP
     
     return ConversationHandler.END
 
+@timed("handler")
 async def handle_restriction_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Maneja la selección de restricciones dietéticas"""
     query = update.callback_query
@@ -87,16 +91,17 @@ async def handle_restriction_selection(update: Update, context: ContextTypes.DEF
     user = update.effective_user
     
     if query.data == "pref_cancel":
-        await query.edit_message_text(text="Configuración de preferencias cancelada.")
+        await edit_reply(query, text="Configuración de preferencias cancelada.")
         return ConversationHandler.END
     
     elif query.data == "rest_save":
         # Guardar restricciones en la base de datos
         preferences = context.user_data.get("current_preferences", {"dietary_restrictions": [], "goals": []})
         
-        db_service.update_user_preferences(user.id, preferences)
+        await asyncio.to_thread(services.db.update_user_preferences, user.id, preferences)
         
-        await query.edit_message_text(
+        await edit_reply(
+            query,
             text=f"Tus restricciones dietéticas han sido guardadas: {', '.join(preferences.get('dietary_restrictions', []) or ['Ninguna'])}"
         )
         
@@ -132,13 +137,15 @@ async def handle_restriction_selection(update: Update, context: ContextTypes.DEF
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await query.edit_message_text(
+        await edit_reply(
+            query,
             text="Selecciona tus restricciones dietéticas (puedes elegir varias):",
             reply_markup=reply_markup
         )
         
         return ADDING_RESTRICTION
 
+@timed("handler")
 async def handle_goal_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Maneja la selección de objetivos nutricionales"""
     query = update.callback_query
@@ -147,16 +154,17 @@ async def handle_goal_selection(update: Update, context: ContextTypes.DEFAULT_TY
     user = update.effective_user
     
     if query.data == "pref_cancel":
-        await query.edit_message_text(text="Configuración de preferencias cancelada.")
+        await edit_reply(query, text="Configuración de preferencias cancelada.")
         return ConversationHandler.END
     
     elif query.data == "goal_save":
         # Guardar objetivos en la base de datos
         preferences = context.user_data.get("current_preferences", {"dietary_restrictions": [], "goals": []})
         
-        db_service.update_user_preferences(user.id, preferences)
+        await asyncio.to_thread(services.db.update_user_preferences, user.id, preferences)
         
-        await query.edit_message_text(
+        await edit_reply(
+            query,
             text=f"Tus objetivos nutricionales han sido guardados: {', '.join(preferences.get('goals', []) or ['Ninguno'])}"
         )
         
@@ -192,7 +200,8 @@ async def handle_goal_selection(update: Update, context: ContextTypes.DEFAULT_TY
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await query.edit_message_text(
+        await edit_reply(
+            query,
             text="Selecciona tus objetivos nutricionales (puedes elegir varios):",
             reply_markup=reply_markup
         )
@@ -1,12 +1,12 @@
+import asyncio
 from typing import Dict, List
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
-from src.services.db_service import DatabaseService
+from src.services.container import services
 from src.utils.logger import log_user_action, log_error
-
-# Inicializamos el servicio de base de datos
-db_service = DatabaseService()
+from src.utils.metrics import timed
+from src.utils.replies import send_reply, edit_reply
 
 # Estados para la conversación
 SELECTING_REMINDER_ACTION, SETTING_REMINDER_TIMES = range(2)
@@ -18,6 +18,7 @@ REMINDER_TIMES = [
     "18:00", "19:00", "20:00"
 ]
 
+@timed("handler")
 async def reminders_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Manejador para el comando /recordatorios"""
     user = update.effective_user
@@ -25,11 +26,11 @@ async def reminders_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     try:
         # Obtener usuario de la base de datos
-        db_user = db_service.get_user(user.id)
+        db_user = await asyncio.to_thread(services.db.get_user, user.id)
         if not db_user:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text="Por favor, inicia el bot primero con el comando /start"
+            await send_reply(
+                context.bot, chat_id,
+                "Por favor, inicia el bot primero con el comando /start"
             )
             return ConversationHandler.END
         
@@ -57,12 +58,12 @@ async def reminders_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         
         status = "Activados" if is_enabled else "Desactivados"
         
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=f"Configuración actual de recordatorios:\n\n"
-                 f"Estado: {status}\n"
-                 f"Horarios: {times_str}\n\n"
-                 f"¿Qué te gustaría hacer?",
+        await send_reply(
+            context.bot, chat_id,
+            f"Configuración actual de recordatorios:\n\n"
+            f"Estado: {status}\n"
+            f"Horarios: {times_str}\n\n"
+            f"¿Qué te gustaría hacer?",
             reply_markup=reply_markup
         )
         
@@ -71,12 +72,13 @@ async def reminders_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         
     except Exception as e:
         log_error(f"Error al acceder a recordatorios para usuario {user.id}", e)
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text="Lo siento, hubo un problema al acceder a los recordatorios. Por favor, intenta de nuevo más tarde."
+        await send_reply(
+            context.bot, chat_id,
+            "Lo siento, hubo un problema al acceder a los recordatorios. Por favor, intenta de nuevo más tarde."
         )
         return ConversationHandler.END
 
+@timed("handler")
 async def handle_reminder_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Maneja la selección de acción para recordatorios"""
     query = update.callback_query
@@ -85,7 +87,7 @@ async def handle_reminder_action(update: Update, context: ContextTypes.DEFAULT_T
     user = update.effective_user
     
     if query.data == "rem_cancel":
-        await query.edit_message_text(text="Configuración de recordatorios cancelada.")
+        await edit_reply(query, text="Configuración de recordatorios cancelada.")
         return ConversationHandler.END
     
     elif query.data == "rem_toggle":
@@ -97,10 +99,11 @@ async def handle_reminder_action(update: Update, context: ContextTypes.DEFAULT_T
         context.user_data["current_reminders"]["enabled"] = not is_currently_enabled
         
         # Guardar en la base de datos
-        db_service.update_user_reminders(user.id, context.user_data["current_reminders"])
+        await asyncio.to_thread(services.db.update_user_reminders, user.id, context.user_data["current_reminders"])
         
         new_status = "activados" if not is_currently_enabled else "desactivados"
-        await query.edit_message_text(
+        await edit_reply(
+            query,
             text=f"Tus recordatorios han sido {new_status}."
         )
         
@@ -122,7 +125,8 @@ async def handle_reminder_action(update: Update, context: ContextTypes.DEFAULT_T
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await query.edit_message_text(
+        await edit_reply(
+            query,
             text="Selecciona los horarios para tus recordatorios (puedes elegir varios):",
             reply_markup=reply_markup
         )
@@ -131,6 +135,7 @@ async def handle_reminder_action(update: Update, context: ContextTypes.DEFAULT_T
     
     return ConversationHandler.END
 
+@timed("handler")
 async def handle_reminder_times(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Maneja la selección de horarios para recordatorios"""
     query = update.callback_query
@@ -139,7 +144,7 @@ async def handle_reminder_times(update: Update, context: ContextTypes.DEFAULT_TY
     user = update.effective_user
     
     if query.data == "rem_cancel":
-        await query.edit_message_text(text="Configuración de recordatorios cancelada.")
+        await edit_reply(query, text="Configuración de recordatorios cancelada.")
         return ConversationHandler.END
     
     elif query.data == "time_save":
@@ -151,10 +156,11 @@ async def handle_reminder_times(update: Update, context: ContextTypes.DEFAULT_TY
         if context.user_data["current_reminders"].get("times", []):
             context.user_data["current_reminders"]["enabled"] = True
         
-        db_service.update_user_reminders(user.id, context.user_data["current_reminders"])
+        await asyncio.to_thread(services.db.update_user_reminders, user.id, context.user_data["current_reminders"])
         
         times_str = ", ".join(context.user_data["current_reminders"].get("times", [])) or "No seleccionados"
-        await query.edit_message_text(
+        await edit_reply(
+            query,
             text=f"Tus horarios de recordatorios han sido guardados: {times_str}"
         )
         
@@ -190,7 +196,8 @@ async def handle_reminder_times(update: Update, context: ContextTypes.DEFAULT_TY
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await query.edit_message_text(
+        await edit_reply(
+            query,
             text="Selecciona los horarios para tus recordatorios (puedes elegir varios):",
             reply_markup=reply_markup
         )
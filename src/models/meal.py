@@ -1,6 +1,8 @@
 from datetime import datetime
 from typing import List, Dict, Optional
 
+from src.models.nutrients import encode_analysis
+
 class Meal:
     def __init__(
         self,
@@ -9,25 +11,51 @@ class Meal:
         meal_type: str,
         timestamp: Optional[datetime] = None,
         analyzed: bool = False,
-        analysis: Optional[Dict] = None
+        analysis: Optional[Dict] = None,
+        chat_id: Optional[int] = None,
+        pending_analysis: bool = False,
+        nutrients: Optional[Dict] = None,
+        nutrients_raw: Optional[Dict] = None,
+        meal_id: Optional[str] = None,
+        import_pending: bool = False
     ):
         self.telegram_id = telegram_id
         self.text = text
         self.meal_type = meal_type
         self.timestamp = timestamp or datetime.utcnow()
         self.analyzed = analyzed
+        # Los niveles de texto del análisis se guardan como números (ver src/models/nutrients.py)
+        if nutrients is None:
+            analysis, nutrients, nutrients_raw = encode_analysis(analysis)
         self.analysis = analysis or {}
+        self.nutrients = nutrients
+        self.nutrients_raw = nutrients_raw or {}
+        # Chat al que responder y marca de análisis pendiente (se retoma si el bot se detiene antes)
+        self.chat_id = chat_id
+        self.pending_analysis = pending_analysis
+        # _id de MongoDB (solo en las comidas leídas de la base de datos)
+        self.meal_id = meal_id
+        # Comida importada con un análisis preliminar que se completa en segundo plano
+        self.import_pending = import_pending
 
     def to_dict(self) -> Dict:
         """Convierte el objeto comida a un diccionario para almacenar en MongoDB"""
-        return {
+        data = {
             "telegram_id": self.telegram_id,
             "text": self.text,
             "meal_type": self.meal_type,
             "timestamp": self.timestamp,
             "analyzed": self.analyzed,
-            "analysis": self.analysis
+            "analysis": self.analysis,
+            "chat_id": self.chat_id,
+            "pending_analysis": self.pending_analysis,
+            "nutrients": self.nutrients
         }
+        if self.nutrients_raw:
+            data["nutrients_raw"] = self.nutrients_raw
+        if self.import_pending:
+            data["import_pending"] = True
+        return data
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'Meal':
@@ -38,5 +66,12 @@ class Meal:
             meal_type=data["meal_type"],
             timestamp=data["timestamp"],
             analyzed=data["analyzed"],
-            analysis=data["analysis"]
+            analysis=data["analysis"],
+            chat_id=data.get("chat_id"),
+            pending_analysis=data.get("pending_analysis", False),
+            # Comidas anteriores a la migración: los niveles siguen como texto dentro del análisis
+            nutrients=data.get("nutrients"),
+            nutrients_raw=data.get("nutrients_raw"),
+            meal_id=str(data["_id"]) if "_id" in data else None,
+            import_pending=data.get("import_pending", False)
         )
\ No newline at end of file
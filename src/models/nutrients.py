@@ -0,0 +1,92 @@
+"""Niveles de nutrientes como enteros pequeños (1 bajo, 2 medio, 3 alto; 0 si no se reconocen)"""
+
+import re
+import unicodedata
+from typing import Any, Dict, Optional, Tuple
+
+UNKNOWN, LOW, MEDIUM, HIGH = 0, 1, 2, 3
+
+NUTRIENTS = ("protein", "carbs", "fats", "fiber")
+LEVEL_NAMES = {LOW: "bajo", MEDIUM: "medio", HIGH: "alto"}
+# Nivel que se asume cuando el análisis no trae el nutriente o no se reconoce
+NUTRIENT_DEFAULTS = {"protein": MEDIUM, "carbs": MEDIUM, "fats": MEDIUM, "fiber": LOW}
+
+_LEVEL_WORDS = {
+    "alto": HIGH, "alta": HIGH, "high": HIGH, "elevado": HIGH, "elevada": HIGH, "abundante": HIGH,
+    "medio": MEDIUM, "media": MEDIUM, "medium": MEDIUM, "moderado": MEDIUM, "moderada": MEDIUM,
+    "moderate": MEDIUM, "intermedio": MEDIUM, "normal": MEDIUM, "adecuado": MEDIUM, "regular": MEDIUM,
+    "bajo": LOW, "baja": LOW, "low": LOW, "escaso": LOW, "escasa": LOW, "poco": LOW, "minimo": LOW,
+    "nulo": LOW, "ninguno": LOW, "none": LOW
+}
+
+# Estimaciones opcionales: clave del análisis de Claude -> clave numérica guardada
+_CALORIE_KEYS = ("calories", "kcal")
+_GRAM_SUFFIX = "_g"
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+def parse_level(value: Any) -> int:
+    """Convierte un nivel de Claude (texto o número) a su código; UNKNOWN si no se reconoce"""
+    if isinstance(value, bool):
+        return UNKNOWN
+    if isinstance(value, (int, float)):
+        return int(value) if int(value) == value and LOW <= value <= HIGH else UNKNOWN
+    if not isinstance(value, str):
+        return UNKNOWN
+    # La primera palabra reconocida decide: "muy alto" -> alto, "medio-alto" -> medio
+    for word in re.findall(r"[a-z]+", _normalize(value)):
+        if word in _LEVEL_WORDS:
+            return _LEVEL_WORDS[word]
+    return UNKNOWN
+
+def level_name(code: int) -> str:
+    return LEVEL_NAMES.get(code, "no determinado")
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return round(number, 1) if number >= 0 else None
+
+def encode_analysis(analysis: Optional[Dict]) -> Tuple[Dict, Dict[str, float], Dict[str, str]]:
+    """
+    Separa los nutrientes de un análisis de Claude.
+    Devuelve (análisis sin nutrientes ni estimaciones, valores numéricos, textos originales con matices)
+    """
+    analysis = dict(analysis or {})
+    levels = analysis.pop("nutrients", None)
+    grams = analysis.pop("grams", None)
+    calories = [analysis.pop(key) for key in _CALORIE_KEYS if key in analysis]
+
+    nutrients: Dict[str, float] = {}
+    raw: Dict[str, str] = {}
+    if isinstance(levels, dict):
+        for nutrient in NUTRIENTS:
+            if nutrient not in levels:
+                continue
+            value = levels[nutrient]
+            code = parse_level(value)
+            nutrients[nutrient] = code
+            if code == UNKNOWN or (isinstance(value, str) and _normalize(value).strip() not in _LEVEL_WORDS):
+                raw[nutrient] = str(value)
+
+    if calories and _number(calories[0]) is not None:
+        nutrients["kcal"] = _number(calories[0])
+    if isinstance(grams, dict):
+        for nutrient in NUTRIENTS:
+            amount = _number(grams.get(nutrient))
+            if amount is not None:
+                nutrients[nutrient + _GRAM_SUFFIX] = amount
+    return analysis, nutrients, raw
+
+def decode_levels(nutrients: Dict[str, float]) -> Dict[str, str]:
+    """Niveles como texto (para mostrarlos o enviarlos a Claude)"""
+    return {nutrient: level_name(int(nutrients[nutrient])) for nutrient in NUTRIENTS if nutrient in nutrients}
+
+def has_levels(nutrients: Optional[Dict]) -> bool:
+    return bool(nutrients) and any(nutrient in nutrients for nutrient in NUTRIENTS)
@@ -0,0 +1,141 @@
+"""Perfil nutricional acumulado de un usuario, actualizado con incrementos por cada comida analizada"""
+
+import re
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.models.nutrients import NUTRIENTS, NUTRIENT_DEFAULTS, has_levels
+from src.utils.time_utils import to_local
+
+_FOOD_KEY_INVALID = re.compile(r"[.$]")
+
+def food_key(food: str) -> str:
+    """Nombre de un alimento como clave del perfil (minúsculas y sin caracteres reservados de MongoDB)"""
+    return _FOOD_KEY_INVALID.sub("", re.sub(r"\s+", " ", food.lower())).strip()[:40]
+
+def meal_increments(meal_type: str, timestamp: datetime, foods: Iterable, nutrients: Dict,
+                    timezone_str: str) -> Dict[str, float]:
+    """Incrementos que suma una comida analizada al perfil (rutas con puntos, como en $inc)"""
+    local_time = to_local(timestamp, timezone_str)
+    day = f"days.{local_time.date().isoformat()}"
+    increments: Dict[str, float] = {"meals": 1, f"{day}.meals": 1, f"timing.{meal_type}.{local_time.hour}": 1}
+    if has_levels(nutrients):
+        increments[f"{day}.analyzed"] = 1
+        for nutrient in NUTRIENTS:
+            # Igual que en los resúmenes: un nivel que falta o no se reconoció cuenta como el valor por defecto
+            increments[f"{day}.{nutrient}"] = int(nutrients.get(nutrient) or NUTRIENT_DEFAULTS[nutrient])
+    if nutrients.get("kcal"):
+        increments[f"{day}.kcal"] = nutrients["kcal"]
+        increments[f"{day}.kcal_meals"] = 1
+    for key in {food_key(food) for food in foods or [] if isinstance(food, str)}:
+        if key:
+            increments[f"foods.{key}"] = 1
+    return increments
+
+def apply_increments(profile: Dict, increments: Dict[str, float]) -> None:
+    """Aplica en memoria los incrementos de meal_increments (para reconstruir un perfil)"""
+    for path, value in increments.items():
+        *parents, leaf = path.split(".")
+        node = profile
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[leaf] = node.get(leaf, 0) + value
+
+def stale_paths(profile: Dict, today: date, window_days: int, max_foods: int) -> List[str]:
+    """
+    Rutas que sobran en el perfil: los días fuera de la ventana, los alimentos que un
+    reanálisis dejó sin apariciones y, si hay bastantes más alimentos que max_foods, los
+    menos frecuentes
+    """
+    oldest = (today - timedelta(days=window_days - 1)).isoformat()
+    paths = [f"days.{day}" for day in profile.get("days", {}) if day < oldest]
+    paths.extend(f"foods.{food}" for food, count in profile.get("foods", {}).items() if count <= 0)
+    foods = {food: count for food, count in profile.get("foods", {}).items() if count > 0}
+    # Margen para que un alimento nuevo tenga ocasión de repetirse antes de descartarlo
+    if len(foods) > max_foods + max_foods // 2:
+        ranked = sorted(foods.items(), key=lambda item: item[1], reverse=True)
+        paths.extend(f"foods.{food}" for food, _ in ranked[max_foods:])
+    return paths
+
+class NutritionProfile:
+    def __init__(
+        self,
+        telegram_id: int,
+        meals: int = 0,
+        days: Optional[Dict[str, Dict]] = None,
+        foods: Optional[Dict[str, int]] = None,
+        timing: Optional[Dict[str, Dict[str, int]]] = None,
+        version: int = 0,
+        updated_at: Optional[datetime] = None
+    ):
+        self.telegram_id = telegram_id
+        # Comidas analizadas desde que existe el perfil
+        self.meals = meals
+        # Sumas por día local "AAAA-MM-DD": meals, analyzed, un campo por nutriente, kcal y kcal_meals
+        self.days = days or {}
+        self.foods = foods or {}
+        # Comidas por tipo y hora local: {"breakfast": {"8": 12, ...}, ...}
+        self.timing = timing or {}
+        # Aumenta con cada actualización (las recomendaciones se invalidan al cambiar)
+        self.version = version
+        self.updated_at = updated_at
+
+    def to_dict(self) -> Dict:
+        return {
+            "telegram_id": self.telegram_id,
+            "meals": self.meals,
+            "days": self.days,
+            "foods": self.foods,
+            "timing": self.timing,
+            "version": self.version,
+            "updated_at": self.updated_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'NutritionProfile':
+        return cls(
+            telegram_id=data["telegram_id"],
+            meals=data.get("meals", 0),
+            days=data.get("days"),
+            foods=data.get("foods"),
+            timing=data.get("timing"),
+            version=data.get("version", 0),
+            updated_at=data.get("updated_at")
+        )
+
+    def window(self, today: date, days: int) -> Dict:
+        """Totales de los últimos days días locales (incluido hoy)"""
+        oldest = (today - timedelta(days=days - 1)).isoformat()
+        totals = Counter()
+        logged_days = 0
+        for day, values in self.days.items():
+            if oldest <= day <= today.isoformat():
+                totals.update(values)
+                logged_days += 1
+        totals["logged_days"] = logged_days
+        return dict(totals)
+
+    def averages(self, today: date, days: int) -> Dict[str, float]:
+        """Nivel promedio por comida de cada nutriente y kcal promedio por día con registro de kcal"""
+        totals = self.window(today, days)
+        averages = {}
+        if totals.get("analyzed"):
+            averages.update({nutrient: totals[nutrient] / totals["analyzed"] for nutrient in NUTRIENTS})
+        if totals.get("kcal_meals"):
+            # Se estima el día completo: kcal medias por comida por comidas medias por día
+            meals_per_day = totals["meals"] / totals["logged_days"]
+            averages["kcal"] = totals["kcal"] / totals["kcal_meals"] * meals_per_day
+        return averages
+
+    def top_foods(self, limit: int) -> List[Tuple[str, int]]:
+        return sorted(self.foods.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def usual_hours(self) -> Dict[str, Tuple[int, int]]:
+        """Hora local más habitual de cada tipo de comida y cuántas comidas de ese tipo hay"""
+        usual = {}
+        for meal_type, hours in self.timing.items():
+            if hours:
+                hour, _ = max(hours.items(), key=lambda item: item[1])
+                usual[meal_type] = (int(hour), sum(hours.values()))
+        return usual
@@ -0,0 +1,78 @@
+"""Control de admisión: con el bot sobrecargado las comidas reciben un análisis local y Claude se difiere"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from telegram.ext import Application
+
+from src.config.settings import (
+    OVERLOAD_MAX_INFLIGHT_ANALYSES, OVERLOAD_MAX_LOOP_LAG_MS, OVERLOAD_MAX_QUEUE_DEPTH, OVERLOAD_CHECK_INTERVAL
+)
+from src.utils.logger import log_info
+from src.utils.metrics import registry
+
+DEGRADED_ANALYSES = registry.counter(
+    "nutribot_degraded_analyses_total", "Comidas respondidas con análisis local por sobrecarga", ["reason", "source"]
+)
+
+class AdmissionController:
+    def __init__(self, max_inflight: int = OVERLOAD_MAX_INFLIGHT_ANALYSES,
+                 max_loop_lag_ms: float = OVERLOAD_MAX_LOOP_LAG_MS,
+                 max_queue_depth: int = OVERLOAD_MAX_QUEUE_DEPTH):
+        self.max_inflight = max_inflight
+        self.max_loop_lag = max_loop_lag_ms / 1000
+        self.max_queue_depth = max_queue_depth
+        self.inflight = 0
+        self.loop_lag = 0.0
+        self._queue_depth: Callable[[], int] = lambda: 0
+        self._overloaded = False
+
+        registry.gauge("nutribot_analyses_in_flight", "Análisis con Claude en curso", lambda: self.inflight)
+        registry.gauge("nutribot_event_loop_lag_seconds", "Retraso suavizado del event loop", lambda: self.loop_lag)
+        registry.gauge("nutribot_overloaded", "1 si el bot está respondiendo con análisis locales",
+                       lambda: int(self._overloaded))
+
+    def attach(self, application: Application) -> None:
+        """Toma la profundidad de cola de la aplicación (recibidas sin despachar y esperando turno)"""
+        processor = application.update_processor
+        self._queue_depth = lambda: application.update_queue.qsize() + getattr(processor, "waiting_updates", 0)
+
+    @contextmanager
+    def track_analysis(self):
+        """Cuenta un análisis con Claude mientras dura"""
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+
+    def overload_reason(self) -> Optional[str]:
+        """Señal que supera su umbral, o None si se pueden admitir análisis completos"""
+        reason = None
+        if self.max_inflight and self.inflight >= self.max_inflight:
+            reason = "inflight"
+        elif self.max_loop_lag and self.loop_lag >= self.max_loop_lag:
+            reason = "loop_lag"
+        elif self.max_queue_depth and self._queue_depth() >= self.max_queue_depth:
+            reason = "queue"
+
+        if (reason is not None) != self._overloaded:
+            self._overloaded = reason is not None
+            if reason:
+                log_info(f"Sobrecarga detectada ({reason}): las comidas nuevas reciben un análisis preliminar")
+            else:
+                log_info("Carga normalizada: se vuelven a admitir análisis completos")
+        return reason
+
+    async def monitor(self, interval: float = OVERLOAD_CHECK_INTERVAL) -> None:
+        """Mide el retraso del event loop: lo que tarda en despertar un sleep más allá de lo pedido"""
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            lag = max(time.monotonic() - started - interval, 0.0)
+            # Sube de inmediato y baja de forma gradual, para no alternar en cada medición
+            self.loop_lag = lag if lag > self.loop_lag else self.loop_lag * 0.7 + lag * 0.3
+
+admission = AdmissionController()
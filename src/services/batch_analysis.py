@@ -0,0 +1,121 @@
+"""Análisis de comidas en segundo plano con la API de Message Batches"""
+
+import asyncio
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.config.settings import (
+    ANALYSIS_BATCH_MAX_REQUESTS, ANALYSIS_BATCH_POLL_INTERVAL, ANALYSIS_BATCH_CLAIM_SECONDS, PENDING_MEAL_CLAIM_SECONDS
+)
+from src.services.container import services
+from src.utils.logger import log_info, log_error
+from src.utils.metrics import registry
+
+BATCH_ANALYSES = registry.counter(
+    "nutribot_batch_analyses_total", "Análisis de comidas enviados por lotes por origen y resultado", ["source", "result"]
+)
+
+class BatchAnalyzer:
+    def __init__(self, max_requests: int = ANALYSIS_BATCH_MAX_REQUESTS):
+        self.max_requests = max_requests
+
+    def submit(self, query: Dict, source: str, limit: Optional[int] = None,
+               sort: Optional[List[Tuple]] = None, count_attempt: bool = False) -> Optional[str]:
+        """
+        Reserva hasta limit comidas de query (como mucho max_requests) y las envía en un lote.
+        Devuelve el id del trabajo, o None si no había comidas disponibles. Si el envío falla
+        las comidas se liberan y la excepción se propaga
+        """
+        job_id = uuid.uuid4().hex
+        meals = services.db.claim_meals_for_batch(
+            query, job_id, min(limit or self.max_requests, self.max_requests), ANALYSIS_BATCH_CLAIM_SECONDS,
+            sort, count_attempt
+        )
+        if not meals:
+            return None
+
+        preferences: Dict[int, Dict] = {}
+        for telegram_id in {meal_data["telegram_id"] for meal_data in meals}:
+            user = services.db.get_user(telegram_id)
+            preferences[telegram_id] = user.preferences if user else {}
+        try:
+            batch_id = services.claude.submit_analysis_batch([
+                (str(meal_data["_id"]), meal_data["text"], preferences[meal_data["telegram_id"]]) for meal_data in meals
+            ])
+        except Exception as e:
+            log_error(f"No se pudo enviar el lote de {len(meals)} análisis ({source})", e)
+            services.db.release_batch_meals(job_id)
+            raise
+
+        services.db.save_analysis_batch(job_id, batch_id, source, len(meals))
+        BATCH_ANALYSES.inc(source, "submitted", amount=len(meals))
+        log_info(f"Enviado el lote {batch_id} con {len(meals)} análisis ({source})")
+        return job_id
+
+    def collect(self, record: Dict) -> Optional[Dict[str, int]]:
+        """Aplica los resultados de un lote si ya terminó; None si sigue en curso o lo recoge otro proceso"""
+        if services.claude.analysis_batch_status(record["batch_id"]) != "ended":
+            return None
+        if not services.db.claim_analysis_batch(record["_id"], PENDING_MEAL_CLAIM_SECONDS):
+            return None
+
+        stats = {"updated": 0, "failed": 0}
+        for meal_id, analysis in services.claude.analysis_batch_results(record["batch_id"]):
+            if "error" in analysis or analysis.get("error_parsing"):
+                stats["failed"] += 1
+            elif services.db.update_meal_analysis(meal_id, analysis):
+                stats["updated"] += 1
+        # Las que fallaron (o no aparecen en los resultados) vuelven a su cola
+        stats["released"] = services.db.release_batch_meals(record["_id"])
+        services.db.finish_analysis_batch(record["_id"], stats)
+
+        for result in ("updated", "failed"):
+            if stats[result]:
+                BATCH_ANALYSES.inc(record["source"], result, amount=stats[result])
+        log_info(f"Lote {record['batch_id']} ({record['source']}) terminado: {stats}")
+        return stats
+
+    async def poll_once(self, job_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, int]]:
+        """Recoge los lotes abiertos (o solo los de job_ids) que ya terminaron"""
+        records = await asyncio.to_thread(
+            services.db.get_open_analysis_batches, list(job_ids) if job_ids is not None else None
+        )
+        collected = {}
+        for record in records:
+            try:
+                stats = await asyncio.to_thread(self.collect, record)
+            except Exception as e:
+                log_error(f"Error al recoger el lote de análisis {record['batch_id']}", e)
+                continue
+            if stats is not None:
+                collected[record["_id"]] = stats
+        return collected
+
+    async def wait(self, job_ids: Iterable[str], interval: float = ANALYSIS_BATCH_POLL_INTERVAL,
+                   on_collect=None) -> Dict[str, int]:
+        """Espera a que terminen los lotes indicados y devuelve los totales de sus resultados"""
+        pending = set(job_ids)
+        totals: Dict[str, int] = {}
+        while pending:
+            for job_id, stats in (await self.poll_once(pending)).items():
+                pending.discard(job_id)
+                for key, value in stats.items():
+                    totals[key] = totals.get(key, 0) + value
+                if on_collect:
+                    on_collect(job_id, stats)
+            # Los que ya no están abiertos los recogió otro proceso
+            open_jobs = {record["_id"] for record in await asyncio.to_thread(services.db.get_open_analysis_batches, list(pending))}
+            pending &= open_jobs
+            if pending:
+                await asyncio.sleep(interval)
+        return totals
+
+    async def run(self, interval: float = ANALYSIS_BATCH_POLL_INTERVAL) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.poll_once()
+            except Exception as e:
+                log_error("Error al consultar los lotes de análisis", e)
+
+batch_analyzer = BatchAnalyzer()
@@ -1,71 +1,152 @@
 import json
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 import anthropic
+import httpx
 from anthropic import Anthropic
 
-from src.config.settings import ANTHROPIC_API_KEY
+from src.config.settings import (
+    ANTHROPIC_API_KEY, ANTHROPIC_BASE_URL, ANTHROPIC_MAX_RETRIES, ANTHROPIC_CONNECT_TIMEOUT,
+    ANTHROPIC_ANALYSIS_TIMEOUT, ANTHROPIC_RECOMMENDATION_TIMEOUT, ANALYSIS_BATCH_TIMEOUT
+)
+from src.services.http_clients import build_anthropic_http_client
 from src.utils.logger import log_info, log_error
+from src.utils.metrics import timed, record_tokens
+
+ANALYSIS_MODEL = "claude-3-haiku-20240307"
+ANALYSIS_MAX_TOKENS = 1000
+ANALYSIS_SYSTEM_PROMPT = "Eres un asistente nutricional experto. Analiza las comidas y proporciona información nutricional precisa y recomendaciones basadas en las preferencias del usuario."
+# Se sube al cambiar el prompt o el modelo del análisis: los análisis anteriores pasan a ser
+# candidatos del reanálisis (scripts/reanalyze_meals.py)
+ANALYSIS_PROMPT_VERSION = 1
+# La API de lotes (Message Batches) cobra la mitad que las llamadas síncronas
+BATCH_PRICE_FACTOR = 0.5
 
 class ClaudeService:
     _instance = None
+    # Respuesta cuando Claude falla (no se guarda como recomendación precalculada)
+    RECOMMENDATIONS_UNAVAILABLE = "No se pudieron generar recomendaciones en este momento. Por favor, intenta de nuevo más tarde."
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(ClaudeService, cls).__new__(cls)
-            cls._instance.client = Anthropic(api_key=ANTHROPIC_API_KEY)
+            cls._instance.client = Anthropic(
+                api_key=ANTHROPIC_API_KEY,
+                base_url=ANTHROPIC_BASE_URL,
+                http_client=build_anthropic_http_client(),
+                max_retries=ANTHROPIC_MAX_RETRIES
+            )
         return cls._instance
 
+    def close(self):
+        """Cierra el pool de conexiones HTTP"""
+        self.client.close()
+        ClaudeService._instance = None
+
+    @timed("claude")
     def analyze_meal(self, meal_text: str, user_preferences: Dict) -> Dict:
         try:
-            # Construir el prompt para Claude
-            prompt = self._build_meal_analysis_prompt(meal_text, user_preferences)
-            
             # Llamar a la API de Claude
             response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=1000,
-                system="Eres un asistente nutricional experto. Analiza las comidas y proporciona información nutricional precisa y recomendaciones basadas en las preferencias del usuario.",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
+                **self._analysis_params(meal_text, user_preferences),
+                timeout=httpx.Timeout(ANTHROPIC_ANALYSIS_TIMEOUT, connect=ANTHROPIC_CONNECT_TIMEOUT)
             )
-            # Parsear la respuesta
-            try:
-                # Intentar extraer un JSON de la respuesta
-                content = response.content[0].text
-                # Buscar si hay un bloque JSON en la respuesta
-                if "```json" in content and "```" in content.split("```json", 1)[1]:
-                    json_str = content.split("```json", 1)[1].split("```", 1)[0].strip()
-                    return json.loads(json_str)
-                else:
-                    # Si no hay JSON, crear una estructura simplificada basada en el texto
-                    return {
-                        "foods": self._extract_foods(content),
-                        "nutrients": self._extract_nutrients(content),
-                        "summary": content.split("\n\n")[0] if "\n\n" in content else content[:200]
-                    }
-            except Exception as e:
-                log_error(f"Error al parsear la respuesta de Claude: {str(e)}")
-                # Devolver un formato simplificado con el texto completo
-                return {
-                    "raw_analysis": response.content[0].text,
-                    "error_parsing": True
-                }
+            record_tokens("analyze_meal", response.usage)
+            return self._parse_analysis(response)
                 
         except Exception as e:
             log_error(f"Error al llamar a la API de Claude: {str(e)}")
+            return self._analysis_error(str(e))
+
+    @timed("claude")
+    def submit_analysis_batch(self, items: List[Tuple[str, str, Dict]]) -> str:
+        """
+        Envía un lote de análisis a la API de Message Batches y devuelve su id.
+        items: (custom_id, texto de la comida, preferencias); custom_id identifica cada
+        resultado (letras, números, - y _, hasta 64 caracteres)
+        """
+        batch = self.client.messages.batches.create(
+            requests=[
+                {"custom_id": custom_id, "params": self._analysis_params(meal_text, user_preferences)}
+                for custom_id, meal_text, user_preferences in items
+            ],
+            timeout=httpx.Timeout(ANALYSIS_BATCH_TIMEOUT, connect=ANTHROPIC_CONNECT_TIMEOUT)
+        )
+        return batch.id
+
+    @timed("claude")
+    def analysis_batch_status(self, batch_id: str) -> str:
+        """Estado del procesamiento de un lote: in_progress, canceling o ended"""
+        return self.client.messages.batches.retrieve(batch_id).processing_status
+
+    def analysis_batch_results(self, batch_id: str) -> Iterator[Tuple[str, Dict]]:
+        """
+        Resultados de un lote terminado como (custom_id, análisis). Los elementos que
+        fallaron, se cancelaron o caducaron devuelven un análisis con "error", igual que
+        analyze_meal
+        """
+        for item in self.client.messages.batches.results(batch_id):
+            result = item.result
+            if result.type == "succeeded":
+                record_tokens("analyze_meal_batch", result.message.usage)
+                yield item.custom_id, self._parse_analysis(result.message)
+            elif result.type == "errored":
+                error = getattr(result.error, "error", None)
+                yield item.custom_id, self._analysis_error(getattr(error, "type", None) or "errored")
+            else:
+                yield item.custom_id, self._analysis_error(result.type)
+
+    def _analysis_params(self, meal_text: str, user_preferences: Dict) -> Dict:
+        """Parámetros de la llamada de análisis (los mismos en modo síncrono y por lotes)"""
+        return {
+            "model": ANALYSIS_MODEL,
+            "max_tokens": ANALYSIS_MAX_TOKENS,
+            "system": ANALYSIS_SYSTEM_PROMPT,
+            "messages": [
+                {"role": "user", "content": self._build_meal_analysis_prompt(meal_text, user_preferences)}
+            ]
+        }
+
+    def _parse_analysis(self, message) -> Dict:
+        """Convierte la respuesta de Claude en el análisis que se guarda"""
+        try:
+            # Intentar extraer un JSON de la respuesta
+            content = message.content[0].text
+            # Buscar si hay un bloque JSON en la respuesta
+            if "```json" in content and "```" in content.split("```json", 1)[1]:
+                json_str = content.split("```json", 1)[1].split("```", 1)[0].strip()
+                analysis = json.loads(json_str)
+            else:
+                # Si no hay JSON, crear una estructura simplificada basada en el texto
+                analysis = {
+                    "foods": self._extract_foods(content),
+                    "nutrients": self._extract_nutrients(content),
+                    "summary": content.split("\n\n")[0] if "\n\n" in content else content[:200]
+                }
+            analysis["prompt_version"] = ANALYSIS_PROMPT_VERSION
+            return analysis
+        except Exception as e:
+            log_error(f"Error al parsear la respuesta de Claude: {str(e)}")
+            # Devolver un formato simplificado con el texto completo
             return {
-                "error": str(e),
-                "foods": [],
-                "nutrients": {}
+                "raw_analysis": message.content[0].text if message.content else "",
+                "error_parsing": True
             }
+
+    @staticmethod
+    def _analysis_error(error: str) -> Dict:
+        return {
+            "error": error,
+            "foods": [],
+            "nutrients": {}
+        }
     
-    def generate_recommendations(self, recent_meals: List[Dict], user_preferences: Dict) -> str:
+    @timed("claude")
+    def generate_recommendations(self, nutrition_profile: str, user_preferences: Dict) -> str:
         """
-        Genera recomendaciones personalizadas basadas en las comidas recientes
+        Genera recomendaciones personalizadas basadas en el perfil nutricional del usuario
         
         Args:
-            recent_meals: Lista de comidas recientes con sus análisis
+            nutrition_profile: Resumen del perfil nutricional acumulado (ver summary_service.describe_profile)
             user_preferences: Preferencias del usuario
             
         Returns:
@@ -73,25 +154,37 @@ class ClaudeService:
         """
         try:
             # Construir el prompt para Claude
-            prompt = self._build_recommendations_prompt(recent_meals, user_preferences)
+            prompt = self._build_recommendations_prompt(nutrition_profile, user_preferences)
             
             # Llamar a la API de Claude
             response = self.client.messages.create(
                 model="claude-3-haiku-20240307",
                 max_tokens=1500,
-                system="Eres un asistente nutricional experto. Genera recomendaciones nutricionales personalizadas basadas en el historial de comidas y las preferencias del usuario.",
+                system="Eres un asistente nutricional experto. Genera recomendaciones nutricionales personalizadas basadas en el perfil nutricional y las preferencias del usuario.",
                 messages=[
                     {"role": "user", "content": prompt}
-                ]
+                ],
+                timeout=httpx.Timeout(ANTHROPIC_RECOMMENDATION_TIMEOUT, connect=ANTHROPIC_CONNECT_TIMEOUT)
             )
+            record_tokens("generate_recommendations", response.usage)
             
             return response.content[0].text
                 
         except Exception as e:
             log_error(f"Error al generar recomendaciones: {str(e)}")
-            return "No se pudieron generar recomendaciones en este momento. Por favor, intenta de nuevo más tarde."
+            return self.RECOMMENDATIONS_UNAVAILABLE
         
-    def _build_meal_analysis_prompt(self, meal_text: str, user_preferences: Dict) -> str:
+    @classmethod
+    def estimate_analysis_input_tokens(cls, meal_text: str, user_preferences: Dict) -> int:
+        """
+        Tokens de entrada aproximados de un análisis (unos 3,5 caracteres por token en español).
+        No llama a la API ni necesita crear el cliente
+        """
+        prompt = cls._build_meal_analysis_prompt(meal_text, user_preferences)
+        return round((len(ANALYSIS_SYSTEM_PROMPT) + len(prompt)) / 3.5)
+
+    @staticmethod
+    def _build_meal_analysis_prompt(meal_text: str, user_preferences: Dict) -> str:
         """Construye el prompt para el análisis de comidas"""
         dietary_restrictions = user_preferences.get("dietary_restrictions", [])
         goals = user_preferences.get("goals", [])
@@ -117,23 +210,22 @@ class ClaudeService:
                 "fats": "nivel",
                 "fiber": "nivel"
             }},
+            "calories": kcal aproximadas (número),
+            "grams": {{"protein": g, "carbs": g, "fats": g, "fiber": g}},
             "summary": "Breve análisis nutricional de la comida"
             }}
+            Usa "alto", "medio" o "bajo" como nivel. Las kcal y los gramos son estimaciones aproximadas.
             """
         return prompt
     
-    def _build_recommendations_prompt(self, recent_meals: List[Dict], user_preferences: Dict) -> str:
+    def _build_recommendations_prompt(self, nutrition_profile: str, user_preferences: Dict) -> str:
         """Construye el prompt para generar recomendaciones"""
         dietary_restrictions = user_preferences.get("dietary_restrictions", [])
         goals = user_preferences.get("goals", [])
         
-        meals_text = "\n".join([
-            f"- {meal.get('meal_type', 'Comida')}: {meal.get('text', 'No especificado')}" 
-            for meal in recent_meals
-        ])
-        
-        prompt = f"""Eres un asistente nutricional experto. Genera recomendaciones personalizadas basadas en el historial de comidas recientes de un usuario.
-            Comidas recientes: {meals_text}
+        prompt = f"""Eres un asistente nutricional experto. Genera recomendaciones personalizadas basadas en el perfil nutricional de las últimas semanas de un usuario.
+            Perfil nutricional:
+            {nutrition_profile}
             El usuario tiene las siguientes preferencias:
             Restricciones dietéticas: {', '.join(dietary_restrictions) if dietary_restrictions else 'Ninguna'}
             Objetivos: {', '.join(goals) if goals else 'No especificados'}
@@ -0,0 +1,110 @@
+"""Contenedor de servicios que se crean la primera vez que se usan"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable
+
+from src.utils.logger import log_info, log_error
+
+if TYPE_CHECKING:
+    from src.services.claude_service import ClaudeService
+    from src.services.db_service import DatabaseService
+    from src.services.scheduler_service import SchedulerService
+
+def _create_db() -> "DatabaseService":
+    from src.services.db_service import DatabaseService
+    return DatabaseService()
+
+def _create_claude() -> "ClaudeService":
+    from src.services.claude_service import ClaudeService
+    return ClaudeService()
+
+def _create_scheduler() -> "SchedulerService":
+    from src.services.scheduler_service import SchedulerService
+    return SchedulerService()
+
+class ServiceContainer:
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.timings: Dict[str, float] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        """Registra cómo crear un servicio (reemplaza la fábrica anterior)"""
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        """Devuelve el servicio, creándolo si es la primera vez (seguro entre hilos)"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                started = time.perf_counter()
+                instance = self._factories[name]()
+                self.timings[name] = time.perf_counter() - started
+                self._instances[name] = instance
+                log_info(f"Servicio {name} creado en {self.timings[name] * 1000:.0f} ms")
+        return instance
+
+    @property
+    def db(self) -> "DatabaseService":
+        return self.get("db")
+
+    @property
+    def claude(self) -> "ClaudeService":
+        return self.get("claude")
+
+    @property
+    def scheduler(self) -> "SchedulerService":
+        return self.get("scheduler")
+
+    async def initialize(self, bot, warm: Iterable[str] = ("db", "claude")) -> None:
+        """Prepara los servicios al arrancar la aplicación (post_init)"""
+        # El planificador envía los recordatorios con el mismo Bot (y pool de conexiones) que los handlers
+        self.scheduler.attach_bot(bot)
+
+        # Crear los clientes en paralelo y fuera del event loop para que la primera actualización no lo pague
+        await asyncio.gather(*(asyncio.to_thread(self.get, name) for name in warm))
+
+        try:
+            await asyncio.to_thread(self.db.ensure_indexes)
+        except Exception as e:
+            log_error("No se pudieron crear los índices de MongoDB", e)
+
+    async def close(self) -> None:
+        """Cierra los servicios creados, en orden inverso de creación (post_shutdown)"""
+        with self._lock:
+            instances = list(self._instances.items())
+            self._instances.clear()
+
+        for name, instance in reversed(instances):
+            close = getattr(instance, "close", None)
+            if close is None:
+                continue
+            try:
+                await asyncio.to_thread(close)
+            except Exception as e:
+                log_error(f"Error al cerrar el servicio {name}", e)
+
+    def reset(self) -> None:
+        """Olvida los servicios heredados sin cerrarlos (proceso hijo tras un fork)"""
+        for instance in self._instances.values():
+            # Los servicios son singletons: el hijo debe poder crear los suyos
+            if getattr(type(instance), "_instance", None) is instance:
+                type(instance)._instance = None
+        self._lock = threading.Lock()
+        self._instances.clear()
+
+services = ServiceContainer()
+services.register("db", _create_db)
+services.register("claude", _create_claude)
+services.register("scheduler", _create_scheduler)
+
+# Los clientes de MongoDB y HTTP no sobreviven a un fork: cada worker crea los suyos
+os.register_at_fork(after_in_child=services.reset)
@@ -1,11 +1,22 @@
-from typing import List, Dict, Optional, Any
-from pymongo import MongoClient
+from datetime import datetime, timedelta
+from typing import Iterator, List, Dict, Optional, Any, Tuple
+from bson import ObjectId
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import BulkWriteError
 from pymongo.collection import Collection
 from pymongo.database import Database
 
-from src.config.settings import MONGODB_URI
+from src.config.settings import (
+    MONGODB_URI, DEDUP_TTL_SECONDS, PRECOMPUTE_TTL_SECONDS, PROFILE_WINDOW_DAYS, PROFILE_MAX_FOODS
+)
 from src.models.user import User
 from src.models.meal import Meal
+from src.models.nutrients import NUTRIENTS, encode_analysis, has_levels as has_nutrient_levels
+from src.models.profile import NutritionProfile, meal_increments, stale_paths
+from src.services.recommendation_cache import recommendation_cache
+from src.utils.logger import log_error
+from src.utils.metrics import timed
+from src.utils.time_utils import local_today
 
 """operaciones de bd. Patron Singleton para una unica conexion a la base de datos"""
 class DatabaseService:
@@ -23,8 +34,47 @@ class DatabaseService:
         """Inicializa las colecciones de la base de datos"""
         self.users_collection = self.db.users
         self.meals_collection = self.db.meals
+        self.processed_updates_collection = self.db.processed_updates
+        self.precomputed_collection = self.db.precomputed_results
+        self.profiles_collection = self.db.nutrition_profiles
+        self.analysis_batches_collection = self.db.analysis_batches
+
+    def ensure_indexes(self):
+        """Crea los índices que necesitan las consultas en segundo plano (idempotente)"""
+        # Comidas de un usuario por rango de fechas (resúmenes del día, la semana y el mes)
+        self.meals_collection.create_index([("telegram_id", 1), ("timestamp", 1)])
+        self.meals_collection.create_index(
+            [("pending_analysis", 1), ("timestamp", 1)],
+            partialFilterExpression={"pending_analysis": True}
+        )
+        # Las claves de actualizaciones procesadas caducan solas (Telegram no reenvía más allá de 24 h)
+        self.processed_updates_collection.create_index(
+            "created_at", expireAfterSeconds=DEDUP_TTL_SECONDS
+        )
+        # Un resultado precalculado por usuario y tipo; los viejos caducan solos
+        self.precomputed_collection.create_index([("telegram_id", 1), ("kind", 1)], unique=True)
+        self.precomputed_collection.create_index("created_at", expireAfterSeconds=PRECOMPUTE_TTL_SECONDS)
+        # Usuarios con comidas recientes (trabajo de precálculo)
+        self.meals_collection.create_index("timestamp")
+        self.profiles_collection.create_index("telegram_id", unique=True)
+        # Comidas importadas con el análisis completo pendiente
+        self.meals_collection.create_index(
+            [("import_pending", 1), ("timestamp", -1)],
+            partialFilterExpression={"import_pending": True}
+        )
+        # Comidas enviadas en un lote de análisis y lotes sin recoger
+        self.meals_collection.create_index("analysis_batch", sparse=True)
+        self.analysis_batches_collection.create_index("status")
+        # Los lotes terminados se conservan una semana para consultarlos
+        self.analysis_batches_collection.create_index("ended_at", expireAfterSeconds=7 * 24 * 3600)
+
+    def close(self):
+        """Cierra la conexión; la próxima instancia abrirá una nueva"""
+        self.client.close()
+        DatabaseService._instance = None
 
     # Métodos para usuarios
+    @timed("db")
     def save_user(self, user: User) -> str:
         """Guarda un usuario en la base de datos"""
         user_dict = user.to_dict()
@@ -35,19 +85,23 @@ class DatabaseService:
         )
         return str(result.upserted_id) if result.upserted_id else str(user.telegram_id)
 
+    @timed("db")
     def get_user(self, telegram_id: int) -> Optional[User]:
         """Recupera un usuario por su ID de Telegram"""
         user_data = self.users_collection.find_one({"telegram_id": telegram_id})
         return User.from_dict(user_data) if user_data else None
 
+    @timed("db")
     def update_user_preferences(self, telegram_id: int, preferences: Dict) -> bool:
         """Actualiza las preferencias de un usuario"""
         result = self.users_collection.update_one(
             {"telegram_id": telegram_id},
             {"$set": {"preferences": preferences}}
         )
+        recommendation_cache.invalidate(telegram_id, "preferences")
         return result.modified_count > 0
 
+    @timed("db")
     def update_user_reminders(self, telegram_id: int, reminder_settings: Dict) -> bool:
         """Actualiza la configuración de recordatorios de un usuario"""
         result = self.users_collection.update_one(
@@ -57,25 +111,208 @@ class DatabaseService:
         return result.modified_count > 0
 
     # Métodos para comidas
-    def save_meal(self, meal: Meal) -> str:
-        """Guarda una comida en la base de datos"""
+    @timed("db")
+    def save_meal(self, meal: Meal, claimed: bool = False) -> str:
+        """Guarda una comida en la base de datos (claimed: reservada por el proceso que la analiza)"""
         meal_dict = meal.to_dict()
+        if claimed:
+            meal_dict["claimed_at"] = datetime.utcnow()
         result = self.meals_collection.insert_one(meal_dict)
+        recommendation_cache.invalidate(meal.telegram_id, "meal")
+        # Una comida que se guarda ya analizada (análisis en caché) entra al perfil ahora
+        if meal.analyzed:
+            self._record_in_profile(
+                meal.telegram_id, [(meal.meal_type, meal.timestamp, meal.analysis.get("foods"), meal.nutrients)]
+            )
         return str(result.inserted_id)
 
+    @timed("db")
+    def save_meals(self, telegram_id: int, meals: List[Meal]) -> int:
+        """Guarda un lote de comidas de un usuario con una sola escritura (importación de historiales)"""
+        if not meals:
+            return 0
+        result = self.meals_collection.insert_many([meal.to_dict() for meal in meals], ordered=False)
+        recommendation_cache.invalidate(telegram_id, "meal")
+        analyzed = [
+            (meal.meal_type, meal.timestamp, meal.analysis.get("foods"), meal.nutrients) for meal in meals if meal.analyzed
+        ]
+        if analyzed:
+            self._record_in_profile(telegram_id, analyzed)
+        return len(result.inserted_ids)
+
+    @timed("db")
     def update_meal_analysis(self, meal_id: str, analysis: Dict) -> bool:
-        """Actualiza el análisis de una comida"""
-        result = self.meals_collection.update_one(
-            {"_id": meal_id},
+        """Actualiza el análisis de una comida (los niveles de nutrientes se guardan como números)"""
+        analysis, nutrients, nutrients_raw = encode_analysis(analysis)
+        update = {
+            "$set": {
+                "analyzed": True,
+                "analysis": analysis,
+                "nutrients": nutrients,
+                "pending_analysis": False
+            },
+            "$unset": {"claimed_at": "", "import_pending": "", "analysis_batch": "", "batch_claimed_at": ""}
+        }
+        if nutrients_raw:
+            update["$set"]["nutrients_raw"] = nutrients_raw
+        else:
+            update["$unset"]["nutrients_raw"] = ""
+        previous = self.meals_collection.find_one_and_update(
+            {"_id": ObjectId(meal_id)}, update,
+            projection={"telegram_id": 1, "meal_type": 1, "timestamp": 1, "analyzed": 1, "analysis.foods": 1, "nutrients": 1}
+        )
+        if previous is None:
+            return False
+        # Un reanálisis reemplaza en el perfil lo que aportaba el análisis anterior
+        removed = []
+        if previous.get("analyzed"):
+            removed.append((
+                previous["meal_type"], previous["timestamp"],
+                (previous.get("analysis") or {}).get("foods"), previous.get("nutrients") or {}
+            ))
+        self._record_in_profile(
+            previous["telegram_id"], [(previous["meal_type"], previous["timestamp"], analysis.get("foods"), nutrients)],
+            removed
+        )
+        return True
+
+    @timed("db")
+    def release_pending_meal(self, meal_id: str) -> bool:
+        """Libera la reserva de una comida pendiente para que se retome en el próximo arranque"""
+        result = self.meals_collection.update_one({"_id": ObjectId(meal_id)}, {"$unset": {"claimed_at": ""}})
+        return result.modified_count > 0
+
+    @timed("db")
+    def claim_pending_meal(self, max_attempts: int, claim_seconds: float) -> Optional[Dict]:
+        """
+        Reserva la comida pendiente de análisis más antigua para retomarla.
+        La reserva es atómica (varios workers pueden retomar a la vez) y caduca tras
+        claim_seconds por si el proceso que la tomó también se detiene.
+        """
+        now = datetime.utcnow()
+        return self.meals_collection.find_one_and_update(
+            {
+                "pending_analysis": True,
+                "resume_attempts": {"$not": {"$gte": max_attempts}},
+                "$or": [
+                    {"claimed_at": {"$exists": False}},
+                    {"claimed_at": {"$lt": now - timedelta(seconds=claim_seconds)}}
+                ]
+            },
+            {"$set": {"claimed_at": now}, "$inc": {"resume_attempts": 1}},
+            sort=[("timestamp", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    @timed("db")
+    def get_meal_keys(self, telegram_id: int, start_date, end_date) -> List[Dict]:
+        """timestamp y text de las comidas de un usuario en un rango (detección de duplicados al importar)"""
+        return list(self.meals_collection.find(
+            {"telegram_id": telegram_id, "timestamp": {"$gte": start_date, "$lte": end_date}},
+            {"_id": 0, "timestamp": 1, "text": 1}
+        ))
+
+    @timed("db")
+    def claim_import_meal(self, max_attempts: int, claim_seconds: float) -> Optional[Dict]:
+        """
+        Reserva una comida importada con el análisis completo pendiente (las más recientes
+        primero: son las que más pesan en los resúmenes y el perfil)
+        """
+        now = datetime.utcnow()
+        return self.meals_collection.find_one_and_update(
             {
-                "$set": {
-                    "analyzed": True,
-                    "analysis": analysis
-                }
-            }
+                "import_pending": True,
+                "resume_attempts": {"$not": {"$gte": max_attempts}},
+                "$or": [
+                    {"claimed_at": {"$exists": False}},
+                    {"claimed_at": {"$lt": now - timedelta(seconds=claim_seconds)}}
+                ],
+                # Las que están en un lote de análisis las completa ese lote
+                "analysis_batch": {"$exists": False}
+            },
+            {"$set": {"claimed_at": now}, "$inc": {"resume_attempts": 1}},
+            sort=[("timestamp", -1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    @timed("db")
+    def claim_meals_for_batch(self, query: Dict, job_id: str, limit: int, claim_seconds: float,
+                              sort: Optional[List[Tuple]] = None, count_attempt: bool = False) -> List[Dict]:
+        """
+        Reserva hasta limit comidas de query para un lote de análisis y las devuelve.
+        Se saltan las que ya están en otro lote, salvo que su reserva tenga más de
+        claim_seconds (el proceso que las envió no llegó a registrar el lote).
+        count_attempt suma un intento (resume_attempts), como las colas de análisis
+        """
+        now = datetime.utcnow()
+        available = {"$and": [query, {"$or": [
+            {"analysis_batch": {"$exists": False}},
+            {"batch_claimed_at": {"$lt": now - timedelta(seconds=claim_seconds)}}
+        ]}]}
+        cursor = self.meals_collection.find(available, {"_id": 1})
+        if sort:
+            cursor = cursor.sort(sort)
+        ids = [document["_id"] for document in cursor.limit(limit)]
+        if not ids:
+            return []
+        update = {"$set": {"analysis_batch": job_id, "batch_claimed_at": now}}
+        if count_attempt:
+            update["$inc"] = {"resume_attempts": 1}
+        # Se repite la condición: si otro proceso reservó alguna a la vez, se queda con ella
+        self.meals_collection.update_many({"$and": [available, {"_id": {"$in": ids}}]}, update)
+        return list(self.meals_collection.find({"analysis_batch": job_id}, {"telegram_id": 1, "text": 1}))
+
+    @timed("db")
+    def release_batch_meals(self, job_id: str) -> int:
+        """Devuelve a su cola las comidas de un lote que no recibieron un análisis válido"""
+        result = self.meals_collection.update_many(
+            {"analysis_batch": job_id}, {"$unset": {"analysis_batch": "", "batch_claimed_at": ""}}
+        )
+        return result.modified_count
+
+    @timed("db")
+    def save_analysis_batch(self, job_id: str, batch_id: str, source: str, meals: int) -> None:
+        self.analysis_batches_collection.insert_one({
+            "_id": job_id, "batch_id": batch_id, "source": source, "meals": meals,
+            "status": "in_progress", "created_at": datetime.utcnow()
+        })
+
+    @timed("db")
+    def get_open_analysis_batches(self, job_ids: Optional[List[str]] = None) -> List[Dict]:
+        query: Dict[str, Any] = {"status": {"$in": ["in_progress", "collecting"]}}
+        if job_ids is not None:
+            query["_id"] = {"$in": job_ids}
+        return list(self.analysis_batches_collection.find(query))
+
+    @timed("db")
+    def claim_analysis_batch(self, job_id: str, claim_seconds: float) -> bool:
+        """Reserva un lote terminado para aplicar sus resultados (un solo proceso lo recoge)"""
+        now = datetime.utcnow()
+        result = self.analysis_batches_collection.update_one(
+            {"_id": job_id, "$or": [
+                {"status": "in_progress"},
+                {"status": "collecting", "collecting_at": {"$lt": now - timedelta(seconds=claim_seconds)}}
+            ]},
+            {"$set": {"status": "collecting", "collecting_at": now}}
         )
         return result.modified_count > 0
 
+    @timed("db")
+    def finish_analysis_batch(self, job_id: str, stats: Dict[str, int]) -> None:
+        self.analysis_batches_collection.update_one(
+            {"_id": job_id}, {"$set": {"status": "ended", "ended_at": datetime.utcnow(), **stats}}
+        )
+
+    @timed("db")
+    def get_meals_after(self, query: Dict, after_id: Optional[str], limit: int) -> List[Dict]:
+        """Siguiente lote de comidas que cumplen query, en orden de _id (recorridos reanudables)"""
+        if after_id:
+            query = {"$and": [query, {"_id": {"$gt": ObjectId(after_id)}}]}
+        return list(self.meals_collection.find(
+            query, {"telegram_id": 1, "text": 1, "analyzed": 1, "analysis": 1}
+        ).sort("_id", 1).limit(limit))
+
+    @timed("db")
     def get_meals_by_user_and_date(self, telegram_id: int, start_date, end_date) -> List[Meal]:
         """Obtiene las comidas de un usuario en un rango de fechas"""
         meals_data = self.meals_collection.find({
@@ -85,6 +322,19 @@ class DatabaseService:
         
         return [Meal.from_dict(meal_data) for meal_data in meals_data]
 
+    def iter_user_meals(self, telegram_id: int, batch_size: int) -> Iterator[Dict]:
+        """
+        Todas las comidas de un usuario, de la más antigua a la más reciente, leídas por lotes
+        del cursor (para exportar historiales de cualquier tamaño sin cargarlos en memoria)
+        """
+        cursor = self.meals_collection.find(
+            {"telegram_id": telegram_id},
+            {"chat_id": 0, "claimed_at": 0, "resume_attempts": 0}
+        ).sort("timestamp", 1).batch_size(batch_size)
+        with cursor:
+            yield from cursor
+
+    @timed("db")
     def get_recent_meals(self, telegram_id: int, limit: int = 5) -> List[Meal]:
         """Obtiene las comidas más recientes de un usuario"""
         meals_data = self.meals_collection.find(
@@ -92,8 +342,183 @@ class DatabaseService:
         ).sort("timestamp", -1).limit(limit)
         
         return [Meal.from_dict(meal_data) for meal_data in meals_data]
+
+    @timed("db")
+    def get_meal_fingerprints(self, telegram_id: int, start_date=None, end_date=None, limit: int = 0) -> List[Dict]:
+        """
+        _id, analyzed y nutrients de las comidas de un usuario (lo que cambia un resumen o una
+        recomendación), de la más reciente a la más antigua
+        """
+        query = {"telegram_id": telegram_id}
+        if start_date is not None:
+            query["timestamp"] = {"$gte": start_date, "$lte": end_date}
+        cursor = self.meals_collection.find(query, {"analyzed": 1, "nutrients": 1}).sort("timestamp", -1)
+        return list(cursor.limit(limit))
+
+    @timed("db")
+    def get_users_with_meals_since(self, since: datetime) -> List[Dict]:
+        """Usuarios con comidas desde since: telegram_id, zona horaria y hora de su última comida"""
+        last_meals = {
+            row["_id"]: row["last_meal"]
+            for row in self.meals_collection.aggregate([
+                {"$match": {"timestamp": {"$gte": since}}},
+                {"$group": {"_id": "$telegram_id", "last_meal": {"$max": "$timestamp"}}}
+            ])
+        }
+        if not last_meals:
+            return []
+        users = self.users_collection.find(
+            {"telegram_id": {"$in": list(last_meals)}}, {"telegram_id": 1, "timezone": 1}
+        )
+        return [
+            {"telegram_id": user["telegram_id"], "timezone": user["timezone"], "last_meal": last_meals[user["telegram_id"]]}
+            for user in users
+        ]
+
+    @timed("db")
+    def get_daily_rollups(self, telegram_id: int, start_date, end_date, timezone: str,
+                          defaults: Dict[str, int]) -> List[Dict]:
+        """
+        Agrega en el servidor las comidas de un rango por día local: una fila por día con el
+        número de comidas y la suma de cada nivel de nutriente (los que faltan o no se
+        reconocieron cuentan como defaults; las comidas sin analizar no suman). Las comidas
+        guardadas antes de los niveles numéricos y sin migrar traen sus niveles de texto, que
+        se convierten aquí con parse_level igual que al cargar una comida
+        """
+        has_levels = {"$and": [
+            "$analyzed",
+            {"$or": [{"$gt": [f"$nutrients.{nutrient}", None]} for nutrient in NUTRIENTS]}
+        ]}
+        unmigrated = {"$and": ["$analyzed", {"$eq": [{"$ifNull": ["$nutrients", None]}, None]}]}
+
+        def nutrient_value(nutrient: str) -> Dict:
+            level = {"$ifNull": [f"$nutrients.{nutrient}", 0]}
+            return {"$cond": [has_levels, {"$cond": [{"$gt": [level, 0]}, level, defaults[nutrient]]}, 0]}
+
+        group = {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp", "timezone": timezone}},
+            "meals": {"$sum": 1},
+            "text_levels": {"$push": {"$cond": [unmigrated, "$analysis.nutrients", None]}}
+        }
+        group.update({nutrient: {"$sum": nutrient_value(nutrient)} for nutrient in defaults})
+        rollups = list(self.meals_collection.aggregate([
+            {"$match": {"telegram_id": telegram_id, "timestamp": {"$gte": start_date, "$lte": end_date}}},
+            {"$group": group}
+        ]))
+        for rollup in rollups:
+            for levels in rollup.pop("text_levels"):
+                _, nutrients, _ = encode_analysis({"nutrients": levels})
+                if has_nutrient_levels(nutrients):
+                    for nutrient in defaults:
+                        rollup[nutrient] += nutrients.get(nutrient) or defaults[nutrient]
+        return rollups
     
 
+    # Métodos para el perfil nutricional
+    def _record_in_profile(self, telegram_id: int, meals: List[Tuple], removed: List[Tuple] = ()) -> None:
+        """Suma comidas analizadas al perfil; un fallo no afecta al guardado de las comidas"""
+        try:
+            self.update_nutrition_profile(telegram_id, meals, removed)
+        except Exception as e:
+            log_error(f"Error al actualizar el perfil nutricional del usuario {telegram_id}", e)
+
+    @timed("db")
+    def update_nutrition_profile(self, telegram_id: int, meals: List[Tuple], removed: List[Tuple] = ()) -> bool:
+        """
+        Suma comidas analizadas (tipo, fecha, alimentos, nutrientes) al perfil con un único $inc
+        (atómico aunque otro proceso actualice a la vez) y luego quita los días fuera de la
+        ventana y los alimentos que sobran. removed son análisis anteriores que se restan (reanálisis).
+        Si el usuario todavía no tiene perfil no se crea uno parcial: se construye completo con
+        sus comidas la primera vez que se necesita
+        """
+        user = self.users_collection.find_one({"telegram_id": telegram_id}, {"timezone": 1})
+        timezone_str = user["timezone"] if user else "UTC"
+        increments: Dict[str, float] = {}
+        for sign, entries in ((1, meals), (-1, removed)):
+            for meal_type, timestamp, foods, nutrients in entries:
+                for path, value in meal_increments(meal_type, timestamp, foods, nutrients, timezone_str).items():
+                    increments[path] = increments.get(path, 0) + sign * value
+        increments = {path: value for path, value in increments.items() if value}
+        increments["version"] = 1
+        profile = self.profiles_collection.find_one_and_update(
+            {"telegram_id": telegram_id},
+            {"$inc": increments, "$set": {"updated_at": datetime.utcnow()}},
+            projection={"days": 1, "foods": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if profile is None:
+            return False
+        today = local_today(timezone_str)
+        paths = stale_paths(profile, today, PROFILE_WINDOW_DAYS, PROFILE_MAX_FOODS)
+        if paths:
+            self.profiles_collection.update_one(
+                {"telegram_id": telegram_id}, {"$unset": {path: "" for path in paths}}
+            )
+        return True
+
+    @timed("db")
+    def get_nutrition_profile(self, telegram_id: int) -> Optional[NutritionProfile]:
+        data = self.profiles_collection.find_one({"telegram_id": telegram_id})
+        return NutritionProfile.from_dict(data) if data else None
+
+    @timed("db")
+    def get_nutrition_profile_version(self, telegram_id: int) -> Optional[int]:
+        data = self.profiles_collection.find_one({"telegram_id": telegram_id}, {"version": 1})
+        return data.get("version", 0) if data else None
+
+    @timed("db")
+    def replace_nutrition_profile(self, profile: NutritionProfile) -> int:
+        """Reemplaza el contenido del perfil (reconstrucción) y devuelve su nueva versión"""
+        fields = profile.to_dict()
+        fields.pop("version")
+        fields["updated_at"] = datetime.utcnow()
+        data = self.profiles_collection.find_one_and_update(
+            {"telegram_id": profile.telegram_id},
+            {"$set": fields, "$inc": {"version": 1}},
+            projection={"version": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return data["version"]
+
+    # Métodos para resultados precalculados
+    @timed("db")
+    def save_precomputed(self, telegram_id: int, kind: str, fingerprint: str, payload: Any) -> None:
+        """Guarda (reemplaza) el resultado precalculado de un usuario junto con la huella de sus datos"""
+        self.precomputed_collection.update_one(
+            {"telegram_id": telegram_id, "kind": kind},
+            {"$set": {"fingerprint": fingerprint, "payload": payload, "created_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    @timed("db")
+    def get_precomputed(self, telegram_id: int, kind: str) -> Optional[Dict]:
+        return self.precomputed_collection.find_one({"telegram_id": telegram_id, "kind": kind})
+
+    # Métodos para actualizaciones procesadas
+    @timed("db")
+    def updates_processed(self, keys: List[str]) -> bool:
+        """Si alguna de las claves de una actualización ya está registrada (es un reenvío)"""
+        return self.processed_updates_collection.find_one({"_id": {"$in": keys}}, {"_id": 1}) is not None
+
+    @timed("db")
+    def mark_updates_processed(self, keys: List[str]) -> bool:
+        """
+        Registra las claves de una actualización terminada; False si alguna ya estaba registrada.
+        El _id único evita claves repetidas aunque dos procesos la registren a la vez.
+        """
+        now = datetime.utcnow()
+        try:
+            self.processed_updates_collection.insert_many(
+                [{"_id": key, "created_at": now} for key in keys], ordered=False
+            )
+        except BulkWriteError as e:
+            if any(error.get("code") == 11000 for error in e.details.get("writeErrors", [])):
+                return False
+            raise
+        return True
+
+    @timed("db")
     def get_users_with_active_reminders(self) -> List[Dict]:
         # Obtener todos los usuarios con recordatorios activos
         users_data = self.users_collection.find({
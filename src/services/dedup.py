@@ -0,0 +1,75 @@
+"""Deduplicación de las actualizaciones que Telegram vuelve a entregar"""
+
+import asyncio
+from collections import OrderedDict
+from typing import List
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+from src.config.settings import DEDUP_MEMORY_SIZE
+from src.services.container import services
+from src.utils.logger import log_info, log_error
+from src.utils.metrics import registry
+
+DUPLICATE_UPDATES = registry.counter(
+    "nutribot_duplicate_updates_total", "Actualizaciones reenviadas descartadas", ["source"]
+)
+
+class UpdateDeduplicator:
+    def __init__(self, memory_size: int = DEDUP_MEMORY_SIZE):
+        self.memory_size = memory_size
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+
+    @staticmethod
+    def keys_for(update: Update) -> List[str]:
+        keys = [f"upd:{update.update_id}"]
+        # Solo los mensajes nuevos: una edición reutiliza el message_id y es un evento distinto
+        if update.message:
+            keys.append(f"msg:{update.message.chat_id}:{update.message.message_id}")
+        return keys
+
+    def _remember(self, keys: List[str]) -> None:
+        for key in keys:
+            self._seen[key] = None
+            self._seen.move_to_end(key)
+        while len(self._seen) > self.memory_size:
+            self._seen.popitem(last=False)
+
+    async def is_duplicate(self, update: Update) -> bool:
+        """Dice si la actualización ya se recibió en este proceso o se procesó en cualquiera"""
+        keys = self.keys_for(update)
+        if any(key in self._seen for key in keys):
+            DUPLICATE_UPDATES.inc("memory")
+            return True
+        self._remember(keys)
+
+        try:
+            processed = await asyncio.to_thread(services.db.updates_processed, keys)
+        except Exception as e:
+            # Si MongoDB falla se procesa igual: mejor un posible duplicado que perder el mensaje
+            log_error(f"No se pudo comprobar si la actualización {update.update_id} ya se procesó", e)
+            return False
+
+        if processed:
+            DUPLICATE_UPDATES.inc("database")
+        return processed
+
+    def mark_done(self, update: object) -> None:
+        """Registra en MongoDB una actualización terminada (fuera del event loop)"""
+        if isinstance(update, Update):
+            asyncio.get_running_loop().run_in_executor(None, self._store, update)
+
+    def _store(self, update: Update) -> None:
+        try:
+            services.db.mark_updates_processed(self.keys_for(update))
+        except Exception as e:
+            log_error(f"No se pudo registrar la actualización {update.update_id} como procesada", e)
+
+deduplicator = UpdateDeduplicator()
+
+async def drop_duplicate_updates(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Primer handler de todos: corta el procesamiento de las actualizaciones ya vistas"""
+    if await deduplicator.is_duplicate(update):
+        log_info(f"Se descarta la actualización reenviada {update.update_id}")
+        raise ApplicationHandlerStop
@@ -0,0 +1,84 @@
+"""Exportación del historial de comidas de un usuario a CSV o JSONL, por lotes y sin cargarlo en memoria"""
+
+import csv
+import gzip
+import io
+import json
+import tempfile
+from typing import IO, Dict, Iterable, Tuple
+
+from src.config.settings import EXPORT_BATCH_SIZE
+from src.models.meal import Meal
+from src.models.nutrients import NUTRIENTS, level_name
+from src.services.container import services
+from src.utils.time_utils import local_today, to_local
+
+EXPORT_FORMATS = ("csv", "jsonl")
+EXPORT_FIELDS = ("date", "meal_type", "text", "analyzed", "foods", *NUTRIENTS, "kcal", "summary")
+
+def export_row(document: Dict, timezone_str: str) -> Dict:
+    """Una comida de MongoDB como fila de la exportación (fecha en hora local y niveles como texto)"""
+    meal = Meal.from_dict(document)
+    row = {
+        "date": to_local(meal.timestamp, timezone_str).strftime("%Y-%m-%d %H:%M"),
+        "meal_type": meal.meal_type,
+        "text": meal.text,
+        "analyzed": meal.analyzed,
+        "foods": meal.analysis.get("foods", [])
+    }
+    for nutrient in NUTRIENTS:
+        row[nutrient] = level_name(int(meal.nutrients[nutrient])) if nutrient in meal.nutrients else None
+    row["kcal"] = meal.nutrients.get("kcal")
+    row["summary"] = meal.analysis.get("summary", "")
+    return row
+
+def write_export(documents: Iterable[Dict], output: IO[bytes], export_format: str, timezone_str: str,
+                 compress: bool = False) -> int:
+    """Escribe las comidas en output a medida que llegan; devuelve cuántas se escribieron"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportación inválido: {export_format}")
+
+    binary = gzip.GzipFile(fileobj=output, mode="wb") if compress else output
+    # utf-8-sig en CSV para que las hojas de cálculo reconozcan las tildes
+    text = io.TextIOWrapper(binary, encoding="utf-8-sig" if export_format == "csv" else "utf-8", newline="")
+    rows = 0
+    try:
+        writer = csv.DictWriter(text, fieldnames=EXPORT_FIELDS) if export_format == "csv" else None
+        if writer:
+            writer.writeheader()
+        for document in documents:
+            row = export_row(document, timezone_str)
+            if writer:
+                writer.writerow({**row, "foods": "; ".join(row["foods"])})
+            else:
+                text.write(json.dumps(row, ensure_ascii=False) + "\n")
+            rows += 1
+        text.flush()
+    finally:
+        # Se suelta el envoltorio sin cerrar output; cerrar el GzipFile escribe el final del archivo
+        text.detach()
+        if compress:
+            binary.close()
+    return rows
+
+def export_filename(telegram_id: int, export_format: str, compress: bool, timezone_str: str) -> str:
+    return f"nutribot_{telegram_id}_{local_today(timezone_str).isoformat()}.{export_format}" + (".gz" if compress else "")
+
+def export_meals(telegram_id: int, timezone_str: str, export_format: str, compress: bool,
+                 batch_size: int = EXPORT_BATCH_SIZE) -> Tuple[IO[bytes], int, int]:
+    """
+    Exporta las comidas de un usuario a un archivo temporal.
+    Devuelve (archivo abierto al inicio, comidas exportadas, tamaño en bytes); quien lo
+    recibe debe cerrarlo, lo que además lo borra del disco
+    """
+    output = tempfile.TemporaryFile()
+    try:
+        rows = write_export(
+            services.db.iter_user_meals(telegram_id, batch_size), output, export_format, timezone_str, compress
+        )
+        size = output.tell()
+        output.seek(0)
+    except Exception:
+        output.close()
+        raise
+    return output, rows, size
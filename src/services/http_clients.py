@@ -0,0 +1,141 @@
+"""Configuración centralizada de los clientes HTTP de Telegram y Anthropic"""
+
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from telegram.request import HTTPXRequest, RequestData
+
+from src.config.settings import (
+    HTTP2_ENABLED, HTTP_KEEPALIVE_EXPIRY,
+    TELEGRAM_POOL_SIZE, TELEGRAM_CONNECT_TIMEOUT, TELEGRAM_READ_TIMEOUT,
+    TELEGRAM_WRITE_TIMEOUT, TELEGRAM_POOL_TIMEOUT,
+    ANTHROPIC_POOL_SIZE, ANTHROPIC_CONNECT_TIMEOUT, ANTHROPIC_ANALYSIS_TIMEOUT
+)
+from src.utils.logger import log_info, log_error
+from src.utils.metrics import timed
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Evento de httpcore que indica que se abrió una conexión TCP nueva (no reutilizada)
+_NEW_CONNECTION_EVENT = "connection.connect_tcp.complete"
+
+class ConnectionStats:
+    """Cuenta peticiones y conexiones nuevas por cliente para medir la reutilización"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[str, Dict[str, int]] = {}
+
+    def _counters(self, client: str) -> Dict[str, int]:
+        return self._clients.setdefault(client, {"requests": 0, "connections": 0})
+
+    def record_request(self, client: str) -> None:
+        with self._lock:
+            self._counters(client)["requests"] += 1
+
+    def record_connection(self, client: str) -> None:
+        with self._lock:
+            self._counters(client)["connections"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Devuelve, por cliente, peticiones, conexiones abiertas y proporción de reutilización"""
+        with self._lock:
+            return {
+                client: {
+                    "requests": counters["requests"],
+                    "connections": counters["connections"],
+                    "reuse_ratio": (
+                        1 - counters["connections"] / counters["requests"]
+                        if counters["requests"] else 0.0
+                    )
+                }
+                for client, counters in self._clients.items()
+            }
+
+connection_stats = ConnectionStats()
+
+def _use_http2() -> bool:
+    if HTTP2_ENABLED and not HTTP2_AVAILABLE:
+        log_error("HTTP2_ENABLED está activo pero falta el paquete 'h2'; se usará HTTP/1.1")
+    return HTTP2_ENABLED and HTTP2_AVAILABLE
+
+def _async_event_hooks(client: str) -> Dict:
+    async def trace(event_name: str, info: Dict) -> None:
+        if event_name == _NEW_CONNECTION_EVENT:
+            connection_stats.record_connection(client)
+
+    async def on_request(request: httpx.Request) -> None:
+        connection_stats.record_request(client)
+        request.extensions["trace"] = trace
+
+    return {"request": [on_request]}
+
+def _sync_event_hooks(client: str) -> Dict:
+    def trace(event_name: str, info: Dict) -> None:
+        if event_name == _NEW_CONNECTION_EVENT:
+            connection_stats.record_connection(client)
+
+    def on_request(request: httpx.Request) -> None:
+        connection_stats.record_request(client)
+        request.extensions["trace"] = trace
+
+    return {"request": [on_request]}
+
+class TracedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest que registra la duración de cada método de la API de Bots (métricas y trazas)"""
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None, **kwargs) -> Tuple[int, bytes]:
+        api_method = url.rstrip("/").rsplit("/", 1)[-1]
+        return await timed("telegram", api_method)(super().do_request)(url, method, request_data, **kwargs)
+
+def build_telegram_request(kind: str = "api") -> HTTPXRequest:
+    """
+    Crea la capa HTTP del Bot de Telegram.
+
+    Args:
+        kind: "api" para las llamadas normales o "updates" para getUpdates (long polling,
+              que solo necesita una conexión y cuyo timeout de lectura agrega PTB)
+    """
+    pool_size = 1 if kind == "updates" else TELEGRAM_POOL_SIZE
+    return TracedHTTPXRequest(
+        connection_pool_size=pool_size,
+        connect_timeout=TELEGRAM_CONNECT_TIMEOUT,
+        read_timeout=TELEGRAM_READ_TIMEOUT,
+        write_timeout=TELEGRAM_WRITE_TIMEOUT,
+        pool_timeout=TELEGRAM_POOL_TIMEOUT,
+        http_version="2" if _use_http2() else "1.1",
+        httpx_kwargs={
+            "limits": httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            ),
+            "event_hooks": _async_event_hooks(f"telegram_{kind}")
+        }
+    )
+
+def build_anthropic_http_client() -> httpx.Client:
+    """Crea el cliente HTTP (síncrono, seguro entre hilos) que comparte ClaudeService"""
+    return httpx.Client(
+        http2=_use_http2(),
+        timeout=httpx.Timeout(ANTHROPIC_ANALYSIS_TIMEOUT, connect=ANTHROPIC_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=ANTHROPIC_POOL_SIZE,
+            max_keepalive_connections=ANTHROPIC_POOL_SIZE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        event_hooks=_sync_event_hooks("anthropic")
+    )
+
+def log_connection_stats() -> None:
+    """Registra en el log la reutilización de conexiones de cada cliente"""
+    for client, stats in connection_stats.snapshot().items():
+        log_info(
+            f"HTTP {client}: {stats['requests']} peticiones, {stats['connections']} conexiones nuevas, "
+            f"reutilización {stats['reuse_ratio']:.0%}"
+        )
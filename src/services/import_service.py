@@ -0,0 +1,354 @@
+"""Importación de historiales de comidas (CSV, JSON o JSONL, con gzip opcional)"""
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+import time
+from datetime import datetime
+from typing import IO, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.config.settings import (
+    IMPORT_BATCH_SIZE, IMPORT_MAX_MEALS, IMPORT_ANALYSIS_INTERVAL, IMPORT_ANALYSIS_CONCURRENCY,
+    IMPORT_ANALYSES_PER_MINUTE, PENDING_MEAL_MAX_ATTEMPTS, PENDING_MEAL_CLAIM_SECONDS, ANALYSIS_BATCH_ENABLED
+)
+from src.models.meal import Meal
+from src.models.nutrients import NUTRIENTS, UNKNOWN, parse_level
+from src.models.user import User
+from src.services.admission import admission
+from src.services.batch_analysis import batch_analyzer
+from src.services.container import services
+from src.services.local_analysis import analysis_cache, analyze_locally
+from src.utils.logger import log_info, log_error
+from src.utils.metrics import registry
+from src.utils.time_utils import meal_type_for_hour, to_local, to_utc
+
+IMPORT_FORMATS = ("csv", "json", "jsonl")
+
+IMPORTED_MEALS = registry.counter("nutribot_imported_meals_total", "Comidas importadas por origen del análisis", ["source"])
+IMPORT_ANALYSES = registry.counter(
+    "nutribot_import_analyses_total", "Análisis completos de comidas importadas", ["source"]
+)
+
+# Columnas reconocidas (en minúsculas) para cada campo
+_FIELD_ALIASES = {
+    "text": ("text", "comida", "meal", "description", "descripcion", "descripción", "food", "alimento"),
+    "date": ("date", "fecha", "timestamp", "datetime"),
+    "time": ("time", "hora"),
+    "meal_type": ("meal_type", "tipo", "type"),
+    "foods": ("foods", "alimentos"),
+    "kcal": ("kcal", "calories", "calorias", "calorías"),
+    "summary": ("summary", "resumen"),
+    "protein": ("protein", "proteinas", "proteínas"),
+    "carbs": ("carbs", "carbohidratos"),
+    "fats": ("fats", "grasas"),
+    "fiber": ("fiber", "fibra")
+}
+
+_MEAL_TYPES = {
+    "breakfast": "breakfast", "desayuno": "breakfast",
+    "lunch": "lunch", "almuerzo": "lunch", "comida": "lunch",
+    "dinner": "dinner", "cena": "dinner",
+    "snack": "snack", "merienda": "snack"
+}
+
+_DATE_FORMATS = ("%d/%m/%Y %H:%M", "%d/%m/%Y", "%d-%m-%Y %H:%M", "%d-%m-%Y")
+
+def detect_format(filename: str) -> Optional[str]:
+    name = filename.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    extension = name.rsplit(".", 1)[-1]
+    return extension if extension in IMPORT_FORMATS else None
+
+def _open_text(path: str) -> IO[str]:
+    """Abre el archivo como texto, descomprimiéndolo si es gzip (se detecta por su contenido)"""
+    with open(path, "rb") as raw:
+        compressed = raw.read(2) == b"\x1f\x8b"
+    raw = gzip.open(path, "rb") if compressed else open(path, "rb")
+    # utf-8-sig descarta la marca BOM de los CSV exportados desde hojas de cálculo
+    return io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+
+def _iter_json_values(text: IO[str], chunk_size: int = 65536) -> Iterator:
+    """
+    Valores de un arreglo JSON o de un JSONL leídos por partes: nunca se carga el archivo
+    completo, solo el objeto en curso
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    while True:
+        chunk = text.read(chunk_size)
+        buffer += chunk
+        position = 0
+        while True:
+            # Separadores entre objetos: espacios, saltos de línea, comas y los corchetes del arreglo
+            while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+                position += 1
+            if position == len(buffer):
+                break
+            try:
+                value, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                # Objeto incompleto: se sigue leyendo
+                break
+            yield value
+        buffer = buffer[position:]
+        if not chunk:
+            return
+
+def iter_rows(path: str, import_format: str) -> Iterator[Dict]:
+    """Filas del archivo como diccionarios con las claves en minúsculas"""
+    with _open_text(path) as text:
+        rows = csv.DictReader(text) if import_format == "csv" else _iter_json_values(text)
+        for row in rows:
+            if isinstance(row, dict):
+                yield {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+            else:
+                yield {}
+
+def _field(row: Dict, name: str):
+    for alias in _FIELD_ALIASES[name]:
+        value = row.get(alias)
+        if value not in (None, ""):
+            return value
+    return None
+
+def _parse_timestamp(value, time_value, timezone_str: str) -> Optional[datetime]:
+    """Fecha de la fila en UTC; las fechas sin zona se interpretan en la hora local del usuario"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Muchas exportaciones guardan la fecha en milisegundos desde epoch
+        if abs(value) > 1e11:
+            value /= 1000
+        try:
+            return datetime.utcfromtimestamp(value)
+        except (ValueError, OverflowError, OSError):
+            # NaN, infinito o fuera del rango de fechas: fila inválida
+            return None
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if time_value and isinstance(time_value, str) and len(value) <= 10:
+        value = f"{value} {time_value.strip()}"
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        parsed = None
+        for date_format in _DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(value, date_format)
+                break
+            except ValueError:
+                continue
+    return to_utc(parsed, timezone_str) if parsed else None
+
+def row_to_meal(row: Dict, user: User, chat_id: int) -> Tuple[Optional[Meal], str]:
+    """Comida de una fila y el origen de su análisis ("file", "cache" o "local"); None si la fila no es válida"""
+    text = _field(row, "text")
+    timestamp = _parse_timestamp(_field(row, "date"), _field(row, "time"), user.timezone)
+    if not isinstance(text, str) or not text.strip() or timestamp is None or timestamp > datetime.utcnow():
+        return None, "invalid"
+    text = text.strip()
+
+    meal_type = _MEAL_TYPES.get(str(_field(row, "meal_type") or "").strip().lower())
+    if meal_type is None:
+        meal_type = meal_type_for_hour(to_local(timestamp, user.timezone).hour)
+
+    levels = {nutrient: _field(row, nutrient) for nutrient in NUTRIENTS if _field(row, nutrient) is not None}
+    # En las exportaciones, las comidas sin analizar traen los niveles del análisis preliminar
+    preliminary = str(row.get("analyzed", "")).lower() in ("false", "0")
+    if not preliminary and any(parse_level(level) != UNKNOWN for level in levels.values()):
+        # El archivo ya trae el análisis (por ejemplo, una exportación de /exportar)
+        foods = _field(row, "foods") or []
+        if isinstance(foods, str):
+            foods = [food.strip() for food in foods.split(";") if food.strip()]
+        # Marcado como importado: no es un análisis de Claude y el reanálisis de versiones anteriores lo salta
+        analysis = {"foods": foods, "nutrients": levels, "summary": _field(row, "summary") or "", "source": "import"}
+        if _field(row, "kcal") is not None:
+            analysis["calories"] = _field(row, "kcal")
+        source = "file"
+    else:
+        analysis = analysis_cache.get(text, user.preferences)
+        source = "cache" if analysis else "local"
+        if analysis is None:
+            analysis = analyze_locally(text)
+
+    meal = Meal(
+        telegram_id=user.telegram_id,
+        text=text,
+        meal_type=meal_type,
+        timestamp=timestamp,
+        analyzed=source != "local",
+        analysis=analysis,
+        chat_id=chat_id,
+        import_pending=source == "local"
+    )
+    return meal, source
+
+def _next_batch(rows: Iterator[Dict], user: User, chat_id: int, stats: Dict,
+                limit: int) -> Tuple[List[Tuple[Meal, str]], bool]:
+    """
+    Convierte hasta limit filas; devuelve las comidas válidas con su origen y si el archivo se terminó.
+    Un error de formato termina el archivo: se conservan las filas anteriores y se anota en stats
+    """
+    meals = []
+    for _ in range(limit):
+        try:
+            row = next(rows, None)
+        except (ValueError, csv.Error, OSError, EOFError) as e:
+            # JSON inválido, CSV mal formado, texto que no es UTF-8 o gzip dañado
+            stats["error"] = f"fila {stats['rows'] + 1}: {e}"
+            return meals, True
+        if row is None:
+            return meals, True
+        stats["rows"] += 1
+        meal, source = row_to_meal(row, user, chat_id)
+        stats[source] += 1
+        if meal is not None:
+            meals.append((meal, source))
+    return meals, False
+
+def _meal_key(timestamp: datetime, text: str) -> Tuple[datetime, str]:
+    # Al minuto: las exportaciones guardan la hora sin segundos
+    return timestamp.replace(second=0, microsecond=0), text
+
+def _save_batch(telegram_id: int, meals: List[Tuple[Meal, str]], stats: Dict) -> int:
+    """Guarda el lote sin las comidas que ya existen (p. ej. al reenviar un archivo tras un error)"""
+    if not meals:
+        return 0
+    existing = {
+        _meal_key(meal["timestamp"], meal["text"])
+        for meal in services.db.get_meal_keys(
+            telegram_id, min(meal.timestamp for meal, _ in meals), max(meal.timestamp for meal, _ in meals)
+        )
+    }
+    new_meals = []
+    for meal, source in meals:
+        if _meal_key(meal.timestamp, meal.text) in existing:
+            # Los duplicados no cuentan en su origen: file + cache + local = imported
+            stats["duplicates"] += 1
+            stats[source] -= 1
+        else:
+            new_meals.append(meal)
+    return services.db.save_meals(telegram_id, new_meals)
+
+async def import_meals(path: str, import_format: str, user: User, chat_id: int,
+                       on_progress: Callable[[Dict], Awaitable[None]]) -> Dict:
+    """
+    Importa el archivo por lotes de IMPORT_BATCH_SIZE comidas. La lectura y cada escritura
+    corren en hilos, así que el event loop sigue atendiendo a los demás usuarios. Si el
+    archivo tiene un error de formato se conservan los lotes anteriores y stats["error"]
+    indica la fila
+    """
+    stats = {
+        "rows": 0, "imported": 0, "invalid": 0, "duplicates": 0, "file": 0, "cache": 0, "local": 0,
+        "truncated": False, "error": None
+    }
+    rows = iter_rows(path, import_format)
+    try:
+        finished = False
+        while not finished:
+            limit = min(IMPORT_BATCH_SIZE, IMPORT_MAX_MEALS - stats["rows"])
+            if limit <= 0:
+                stats["truncated"] = True
+                break
+            meals, finished = await asyncio.to_thread(_next_batch, rows, user, chat_id, stats, limit)
+            stats["imported"] += await asyncio.to_thread(_save_batch, user.telegram_id, meals, stats)
+            await on_progress(stats)
+    finally:
+        rows.close()
+
+    for source in ("file", "cache", "local"):
+        if stats[source]:
+            IMPORTED_MEALS.inc(source, amount=stats[source])
+    log_info(
+        f"Usuario {user.telegram_id}: importadas {stats['imported']} comidas de {stats['rows']} filas "
+        f"({stats['file']} con análisis, {stats['cache']} desde caché, {stats['local']} pendientes)"
+    )
+    return stats
+
+class ImportAnalyzer:
+    """Completa con Claude los análisis de las comidas importadas, con baja prioridad"""
+    def __init__(self, concurrency: int = IMPORT_ANALYSIS_CONCURRENCY, per_minute: float = IMPORT_ANALYSES_PER_MINUTE,
+                 batch: bool = ANALYSIS_BATCH_ENABLED):
+        self.concurrency = concurrency
+        # En modo por lotes las comidas pendientes se envían a la API de lotes en vez de analizarse una a una
+        self.batch = batch
+        # Tiempo mínimo entre análisis de cada consumidor
+        self.spacing = 60 / per_minute * concurrency if per_minute else 0
+        self._preferences: Dict[int, Dict] = {}
+
+    def has_headroom(self) -> bool:
+        """Sin sobrecarga y con al menos la mitad de la capacidad libre para los usuarios interactivos"""
+        if admission.overload_reason():
+            return False
+        return not admission.max_inflight or admission.inflight < max(admission.max_inflight // 2, 1)
+
+    def analyze(self, meal_data: Dict) -> str:
+        """Análisis completo de una comida reservada; devuelve su origen o "error" """
+        user_id = meal_data["telegram_id"]
+        if user_id not in self._preferences:
+            user = services.db.get_user(user_id)
+            self._preferences[user_id] = user.preferences if user else {}
+        preferences = self._preferences[user_id]
+
+        analysis = analysis_cache.get(meal_data["text"], preferences)
+        source = "cache"
+        if analysis is None:
+            analysis = services.claude.analyze_meal(meal_text=meal_data["text"], user_preferences=preferences)
+            source = "claude"
+            if "error" in analysis or analysis.get("error_parsing"):
+                # Se conserva el preliminar; se reintenta en otra pasada hasta PENDING_MEAL_MAX_ATTEMPTS
+                services.db.release_pending_meal(str(meal_data["_id"]))
+                return "error"
+            analysis_cache.put(meal_data["text"], preferences, analysis)
+        services.db.update_meal_analysis(str(meal_data["_id"]), analysis)
+        return source
+
+    def submit_batches(self) -> int:
+        """Envía todas las comidas importadas pendientes en lotes (las más recientes primero)"""
+        submitted = 0
+        query = {"import_pending": True, "resume_attempts": {"$not": {"$gte": PENDING_MEAL_MAX_ATTEMPTS}}}
+        while batch_analyzer.submit(query, "import", sort=[("timestamp", -1)], count_attempt=True):
+            submitted += 1
+        return submitted
+
+    async def run_once(self) -> int:
+        if self.batch:
+            # Los resultados los aplica batch_analyzer cuando terminan los lotes
+            await asyncio.to_thread(self.submit_batches)
+            return 0
+        analyzed = 0
+        self._preferences.clear()
+
+        async def consume() -> None:
+            nonlocal analyzed
+            while self.has_headroom():
+                meal_data = await asyncio.to_thread(
+                    services.db.claim_import_meal, PENDING_MEAL_MAX_ATTEMPTS, PENDING_MEAL_CLAIM_SECONDS
+                )
+                if not meal_data:
+                    return
+                started = time.monotonic()
+                with admission.track_analysis():
+                    source = await asyncio.to_thread(self.analyze, meal_data)
+                IMPORT_ANALYSES.inc(source)
+                analyzed += source != "error"
+                await asyncio.sleep(max(self.spacing - (time.monotonic() - started), 0))
+
+        await asyncio.gather(*(consume() for _ in range(self.concurrency)))
+        if analyzed:
+            log_info(f"Completados {analyzed} análisis de comidas importadas")
+        return analyzed
+
+    async def run(self, interval: float = IMPORT_ANALYSIS_INTERVAL) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                log_error("Error al completar los análisis de comidas importadas", e)
+
+import_analyzer = ImportAnalyzer()
@@ -0,0 +1,140 @@
+"""Análisis de comidas sin Claude (caché o palabras clave) para cuando el bot está sobrecargado"""
+
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from src.config.settings import ANALYSIS_CACHE_SIZE
+from src.utils.metrics import record_cache
+
+# Aporte aproximado de cada alimento: (proteínas, carbohidratos, grasas, fibra) de 0 a 2
+FOOD_KEYWORDS: Dict[str, Tuple[int, int, int, int]] = {
+    "huevo": (2, 0, 1, 0),
+    "pollo": (2, 0, 1, 0),
+    "pavo": (2, 0, 1, 0),
+    "carne": (2, 0, 2, 0),
+    "cerdo": (2, 0, 2, 0),
+    "pescado": (2, 0, 1, 0),
+    "atun": (2, 0, 1, 0),
+    "salmon": (2, 0, 2, 0),
+    "jamon": (2, 0, 1, 0),
+    "queso": (2, 0, 2, 0),
+    "yogur": (1, 1, 1, 0),
+    "leche": (1, 1, 1, 0),
+    "tofu": (2, 0, 1, 1),
+    "lenteja": (2, 2, 0, 2),
+    "garbanzo": (2, 2, 1, 2),
+    "frijol": (2, 2, 0, 2),
+    "arroz": (0, 2, 0, 0),
+    "pasta": (1, 2, 0, 1),
+    "pan": (1, 2, 0, 1),
+    "tostada": (1, 2, 0, 1),
+    "tortilla": (1, 2, 1, 1),
+    "avena": (1, 2, 1, 2),
+    "cereal": (0, 2, 0, 1),
+    "papa": (0, 2, 0, 1),
+    "patata": (0, 2, 0, 1),
+    "maiz": (0, 2, 0, 1),
+    "galleta": (0, 2, 1, 0),
+    "chocolate": (0, 2, 2, 1),
+    "pastel": (0, 2, 2, 0),
+    "pizza": (1, 2, 2, 1),
+    "hamburguesa": (2, 2, 2, 0),
+    "papas fritas": (0, 2, 2, 1),
+    "jugo": (0, 2, 0, 0),
+    "refresco": (0, 2, 0, 0),
+    "fruta": (0, 1, 0, 1),
+    "manzana": (0, 1, 0, 2),
+    "platano": (0, 2, 0, 1),
+    "naranja": (0, 1, 0, 1),
+    "ensalada": (0, 0, 0, 2),
+    "lechuga": (0, 0, 0, 1),
+    "tomate": (0, 0, 0, 1),
+    "verdura": (0, 1, 0, 2),
+    "brocoli": (1, 1, 0, 2),
+    "zanahoria": (0, 1, 0, 2),
+    "aguacate": (0, 0, 2, 2),
+    "nuez": (1, 0, 2, 1),
+    "almendra": (1, 0, 2, 1),
+    "aceite": (0, 0, 2, 0),
+    "mantequilla": (0, 0, 2, 0),
+}
+
+NUTRIENTS = ("protein", "carbs", "fats", "fiber")
+
+def _normalize(text: str) -> str:
+    """Minúsculas, sin tildes y con los espacios colapsados"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"\s+", " ", text).strip()
+
+def _level(score: int) -> str:
+    if score >= 3:
+        return "alto"
+    if score >= 1:
+        return "medio"
+    return "bajo"
+
+def analyze_locally(meal_text: str) -> Dict:
+    """Análisis preliminar por palabras clave, con la misma estructura que el de Claude"""
+    text = _normalize(meal_text)
+    foods: List[str] = []
+    totals = [0, 0, 0, 0]
+    for keyword, contribution in FOOD_KEYWORDS.items():
+        # Admite plurales simples (huevos, lentejas, panes)
+        if re.search(rf"\b{keyword}(s|es)?\b", text):
+            foods.append(keyword)
+            totals = [total + value for total, value in zip(totals, contribution)]
+
+    if foods:
+        summary = "Análisis preliminar basado en los alimentos reconocidos; el análisis detallado se completará en breve."
+    else:
+        summary = "No reconocí los alimentos de esta comida; el análisis detallado se completará en breve."
+    return {
+        "foods": foods,
+        "nutrients": {name: _level(total) if foods else "no determinado" for name, total in zip(NUTRIENTS, totals)},
+        "summary": summary,
+        "degraded": True
+    }
+
+class AnalysisCache:
+    """Análisis completos recientes por texto normalizado y preferencias del usuario (LRU)"""
+    def __init__(self, max_size: int = ANALYSIS_CACHE_SIZE):
+        self.max_size = max_size
+        # También se usa desde los hilos de la importación de historiales
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Dict]" = OrderedDict()
+
+    @staticmethod
+    def _key(meal_text: str, preferences: Dict) -> Tuple:
+        return (
+            _normalize(meal_text),
+            tuple(sorted(preferences.get("dietary_restrictions", []))),
+            tuple(sorted(preferences.get("goals", [])))
+        )
+
+    def get(self, meal_text: str, preferences: Dict) -> Optional[Dict]:
+        key = self._key(meal_text, preferences)
+        with self._lock:
+            analysis = self._entries.get(key)
+            if analysis is not None:
+                self._entries.move_to_end(key)
+        record_cache("analysis", analysis is not None)
+        return analysis
+
+    def put(self, meal_text: str, preferences: Dict, analysis: Dict) -> None:
+        # Solo se guardan análisis completos y bien interpretados
+        if not analysis or analysis.get("degraded") or analysis.get("error_parsing") or "error" in analysis:
+            return
+        if not self.max_size:
+            return
+        key = self._key(meal_text, preferences)
+        with self._lock:
+            self._entries[key] = analysis
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+analysis_cache = AnalysisCache()
@@ -0,0 +1,133 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.utils.logger import log_error
+from src.utils.profiling import SamplingProfiler
+from src.utils.tracing import trace_scope
+
+FlushCallback = Callable[[int, int, str, Any, Callable[[], None]], Awaitable[None]]
+
+class MealBurstBuffer:
+    """
+    Agrupa los mensajes consecutivos de un usuario que llegan dentro de una ventana corta
+    ("almorcé pollo", "con arroz", "y una ensalada") para registrarlos como una sola comida.
+
+    Cada mensaje nuevo reinicia la ventana, con un tope de espera total para que una
+    ráfaga larga no retrase indefinidamente el análisis. Cada mensaje puede traer una
+    función de confirmación: on_flush la invoca (con on_saved) cuando la comida ya está
+    guardada y, si no llega a hacerlo, se invoca al terminar la ráfaga.
+    """
+
+    def __init__(self, window_seconds: float, max_wait_seconds: float, on_flush: FlushCallback):
+        self.window_seconds = window_seconds
+        self.max_wait_seconds = max(max_wait_seconds, window_seconds)
+        self.on_flush = on_flush
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._inflight: Dict[int, asyncio.Task] = {}
+        self._closed = False
+        self._profiler = SamplingProfiler()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0 and not self._closed
+
+    @property
+    def busy(self) -> bool:
+        """Hay ráfagas esperando o procesándose"""
+        return bool(self._pending or self._inflight)
+
+    def close(self) -> None:
+        """Deja de agrupar: a partir de ahora cada mensaje se procesa directamente (apagado)"""
+        self._closed = True
+
+    def cancel_all(self) -> List[asyncio.Task]:
+        """Cancela las ráfagas en proceso y devuelve sus tareas para esperar su limpieza"""
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        return tasks
+
+    @property
+    def pending_count(self) -> int:
+        """Cantidad de usuarios con mensajes esperando a ser procesados"""
+        return len(self._pending)
+
+    async def add(self, user_id: int, chat_id: int, text: str, context: Any,
+                  on_saved: Optional[Callable[[], None]] = None) -> None:
+        """Agrega un mensaje a la ráfaga del usuario y reprograma su procesamiento"""
+        now = time.monotonic()
+        entry = self._pending.get(user_id)
+        if entry is None:
+            entry = {"chat_id": chat_id, "texts": [], "acks": [], "started": now, "timer": None}
+            self._pending[user_id] = entry
+        elif entry["timer"]:
+            entry["timer"].cancel()
+
+        entry["texts"].append(text.strip())
+        if on_saved:
+            entry["acks"].append(on_saved)
+        entry["context"] = context
+
+        delay = min(self.window_seconds, self.max_wait_seconds - (now - entry["started"]))
+        entry["timer"] = asyncio.create_task(self._flush_later(user_id, max(delay, 0)))
+
+    async def flush(self, user_id: int) -> None:
+        """Procesa de inmediato la ráfaga pendiente del usuario y espera a que termine"""
+        entry = self._pending.pop(user_id, None)
+        if entry:
+            timer: Optional[asyncio.Task] = entry["timer"]
+            if timer and timer is not asyncio.current_task():
+                timer.cancel()
+
+            previous = self._inflight.get(user_id)
+            task = asyncio.create_task(self._process(user_id, entry, previous))
+            self._inflight[user_id] = task
+            task.add_done_callback(lambda t: self._forget(user_id, t))
+
+        task = self._inflight.get(user_id)
+        if task:
+            await asyncio.shield(task)
+
+    async def flush_all(self) -> None:
+        """Procesa todas las ráfagas pendientes (por ejemplo, antes de apagar el bot)"""
+        user_ids: List[int] = list(self._pending) + list(self._inflight)
+        await asyncio.gather(*(self.flush(user_id) for user_id in set(user_ids)), return_exceptions=True)
+
+    async def _flush_later(self, user_id: int, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            return
+        await self.flush(user_id)
+
+    async def _process(self, user_id: int, entry: Dict[str, Any], previous: Optional[asyncio.Task]) -> None:
+        # Una ráfaga no empieza hasta que termine la anterior del mismo usuario
+        if previous and not previous.done():
+            await asyncio.wait([previous])
+
+        text = " ".join(part for part in entry["texts"] if part)
+
+        def saved() -> None:
+            acks, entry["acks"] = entry["acks"], []
+            for ack in acks:
+                ack()
+
+        session = self._profiler.start(None, f"meal_burst-{user_id}")
+        try:
+            # La ráfaga se procesa fuera de la actualización que la originó: tiene su propia traza y perfil
+            with trace_scope("meal_burst", user_id=user_id):
+                await self.on_flush(user_id, entry["chat_id"], text, entry["context"], saved)
+        except Exception as e:
+            log_error(f"Error al procesar ráfaga de mensajes del usuario {user_id}", e)
+        finally:
+            # Sin comida que guardar (usuario sin registrar, error o apagado con la comida pendiente)
+            saved()
+            if session:
+                elapsed_ms = self._profiler.finish(session)
+                if elapsed_ms is not None:
+                    asyncio.get_running_loop().run_in_executor(None, self._profiler.dump, session, elapsed_ms)
+
+    def _forget(self, user_id: int, task: asyncio.Task) -> None:
+        if self._inflight.get(user_id) is task:
+            del self._inflight[user_id]
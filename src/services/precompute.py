@@ -0,0 +1,109 @@
+"""Precálculo de resúmenes y recomendaciones en las horas de poca actividad de cada usuario"""
+
+import asyncio
+from datetime import datetime, time, timedelta
+from typing import Dict, List, Tuple
+
+from src.config.settings import PRECOMPUTE_WINDOWS, PRECOMPUTE_INTERVAL, PRECOMPUTE_CONCURRENCY
+from src.services.admission import admission
+from src.services.container import services
+from src.services.summary_service import (
+    get_day_summary, request_recommendations, day_summary_fingerprint, recommendations_fingerprint,
+    load_nutrition_profile
+)
+from src.utils.logger import log_info, log_error
+from src.utils.metrics import registry
+from src.utils.time_utils import local_times, to_local
+
+PRECOMPUTED = registry.counter("nutribot_precomputed_total", "Resultados precalculados en horas de poca actividad", ["kind"])
+
+def parse_windows(spec: str) -> List[Tuple[time, time]]:
+    """Ventanas "HH:MM-HH:MM" separadas por comas (una ventana puede cruzar la medianoche)"""
+    windows = []
+    for window in filter(None, (part.strip() for part in spec.split(","))):
+        start, end = window.split("-")
+        windows.append((time.fromisoformat(start.strip()), time.fromisoformat(end.strip())))
+    return windows
+
+class Precomputer:
+    def __init__(self, windows: str = PRECOMPUTE_WINDOWS, concurrency: int = PRECOMPUTE_CONCURRENCY):
+        self.windows = parse_windows(windows)
+        self.concurrency = concurrency
+
+    def in_window(self, local_time: time) -> bool:
+        for start, end in self.windows:
+            if start <= end and start <= local_time <= end:
+                return True
+            if start > end and (local_time >= start or local_time <= end):
+                return True
+        return False
+
+    def due_users(self, now: datetime) -> List[Dict]:
+        """Usuarios en su ventana de poca actividad que registraron comidas hoy (hora local)"""
+        due = []
+        users = services.db.get_users_with_meals_since(now - timedelta(days=1))
+        for user, local_now in zip(users, local_times((user["timezone"] for user in users), now)):
+            last_meal = to_local(user["last_meal"], user["timezone"])
+            if self.in_window(local_now.time()) and last_meal.date() == local_now.date():
+                due.append(user)
+        return due
+
+    def precompute_user(self, telegram_id: int, timezone_str: str) -> List[str]:
+        """Recalcula lo que cambió desde la última pasada; devuelve los tipos guardados"""
+        saved = []
+
+        fingerprint = day_summary_fingerprint(telegram_id, timezone_str)
+        stored = services.db.get_precomputed(telegram_id, "summary")
+        if stored is None or stored["fingerprint"] != fingerprint:
+            summary = get_day_summary(telegram_id, timezone_str)
+            if "error" not in summary:
+                services.db.save_precomputed(telegram_id, "summary", fingerprint, summary)
+                saved.append("summary")
+
+        user = services.db.get_user(telegram_id)
+        fingerprint = recommendations_fingerprint(user)
+        stored = services.db.get_precomputed(telegram_id, "recommendations")
+        if stored is None or stored["fingerprint"] != fingerprint:
+            recommendations = request_recommendations(user, load_nutrition_profile(user))
+            if recommendations != services.claude.RECOMMENDATIONS_UNAVAILABLE:
+                services.db.save_precomputed(telegram_id, "recommendations", fingerprint, recommendations)
+                saved.append("recommendations")
+
+        for kind in saved:
+            PRECOMPUTED.inc(kind)
+        return saved
+
+    async def run_once(self) -> int:
+        """Una pasada sobre los usuarios pendientes; se detiene si aparece la sobrecarga"""
+        users = await asyncio.to_thread(self.due_users, datetime.utcnow())
+        semaphore = asyncio.Semaphore(self.concurrency)
+        precomputed = 0
+
+        async def precompute(user: Dict) -> None:
+            nonlocal precomputed
+            async with semaphore:
+                if admission.overload_reason():
+                    return
+                try:
+                    with admission.track_analysis():
+                        saved = await asyncio.to_thread(self.precompute_user, user["telegram_id"], user["timezone"])
+                    precomputed += bool(saved)
+                except Exception as e:
+                    log_error(f"Error al precalcular los resultados del usuario {user['telegram_id']}", e)
+
+        await asyncio.gather(*(precompute(user) for user in users))
+        if precomputed:
+            log_info(f"Precalculados los resultados de {precomputed} usuarios")
+        return precomputed
+
+    async def run(self, interval: float = PRECOMPUTE_INTERVAL) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            if admission.overload_reason():
+                continue
+            try:
+                await self.run_once()
+            except Exception as e:
+                log_error("Error en el precálculo de resúmenes y recomendaciones", e)
+
+precomputer = Precomputer()
@@ -0,0 +1,245 @@
+"""Reanálisis de comidas con un análisis fallido, sin análisis o de una versión anterior del prompt"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+from src.config.settings import (
+    REANALYSIS_BATCH_SIZE, REANALYSIS_CONCURRENCY, REANALYSIS_PER_MINUTE, REANALYSIS_MAX_CONSECUTIVE_FAILURES,
+    PENDING_MEAL_MAX_ATTEMPTS, ANTHROPIC_INPUT_PRICE_PER_MTOK, ANTHROPIC_OUTPUT_PRICE_PER_MTOK,
+    ANALYSIS_OUTPUT_TOKENS_ESTIMATE
+)
+from src.services.batch_analysis import batch_analyzer
+from src.services.claude_service import ANALYSIS_PROMPT_VERSION, BATCH_PRICE_FACTOR, ClaudeService
+from src.services.container import services
+from src.utils.logger import log_info, log_error
+
+REANALYSIS_REASONS = ("unanalyzed", "errored", "stale")
+
+def _queued(flag: str) -> Dict:
+    """Comidas que todavía va a completar una cola automática (análisis diferidos o importaciones)"""
+    return {flag: True, "resume_attempts": {"$not": {"$gte": PENDING_MEAL_MAX_ATTEMPTS}}}
+
+def selection_query(reasons: Iterable[str], telegram_id: Optional[int] = None,
+                    prompt_version: int = ANALYSIS_PROMPT_VERSION) -> Dict:
+    """Consulta de las comidas a reanalizar por los motivos indicados (ver REANALYSIS_REASONS)"""
+    conditions = {
+        # Sin análisis completo y fuera de las colas automáticas (agotaron sus intentos o nunca entraron)
+        "unanalyzed": {"analyzed": {"$ne": True}, "$nor": [_queued("pending_analysis"), _queued("import_pending")]},
+        "errored": {"$or": [{"analysis.error": {"$exists": True}}, {"analysis.error_parsing": True}]},
+        # Los análisis sin versión son anteriores a que se registrara; los que venían en un
+        # archivo importado no los hizo Claude y no se repiten
+        "stale": {
+            "analyzed": True,
+            "analysis.error": {"$exists": False},
+            "analysis.error_parsing": {"$ne": True},
+            "analysis.source": {"$ne": "import"},
+            "analysis.prompt_version": {"$not": {"$gte": prompt_version}}
+        }
+    }
+    unknown = set(reasons) - set(conditions)
+    if unknown or not reasons:
+        raise ValueError(f"Motivos de reanálisis inválidos: {', '.join(sorted(unknown)) or 'ninguno'}")
+    query: Dict = {"$or": [conditions[reason] for reason in reasons]}
+    if telegram_id is not None:
+        query["telegram_id"] = telegram_id
+    return query
+
+def reanalysis_reason(meal_data: Dict) -> str:
+    """Por qué se seleccionó una comida (para las estadísticas)"""
+    analysis = meal_data.get("analysis") or {}
+    if "error" in analysis or analysis.get("error_parsing"):
+        return "errored"
+    return "stale" if meal_data.get("analyzed") else "unanalyzed"
+
+class Checkpoint:
+    """
+    Progreso de un reanálisis en un archivo JSON: la selección, el último _id procesado,
+    los contadores y los lotes enviados cuyos resultados no se han recogido
+    """
+    def __init__(self, path: str, selection: Dict):
+        self.path = path
+        self.selection = selection
+        self.last_id: Optional[str] = None
+        self.stats: Dict[str, int] = {}
+        self.jobs: List[str] = []
+
+    def load(self) -> bool:
+        """Carga el progreso guardado; ValueError si era de otra selección"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as checkpoint_file:
+            data = json.load(checkpoint_file)
+        if data.get("selection") != self.selection:
+            raise ValueError(f"El checkpoint {self.path} es de otra selección: {data.get('selection')}")
+        self.last_id = data.get("last_id")
+        self.stats = data.get("stats", {})
+        self.jobs = data.get("jobs", [])
+        return True
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        # Se escribe aparte y se reemplaza: una interrupción no deja el archivo a medias
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as checkpoint_file:
+            json.dump(
+                {"selection": self.selection, "last_id": self.last_id, "stats": self.stats, "jobs": self.jobs},
+                checkpoint_file
+            )
+        os.replace(temporary, self.path)
+
+    def count(self, key: str, amount: int = 1) -> None:
+        self.stats[key] = self.stats.get(key, 0) + amount
+
+class Reanalyzer:
+    def __init__(self, query: Dict, checkpoint: Checkpoint, concurrency: int = REANALYSIS_CONCURRENCY,
+                 per_minute: float = REANALYSIS_PER_MINUTE, batch_size: int = REANALYSIS_BATCH_SIZE,
+                 max_failures: int = REANALYSIS_MAX_CONSECUTIVE_FAILURES, batch: bool = False):
+        self.query = query
+        self.checkpoint = checkpoint
+        self.concurrency = concurrency
+        # Tiempo mínimo entre dos llamadas a Claude, sumando todos los consumidores
+        self.spacing = 60 / per_minute if per_minute else 0
+        self.batch_size = batch_size
+        self.max_failures = max_failures
+        # Enviar cada lote de la selección a la API de Message Batches en vez de llamar a Claude una a una
+        self.batch = batch
+        self.stopped = False
+        self._next_call = 0.0
+        self._consecutive_failures = 0
+        self._preferences: Dict[int, Dict] = {}
+
+    def _user_preferences(self, telegram_id: int) -> Dict:
+        if telegram_id not in self._preferences:
+            user = services.db.get_user(telegram_id)
+            self._preferences[telegram_id] = user.preferences if user else {}
+        return self._preferences[telegram_id]
+
+    def batches(self, limit: Optional[int] = None) -> Iterable[List[Dict]]:
+        """Lotes de la selección desde el checkpoint (sin avanzarlo)"""
+        after_id, remaining = self.checkpoint.last_id, limit
+        while remaining is None or remaining > 0:
+            size = self.batch_size if remaining is None else min(self.batch_size, remaining)
+            meals = services.db.get_meals_after(self.query, after_id, size)
+            if not meals:
+                return
+            yield meals
+            after_id = str(meals[-1]["_id"])
+            if remaining is not None:
+                remaining -= len(meals)
+
+    def estimate(self, limit: Optional[int] = None) -> Dict:
+        """Recorre la selección pendiente sin llamar a Claude y estima tokens, coste y duración"""
+        estimate = {"meals": 0, "users": 0, "input_tokens": 0, "output_tokens": 0}
+        estimate.update({reason: 0 for reason in REANALYSIS_REASONS})
+        users = set()
+        for meals in self.batches(limit):
+            for meal_data in meals:
+                users.add(meal_data["telegram_id"])
+                estimate["meals"] += 1
+                estimate[reanalysis_reason(meal_data)] += 1
+                estimate["input_tokens"] += ClaudeService.estimate_analysis_input_tokens(
+                    meal_data["text"], self._user_preferences(meal_data["telegram_id"])
+                )
+        estimate["users"] = len(users)
+        estimate["output_tokens"] = estimate["meals"] * ANALYSIS_OUTPUT_TOKENS_ESTIMATE
+        estimate["cost_usd"] = (
+            estimate["input_tokens"] * ANTHROPIC_INPUT_PRICE_PER_MTOK
+            + estimate["output_tokens"] * ANTHROPIC_OUTPUT_PRICE_PER_MTOK
+        ) / 1_000_000 * (BATCH_PRICE_FACTOR if self.batch else 1)
+        # Los lotes no tienen una duración predecible (la API garantiza menos de 24 h)
+        estimate["minutes"] = None if self.batch else estimate["meals"] * self.spacing / 60
+        return estimate
+
+    def reanalyze(self, meal_data: Dict) -> bool:
+        """Analiza de nuevo una comida; el análisis anterior solo se reemplaza si Claude responde bien"""
+        analysis = services.claude.analyze_meal(
+            meal_text=meal_data["text"], user_preferences=self._user_preferences(meal_data["telegram_id"])
+        )
+        if "error" in analysis or analysis.get("error_parsing"):
+            return False
+        return services.db.update_meal_analysis(str(meal_data["_id"]), analysis)
+
+    async def _wait_turn(self) -> None:
+        now = time.monotonic()
+        turn = max(now, self._next_call)
+        self._next_call = turn + self.spacing
+        await asyncio.sleep(turn - now)
+
+    async def _process(self, meals: List[Dict]) -> None:
+        pending = iter(meals)
+
+        async def consume() -> None:
+            for meal_data in pending:
+                if self.stopped:
+                    return
+                await self._wait_turn()
+                reason = reanalysis_reason(meal_data)
+                try:
+                    updated = await asyncio.to_thread(self.reanalyze, meal_data)
+                except Exception as e:
+                    log_error(f"Error al reanalizar la comida {meal_data['_id']}", e)
+                    updated = False
+                self.checkpoint.count(f"{reason}_{'updated' if updated else 'failed'}")
+                self._consecutive_failures = 0 if updated else self._consecutive_failures + 1
+                if self.max_failures and self._consecutive_failures >= self.max_failures:
+                    self.stopped = True
+
+        await asyncio.gather(*(consume() for _ in range(self.concurrency)))
+
+    async def _submit(self, meals: List[Dict]) -> None:
+        """Modo por lotes: envía las comidas a la API de lotes (las que ya están en otro lote se saltan)"""
+        try:
+            job_id = await asyncio.to_thread(
+                batch_analyzer.submit, {"_id": {"$in": [meal_data["_id"] for meal_data in meals]}}, "reanalysis"
+            )
+        except Exception:
+            # No se avanza: el lote se vuelve a enviar al reanudar
+            self.stopped = True
+            return
+        if job_id is None:
+            return
+        self.checkpoint.jobs.append(job_id)
+        for meal_data in meals:
+            self.checkpoint.count(f"{reanalysis_reason(meal_data)}_submitted")
+
+    def _collected(self, job_id: str, stats: Dict[str, int]) -> None:
+        if job_id in self.checkpoint.jobs:
+            self.checkpoint.jobs.remove(job_id)
+        self.checkpoint.count("batch_updated", stats.get("updated", 0))
+        self.checkpoint.count("batch_failed", stats.get("failed", 0))
+        self.checkpoint.save()
+
+    async def run(self, limit: Optional[int] = None, on_batch=None, wait: bool = True) -> Dict:
+        """
+        Reanaliza la selección desde el checkpoint, que avanza tras cada lote completo.
+        Las comidas que fallan se cuentan y se saltan; si se detiene por fallos seguidos, el
+        lote en curso se repite al reanudar. En modo por lotes, con wait espera los
+        resultados de los lotes enviados (también los de ejecuciones anteriores)
+        """
+        self.stopped = False
+        for meals in self.batches(limit):
+            if self.batch:
+                await self._submit(meals)
+            else:
+                await self._process(meals)
+            if self.stopped:
+                cause = "no se pudo enviar el lote" if self.batch else f"{self._consecutive_failures} fallos seguidos de Claude"
+                log_error(f"Reanálisis detenido: {cause}")
+                break
+            self.checkpoint.last_id = str(meals[-1]["_id"])
+            self.checkpoint.count("meals", len(meals))
+            await asyncio.to_thread(self.checkpoint.save)
+            if on_batch:
+                on_batch(self.checkpoint.stats)
+        if self.batch and wait and self.checkpoint.jobs:
+            log_info(f"Esperando los resultados de {len(self.checkpoint.jobs)} lotes de análisis")
+            await batch_analyzer.wait(list(self.checkpoint.jobs), on_collect=self._collected)
+            # Los que recogió otro proceso (el bot) ya no están abiertos
+            self.checkpoint.jobs = []
+            await asyncio.to_thread(self.checkpoint.save)
+        log_info(f"Reanálisis {'detenido' if self.stopped else 'terminado'}: {self.checkpoint.stats}")
+        return self.checkpoint.stats
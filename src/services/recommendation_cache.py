@@ -0,0 +1,54 @@
+"""Caché en memoria de las recomendaciones, válida mientras no cambien los datos del usuario"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from src.config.settings import RECOMMENDATION_CACHE_SIZE, RECOMMENDATION_CACHE_MAX_AGE
+from src.utils.metrics import registry, record_cache
+
+RECOMMENDATION_INVALIDATIONS = registry.counter(
+    "nutribot_recommendation_cache_invalidations_total", "Entradas de recomendaciones invalidadas", ["reason"]
+)
+
+class RecommendationCache:
+    def __init__(self, max_size: int = RECOMMENDATION_CACHE_SIZE, max_age: float = RECOMMENDATION_CACHE_MAX_AGE):
+        self.max_size = max_size
+        self.max_age = max_age
+        # Se usa desde los hilos de las llamadas bloqueantes (MongoDB, Claude)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[str, str, float]]" = OrderedDict()
+
+        registry.gauge(
+            "nutribot_recommendation_cache_entries", "Usuarios con recomendaciones en caché", lambda: len(self._entries)
+        )
+
+    def get(self, telegram_id: int, fingerprint: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is not None and (entry[0] != fingerprint or time.monotonic() - entry[2] > self.max_age):
+                del self._entries[telegram_id]
+                RECOMMENDATION_INVALIDATIONS.inc("stale" if entry[0] != fingerprint else "expired")
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(telegram_id)
+        record_cache("recommendations", entry is not None)
+        return entry[1] if entry else None
+
+    def put(self, telegram_id: int, fingerprint: str, recommendations: str) -> None:
+        if not self.max_size:
+            return
+        with self._lock:
+            self._entries[telegram_id] = (fingerprint, recommendations, time.monotonic())
+            self._entries.move_to_end(telegram_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, telegram_id: int, reason: str) -> None:
+        with self._lock:
+            removed = self._entries.pop(telegram_id, None)
+        if removed is not None:
+            RECOMMENDATION_INVALIDATIONS.inc(reason)
+
+recommendation_cache = RecommendationCache()
@@ -1,17 +1,18 @@
 import asyncio
 from datetime import datetime, time
 from typing import Dict, List, Optional
-import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.jobstores.memory import MemoryJobStore
 from telegram import Bot
 
-from src.config.settings import TELEGRAM_TOKEN
-from src.services.db_service import DatabaseService
+from src.services.container import services
 from src.utils.logger import log_info, log_error
+from src.utils.replies import send_reply
+from src.utils.time_utils import get_timezone, local_now, meal_type_for_hour
 
-db_service = DatabaseService()
+# Nombre del tipo de comida en los mensajes de recordatorio
+REMINDER_MEAL_NAMES = {"breakfast": "desayuno", "lunch": "almuerzo", "snack": "merienda", "dinner": "cena"}
 
 class SchedulerService:
     _instance = None
@@ -22,10 +23,21 @@ class SchedulerService:
             # Usar BackgroundScheduler en lugar de AsyncIOScheduler
             cls._instance.scheduler = BackgroundScheduler()
             cls._instance.scheduler.add_jobstore(MemoryJobStore())
-            cls._instance.bot = Bot(TELEGRAM_TOKEN)
+            # El Bot se comparte con la aplicación (mismo pool de conexiones), ver attach_bot
+            cls._instance.bot = None
             cls._instance.initialized = False
         return cls._instance
     
+    def attach_bot(self, bot: Bot):
+        """Usa el Bot de la aplicación en lugar de crear uno propio"""
+        self.bot = bot
+    
+    def close(self):
+        """Detiene el planificador si estaba corriendo"""
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        SchedulerService._instance = None
+    
     def start(self):
         """Inicia el planificador de tareas"""
         if not self.initialized:
@@ -49,7 +61,7 @@ class SchedulerService:
             trigger = CronTrigger(
                 hour=hour,
                 minute=minute,
-                timezone=pytz.timezone(timezone_str)
+                timezone=get_timezone(timezone_str)
             )
             
             # Programar tarea
@@ -70,24 +82,16 @@ class SchedulerService:
     async def _send_reminder(self, user_id: int):
         """Envía un recordatorio a un usuario"""
         try:
+            if self.bot is None:
+                log_error(f"No hay un Bot asociado al planificador; no se envía el recordatorio a {user_id}")
+                return
+            
             # Determinar el tipo de comida basado en la hora local del usuario
-            user = db_service.get_user(user_id)
+            user = services.db.get_user(user_id)
             if not user:
                 return
             
-            timezone = pytz.timezone(user.timezone)
-            current_time = datetime.now(timezone)
-            hour = current_time.hour
-            
-            # Determinar tipo de comida
-            if 5 <= hour < 11:
-                meal_type = "desayuno"
-            elif 11 <= hour < 15:
-                meal_type = "almuerzo"
-            elif 15 <= hour < 18:
-                meal_type = "merienda"
-            else:
-                meal_type = "cena"
+            meal_type = REMINDER_MEAL_NAMES[meal_type_for_hour(local_now(user.timezone).hour)]
             
             # Construir mensaje
             message = (
@@ -97,11 +101,7 @@ class SchedulerService:
             )
             
             # Enviar mensaje
-            await self.bot.send_message(
-                chat_id=user_id,
-                text=message,
-                parse_mode="Markdown"
-            )
+            await send_reply(self.bot, user_id, message, parse_mode="Markdown")
             
             log_info(f"Recordatorio enviado a usuario {user_id}")
             
@@ -0,0 +1,118 @@
+"""Apagado ordenado del bot"""
+
+import asyncio
+import signal
+import time
+from typing import Awaitable, Callable, Optional, Set
+
+from telegram.ext import Application
+
+from src.config.settings import SHUTDOWN_GRACE_SECONDS
+from src.services.meal_buffer import MealBurstBuffer
+from src.utils.logger import log_info, log_error
+
+PersistUpdate = Callable[[object], Awaitable[None]]
+
+class ShutdownCoordinator:
+    def __init__(self, application: Application, meal_buffer: MealBurstBuffer, persist_update: PersistUpdate,
+                 grace_seconds: float = SHUTDOWN_GRACE_SECONDS):
+        self.application = application
+        self.meal_buffer = meal_buffer
+        self.persist_update = persist_update
+        self.grace_seconds = grace_seconds
+        # Parte del plazo se reserva para que lo cancelado guarde su estado
+        self.persist_seconds = min(5.0, grace_seconds / 4)
+        self._task: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+        self._periodic: Set[asyncio.Task] = set()
+
+    def track(self, task: asyncio.Task) -> None:
+        """Tarea en segundo plano que también se espera (y si no alcanza, se cancela) al apagar"""
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def track_periodic(self, task: asyncio.Task) -> None:
+        """Tarea periódica sin fin: no se espera, se cancela al empezar el apagado"""
+        self._periodic.add(task)
+        task.add_done_callback(self._periodic.discard)
+
+    def cancel_periodic(self) -> None:
+        for task in list(self._periodic):
+            task.cancel()
+
+    def install_signal_handlers(self) -> None:
+        """Reemplaza el manejo de señales de PTB (run_* con stop_signals=None)"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.request_stop)
+
+    def request_stop(self) -> None:
+        if self._task is None:
+            log_info("Señal de apagado recibida; terminando el trabajo en curso")
+            self._task = asyncio.create_task(self._stop())
+
+    async def _stop(self) -> None:
+        try:
+            await self.drain()
+        except Exception as e:
+            log_error("Error durante el apagado ordenado", e)
+        finally:
+            self.application.stop_running()
+
+    def _idle(self) -> bool:
+        return (
+            self.application.update_queue.empty()
+            and not self.application.update_processor.active_updates
+            and not self.meal_buffer.busy
+            and not self._background
+        )
+
+    async def drain(self) -> None:
+        """Deja de recibir, termina lo pendiente con plazo y guarda lo que quede sin procesar"""
+        started = time.monotonic()
+        deadline = started + self.grace_seconds - self.persist_seconds
+
+        # 1. No aceptar actualizaciones nuevas (polling o webhook)
+        updater = self.application.updater
+        if updater and updater.running:
+            await updater.stop()
+        self.cancel_periodic()
+
+        # 2. Las ráfagas agrupadas se procesan ya y los mensajes que siguen en cola, sin agrupar
+        self.meal_buffer.close()
+        flush = asyncio.create_task(self.meal_buffer.flush_all())
+
+        # 3. Esperar a que termine el trabajo en curso, con plazo
+        while not self._idle() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        if self._idle():
+            await flush
+            log_info(f"Trabajo en curso terminado en {time.monotonic() - started:.1f} s")
+            return
+
+        # 4. Plazo vencido: cancelar lo que sigue en curso y guardar lo que no empezó
+        unprocessed = []
+        while not self.application.update_queue.empty():
+            unprocessed.append(self.application.update_queue.get_nowait())
+            self.application.update_queue.task_done()
+
+        processor = self.application.update_processor
+        unprocessed.extend(processor.cancel_all())
+        cancelled = self.meal_buffer.cancel_all() + list(self._background)
+        for task in self._background:
+            task.cancel()
+        flush.cancel()
+
+        log_error(
+            f"Plazo de apagado vencido: se cancelan las actualizaciones en curso "
+            f"y se guardan {len(unprocessed)} sin procesar"
+        )
+        waits = [self.persist_update(update) for update in unprocessed]
+        waits.append(processor.wait_cancelled(self.persist_seconds))
+        if cancelled:
+            waits.append(asyncio.wait(cancelled, timeout=self.persist_seconds))
+        try:
+            await asyncio.wait_for(asyncio.gather(*waits, return_exceptions=True), timeout=self.persist_seconds)
+        except asyncio.TimeoutError:
+            log_error("No todo el trabajo cancelado alcanzó a guardarse antes del cierre")
@@ -1,14 +1,109 @@
-from datetime import datetime, time, timedelta
-from typing import Dict, List
-import pytz
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
 
-from src.models.meal import Meal
-from src.services.db_service import DatabaseService
-from src.services.claude_service import ClaudeService
+from src.config.settings import PROFILE_WINDOW_DAYS, PROFILE_SHORT_WINDOW_DAYS, PROFILE_TOP_FOODS
+from src.models.user import User
+from src.models.nutrients import NUTRIENTS, NUTRIENT_DEFAULTS, LEVEL_NAMES, has_levels
+from src.models.profile import NutritionProfile, meal_increments, apply_increments
+from src.services.container import services
+from src.services.recommendation_cache import recommendation_cache
 from src.utils.logger import log_info, log_error
+from src.utils.metrics import record_cache
+from src.utils.time_utils import local_now, local_today, day_bounds_utc, range_bounds_utc
 
-db_service = DatabaseService()
-claude_service = ClaudeService()
+# Un promedio desde 1.5 es "medio" y desde 2.5 es "alto"
+LEVEL_THRESHOLDS = (1.5, 2.5)
+_AVERAGE_LEVELS = (LEVEL_NAMES[1], LEVEL_NAMES[2], LEVEL_NAMES[3])
+
+# Cambio del promedio diario (en niveles) a lo largo del periodo para considerarlo tendencia
+TREND_THRESHOLD = 0.5
+
+def _day_bounds(timezone_str: str) -> Tuple[datetime, datetime, datetime]:
+    """Hora local actual del usuario e inicio y fin de su día en UTC"""
+    now = local_now(timezone_str)
+    start_of_day_utc, end_of_day_utc = day_bounds_utc(timezone_str, now.date())
+    return now, start_of_day_utc, end_of_day_utc
+
+def _fingerprint(*parts: Any) -> str:
+    """Huella de los datos con los que se calculó un resultado"""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def day_summary_fingerprint(telegram_id: int, timezone_str: str) -> str:
+    """Cambia con el día local y con cada comida del día que se guarda o se analiza"""
+    now, start_utc, end_utc = _day_bounds(timezone_str)
+    rows = services.db.get_meal_fingerprints(telegram_id, start_utc, end_utc)
+    return _fingerprint("summary", now.date(), rows)
+
+def recommendations_fingerprint(user: User) -> str:
+    """Cambia con las preferencias, con cada actualización del perfil nutricional y con el día local"""
+    version = services.db.get_nutrition_profile_version(user.telegram_id)
+    if version is None:
+        version = load_nutrition_profile(user).version
+    today = local_today(user.timezone)
+    return _fingerprint("recommendations", user.preferences, version, today)
+
+def _find_precomputed(telegram_id: int, kind: str, fingerprint: str) -> Optional[Any]:
+    stored = services.db.get_precomputed(telegram_id, kind)
+    hit = stored is not None and stored["fingerprint"] == fingerprint
+    record_cache(f"precomputed_{kind}", hit)
+    return stored["payload"] if hit else None
+
+def find_precomputed_summary(telegram_id: int, timezone_str: str) -> Optional[Dict]:
+    """Resumen del día precalculado, si las comidas del día no cambiaron desde entonces"""
+    return _find_precomputed(telegram_id, "summary", day_summary_fingerprint(telegram_id, timezone_str))
+
+def find_ready_recommendations(user: User) -> Tuple[Optional[str], str]:
+    """
+    Recomendaciones ya generadas (en caché o precalculadas) si el perfil nutricional y las
+    preferencias no cambiaron, junto con la huella actual para guardar las que se generen
+    """
+    fingerprint = recommendations_fingerprint(user)
+    recommendations = recommendation_cache.get(user.telegram_id, fingerprint)
+    if recommendations is None:
+        recommendations = _find_precomputed(user.telegram_id, "recommendations", fingerprint)
+        if recommendations is not None:
+            recommendation_cache.put(user.telegram_id, fingerprint, recommendations)
+    return recommendations, fingerprint
+
+def load_nutrition_profile(user: User) -> NutritionProfile:
+    """
+    Perfil nutricional del usuario. Si todavía no existe (usuarios anteriores al perfil) se
+    construye una vez con las comidas analizadas de la ventana
+    """
+    profile = services.db.get_nutrition_profile(user.telegram_id)
+    if profile is not None:
+        return profile
+    
+    # La ventana empieza a medianoche local, igual que los días del perfil
+    now, start_of_day_utc, _ = _day_bounds(user.timezone)
+    meals = services.db.get_meals_by_user_and_date(
+        user.telegram_id, start_of_day_utc - timedelta(days=PROFILE_WINDOW_DAYS - 1), datetime.utcnow()
+    )
+    data = {"telegram_id": user.telegram_id}
+    for meal in meals:
+        if meal.analyzed:
+            apply_increments(
+                data, meal_increments(meal.meal_type, meal.timestamp, meal.analysis.get("foods"), meal.nutrients, user.timezone)
+            )
+    profile = NutritionProfile.from_dict(data)
+    profile.version = services.db.replace_nutrition_profile(profile)
+    log_info(f"Perfil nutricional del usuario {user.telegram_id} construido con {profile.meals} comidas")
+    return profile
+
+def level_value(nutrients: Dict, nutrient: str) -> int:
+    """Nivel numérico de un nutriente; el valor por defecto si falta o no se reconoció"""
+    return int(nutrients.get(nutrient) or NUTRIENT_DEFAULTS[nutrient])
+
+def value_to_level(value: float) -> str:
+    """Convierte un promedio numérico a nivel"""
+    return values_to_levels(np.asarray([value]))[0]
+
+def values_to_levels(values: np.ndarray) -> List[str]:
+    """Versión vectorizada de value_to_level"""
+    return [_AVERAGE_LEVELS[index] for index in np.digitize(values, LEVEL_THRESHOLDS)]
 
 def get_day_summary(telegram_id: int, timezone_str: str = "America/Mexico_City") -> Dict:
     """
@@ -22,20 +117,11 @@ def get_day_summary(telegram_id: int, timezone_str: str = "America/Mexico_City")
         Diccionario con el resumen del día
     """
     try:
-        # Obtener zona horaria del usuario
-        timezone = pytz.timezone(timezone_str)
-        
-        # Calcular inicio y fin del día en la zona horaria del usuario
-        now = datetime.now(timezone)
-        start_of_day = timezone.localize(datetime.combine(now.date(), time.min))
-        end_of_day = timezone.localize(datetime.combine(now.date(), time.max))
-        
-        # Convertir a UTC para la consulta a la base de datos
-        start_of_day_utc = start_of_day.astimezone(pytz.UTC)
-        end_of_day_utc = end_of_day.astimezone(pytz.UTC)
+        # Inicio y fin del día en la zona horaria del usuario, en UTC para la consulta
+        now, start_of_day_utc, end_of_day_utc = _day_bounds(timezone_str)
         
         # Obtener las comidas del día
-        meals = db_service.get_meals_by_user_and_date(
+        meals = services.db.get_meals_by_user_and_date(
             telegram_id=telegram_id,
             start_date=start_of_day_utc,
             end_date=end_of_day_utc
@@ -53,16 +139,7 @@ def get_day_summary(telegram_id: int, timezone_str: str = "America/Mexico_City")
         total_carbs = 0
         total_fats = 0
         total_fiber = 0
-        
-        # Función para convertir nivel a valor numérico
-        def level_to_value(level: str) -> int:
-            if level.lower() in ["alto", "high"]:
-                return 3
-            elif level.lower() in ["medio", "medium"]:
-                return 2
-            elif level.lower() in ["bajo", "low"]:
-                return 1
-            return 0
+        total_kcal = 0.0
         
         for meal in meals:
             meal_type = meal.meal_type
@@ -72,12 +149,13 @@ def get_day_summary(telegram_id: int, timezone_str: str = "America/Mexico_City")
             meals_by_type[meal_type].append(meal)
             
             # Sumar nutrientes si están disponibles
-            if meal.analyzed and meal.analysis and "nutrients" in meal.analysis:
-                nutrients = meal.analysis["nutrients"]
-                total_protein += level_to_value(nutrients.get("protein", "medio"))
-                total_carbs += level_to_value(nutrients.get("carbs", "medio"))
-                total_fats += level_to_value(nutrients.get("fats", "medio"))
-                total_fiber += level_to_value(nutrients.get("fiber", "bajo"))
+            if meal.analyzed and has_levels(meal.nutrients):
+                total_protein += level_value(meal.nutrients, "protein")
+                total_carbs += level_value(meal.nutrients, "carbs")
+                total_fats += level_value(meal.nutrients, "fats")
+                total_fiber += level_value(meal.nutrients, "fiber")
+            if meal.analyzed:
+                total_kcal += meal.nutrients.get("kcal", 0)
         
         # Calcular promedio de cada nutriente (si hay comidas)
         num_meals = len(meals)
@@ -89,15 +167,6 @@ def get_day_summary(telegram_id: int, timezone_str: str = "America/Mexico_City")
         else:
             avg_protein = avg_carbs = avg_fats = avg_fiber = 0
         
-        # Convertir promedio a nivel
-        def value_to_level(value: float) -> str:
-            if value >= 2.5:
-                return "alto"
-            elif value >= 1.5:
-                return "medio"
-            else:
-                return "bajo"
-        
         # Crear resumen del día
         summary = {
             "date": now.strftime("%d/%m/%Y"),
@@ -112,6 +181,7 @@ def get_day_summary(telegram_id: int, timezone_str: str = "America/Mexico_City")
                 meal_type: [meal.text for meal in meal_list]
                 for meal_type, meal_list in meals_by_type.items() if meal_list
             },
+            "calories": round(total_kcal),
             "nutrient_summary": {
                 "protein": value_to_level(avg_protein),
                 "carbs": value_to_level(avg_carbs),
@@ -132,50 +202,176 @@ def get_day_summary(telegram_id: int, timezone_str: str = "America/Mexico_City")
             "nutrient_summary": {}
         }
 
-def generate_daily_recommendations(telegram_id: int) -> str:
+def _streaks(logged: np.ndarray) -> Tuple[int, int]:
+    """Racha actual (hasta hoy o ayer) y racha más larga de días con comidas registradas"""
+    edges = np.diff(np.concatenate(([0], logged.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if not starts.size:
+        return 0, 0
+    lengths = ends - starts
+    current = int(lengths[-1]) if ends[-1] >= len(logged) - 1 else 0
+    return current, int(lengths.max())
+
+def get_range_summary(telegram_id: int, days: int, timezone_str: str = "America/Mexico_City") -> Dict:
     """
-    Genera recomendaciones personalizadas basadas en el resumen del día
+    Obtiene un resumen de los últimos días (incluido hoy) para un usuario
+    
+    Las comidas se agregan por día en MongoDB y el resto se calcula con arreglos de
+    NumPy, así que el costo apenas depende de la cantidad de días.
     
     Args:
         telegram_id: ID de Telegram del usuario
+        days: Cantidad de días del resumen (7 para la semana, 30 para el mes)
+        timezone_str: Zona horaria del usuario
+        
+    Returns:
+        Diccionario con el resumen del periodo
+    """
+    try:
+        today = local_today(timezone_str)
+        first_day = today - timedelta(days=days - 1)
+        start_utc, end_utc = range_bounds_utc(timezone_str, first_day, today)
+        
+        rollups = services.db.get_daily_rollups(
+            telegram_id, start_utc, end_utc, timezone_str, NUTRIENT_DEFAULTS
+        )
+        
+        # Una fila por día del periodo (los días sin comidas quedan en cero)
+        meals = np.zeros(days)
+        totals = np.zeros((days, len(NUTRIENTS)))
+        for rollup in rollups:
+            index = (date.fromisoformat(rollup["_id"]) - first_day).days
+            if 0 <= index < days:
+                meals[index] = rollup["meals"]
+                totals[index] = [rollup[nutrient] for nutrient in NUTRIENTS]
+        
+        logged = meals > 0
+        meals_count = int(meals.sum())
+        
+        # Promedio del periodo con el mismo criterio que el resumen del día (todas las comidas)
+        averages = totals.sum(axis=0) / meals_count if meals_count else np.zeros(len(NUTRIENTS))
+        
+        # Tendencia: pendiente de la recta que ajusta el promedio diario de cada nutriente
+        trends = dict.fromkeys(NUTRIENTS, "estable")
+        if logged.sum() >= 2:
+            daily_averages = totals[logged] / meals[logged, None]
+            slopes = np.polyfit(np.flatnonzero(logged), daily_averages, 1)[0]
+            changes = slopes * (days - 1)
+            trends = {
+                nutrient: "subiendo" if change >= TREND_THRESHOLD else "bajando" if change <= -TREND_THRESHOLD else "estable"
+                for nutrient, change in zip(NUTRIENTS, changes)
+            }
+        
+        current_streak, longest_streak = _streaks(logged)
+        
+        return {
+            "days": days,
+            "start": first_day.strftime("%d/%m/%Y"),
+            "end": today.strftime("%d/%m/%Y"),
+            "meals_count": meals_count,
+            "days_logged": int(logged.sum()),
+            "meals_per_day": round(meals_count / int(logged.sum()), 1) if meals_count else 0,
+            "current_streak": current_streak,
+            "longest_streak": longest_streak,
+            "nutrient_summary": dict(zip(NUTRIENTS, values_to_levels(averages))) if meals_count else {},
+            "nutrient_trends": trends
+        }
+        
+    except Exception as e:
+        log_error(f"Error al generar resumen de {days} días para usuario {telegram_id}", e)
+        return {
+            "error": str(e),
+            "days": days,
+            "meals_count": 0,
+            "nutrient_summary": {}
+        }
+
+def generate_daily_recommendations(telegram_id: int, fingerprint: Optional[str] = None) -> str:
+    """
+    Genera recomendaciones personalizadas basadas en el perfil nutricional del usuario
+    
+    Args:
+        telegram_id: ID de Telegram del usuario
+        fingerprint: Huella de los datos usados; si se indica, el resultado se guarda en caché
         
     Returns:
         Texto con recomendaciones personalizadas
     """
     try:
         # Obtener usuario y sus preferencias
-        user = db_service.get_user(telegram_id)
+        user = services.db.get_user(telegram_id)
         if not user:
             return "No se encontró información del usuario. Por favor, inicia el bot con /start."
         
-        # Obtener comidas recientes
-        recent_meals = db_service.get_recent_meals(telegram_id, limit=8)
-        if not recent_meals:
+        # Perfil nutricional acumulado (reemplaza al historial de comidas en el prompt)
+        profile = load_nutrition_profile(user)
+        today = local_today(user.timezone)
+        if not profile.window(today, PROFILE_WINDOW_DAYS).get("meals"):
             return "No hemos registrado comidas suficientes. Registra algunas comidas y luego solicita recomendaciones."
         
-        # Convertir las comidas a formato adecuado para Claude
-        meals_for_claude = [
-            {
-                "meal_type": meal.meal_type,
-                "text": meal.text,
-                "timestamp": meal.timestamp.strftime("%Y-%m-%d %H:%M"),
-                "analysis": meal.analysis if meal.analyzed else {}
-            }
-            for meal in recent_meals
-        ]
-        
-        # Generar recomendaciones usando Claude
-        recommendations = claude_service.generate_recommendations(
-            recent_meals=meals_for_claude,
-            user_preferences=user.preferences
-        )
-        
+        recommendations = request_recommendations(user, profile)
+        if fingerprint and recommendations != services.claude.RECOMMENDATIONS_UNAVAILABLE:
+            recommendation_cache.put(telegram_id, fingerprint, recommendations)
         return recommendations
     
     except Exception as e:
         log_error(f"Error al generar recomendaciones para usuario {telegram_id}", e)
         return "Lo siento, no se pudieron generar recomendaciones en este momento. Por favor, intenta de nuevo más tarde."
 
+def request_recommendations(user: User, profile: NutritionProfile) -> str:
+    """
+    Pide a Claude las recomendaciones a partir del perfil nutricional del usuario
+    
+    Args:
+        user: Usuario (se usan sus preferencias y su zona horaria)
+        profile: Perfil nutricional acumulado
+        
+    Returns:
+        Texto con recomendaciones (services.claude.RECOMMENDATIONS_UNAVAILABLE si Claude falló)
+    """
+    today = local_today(user.timezone)
+    return services.claude.generate_recommendations(
+        nutrition_profile=describe_profile(profile, today),
+        user_preferences=user.preferences
+    )
+
+def describe_profile(profile: NutritionProfile, today: date) -> str:
+    """Resumen compacto del perfil para el prompt: su tamaño no depende del historial"""
+    nutrient_names = {"protein": "proteínas", "carbs": "carbohidratos", "fats": "grasas", "fiber": "fibra"}
+    meal_type_names = {"breakfast": "desayuno", "lunch": "almuerzo", "dinner": "cena", "snack": "snack"}
+    windows = (PROFILE_SHORT_WINDOW_DAYS, PROFILE_WINDOW_DAYS)
+    
+    totals = profile.window(today, PROFILE_WINDOW_DAYS)
+    lines = [
+        f"Comidas analizadas en los últimos {PROFILE_WINDOW_DAYS} días: {totals.get('meals', 0)} "
+        f"en {totals['logged_days']} días con registros"
+    ]
+    
+    averages = [profile.averages(today, days) for days in windows]
+    lines.append(f"Nivel promedio por comida (últimos {windows[0]} días / últimos {windows[1]} días, de 1 bajo a 3 alto):")
+    for nutrient in NUTRIENTS:
+        values = [
+            f"{value_to_level(average[nutrient])} ({average[nutrient]:.1f})" if nutrient in average else "sin registros"
+            for average in averages
+        ]
+        lines.append(f"- {nutrient_names[nutrient]}: {' / '.join(values)}")
+    if any("kcal" in average for average in averages):
+        values = [f"{average['kcal']:.0f} kcal" if "kcal" in average else "sin registros" for average in averages]
+        lines.append(f"Energía estimada por día: {' / '.join(values)}")
+    
+    top_foods = profile.top_foods(PROFILE_TOP_FOODS)
+    if top_foods:
+        lines.append("Alimentos más frecuentes: " + ", ".join(f"{food} ({count})" for food, count in top_foods))
+    
+    usual_hours = profile.usual_hours()
+    if usual_hours:
+        lines.append("Horarios habituales (hora local): " + ", ".join(
+            f"{meal_type_names.get(meal_type, meal_type)} a las {hour} h ({count})"
+            for meal_type, (hour, count) in sorted(usual_hours.items(), key=lambda item: item[1][0])
+        ))
+    return "\n".join(lines)
+
 def format_day_summary(summary: Dict) -> str:
     """
     Formatea el resumen del día para mostrar al usuario
@@ -237,6 +433,56 @@ def format_day_summary(summary: Dict) -> str:
             
             formatted_text += f"• {emoji} {nutrient.capitalize()}: {level.capitalize()} {level_emoji}\n"
     
+    if summary.get("calories"):
+        formatted_text += f"• 🔥 Energía estimada: {summary['calories']} kcal\n"
+    
     formatted_text += "\nPara recibir recomendaciones personalizadas, usa el comando /recomendacion"
     
-    return formatted_text
\ No newline at end of file
+    return formatted_text
+
+def format_range_summary(summary: Dict) -> str:
+    """
+    Formatea el resumen de varios días para mostrar al usuario
+    
+    Args:
+        summary: Diccionario con el resumen del periodo
+        
+    Returns:
+        Texto formateado para mostrar al usuario
+    """
+    if "error" in summary:
+        return "No se pudo generar el resumen. Por favor, intenta de nuevo más tarde."
+    
+    nutrient_names = {
+        "protein": "🥩 Proteínas",
+        "carbs": "🍚 Carbohidratos",
+        "fats": "🥑 Grasas",
+        "fiber": "🥦 Fibra"
+    }
+    
+    trend_emojis = {
+        "subiendo": "📈",
+        "bajando": "📉",
+        "estable": "➖"
+    }
+    
+    title = "Resumen semanal" if summary["days"] == 7 else f"Resumen de los últimos {summary['days']} días"
+    formatted_text = f"📅 *{title}* ({summary['start']} - {summary['end']})\n\n"
+    
+    if summary["meals_count"] == 0:
+        formatted_text += "No registraste comidas en este periodo. ¡Cuéntame lo que comes para ver tu progreso!\n"
+        return formatted_text
+    
+    formatted_text += f"• Comidas registradas: {summary['meals_count']} en {summary['days_logged']} de {summary['days']} días\n"
+    formatted_text += f"• Promedio: {summary['meals_per_day']} comidas por día registrado\n"
+    formatted_text += f"• Racha actual: {summary['current_streak']} días (la más larga: {summary['longest_streak']})\n"
+    
+    formatted_text += "\n*Perfil nutricional y tendencia:*\n"
+    for nutrient, name in nutrient_names.items():
+        level = summary["nutrient_summary"].get(nutrient, "medio")
+        trend = summary["nutrient_trends"].get(nutrient, "estable")
+        formatted_text += f"• {name}: {level.capitalize()} {trend_emojis[trend]} {trend}\n"
+    
+    formatted_text += "\nPara ver el detalle de hoy, usa el comando /resumen"
+    
+    return formatted_text
@@ -1,15 +1,133 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
 
-# Configuración básica del logger
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()  # Mostrar logs en consola
-    ]
-)
+from src.config.settings import LOG_LEVEL, LOG_FORMAT, LOG_ASYNC, LOG_INFO_SAMPLE_RATE
+
+# Campos de contexto que se agregan a cada registro (ver log_context)
+CONTEXT_FIELDS = ("user_id", "update_id", "trace_id")
+
+_log_context: ContextVar[Dict] = ContextVar("nutribot_log_context", default={})
+_listener: Optional[logging.handlers.QueueListener] = None
+
+@contextmanager
+def log_context(**fields):
+    """Asocia campos (user_id, update_id, trace_id...) a todos los logs emitidos dentro del bloque"""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+class _ContextFilter(logging.Filter):
+    """Copia el contexto actual al registro; corre en el hilo que emite el log"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field))
+        return True
+
+class _SamplingFilter(logging.Filter):
+    """Descarta una fracción de los eventos info marcados como muestreables"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not getattr(record, "sampled", False):
+            return True
+        return random.random() < self.rate
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no formatea en el hilo que emite: el mensaje (con sus argumentos %)
+    se arma en el hilo del QueueListener, fuera del event loop.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea con campos consistentes para consultar los logs"""
+
+    _RESERVED = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime", "sampled"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in self._RESERVED and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def configure_logging() -> None:
+    """Configura el logging de la aplicación (idempotente)"""
+    global _listener
+    root = logging.getLogger()
+    if getattr(root, "_nutribot_configured", False):
+        return
+
+    stream_handler = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    if LOG_ASYNC:
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        handler: logging.Handler = _DeferredQueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        handler = stream_handler
+
+    handler.addFilter(_ContextFilter())
+    if LOG_INFO_SAMPLE_RATE < 1.0:
+        handler.addFilter(_SamplingFilter(LOG_INFO_SAMPLE_RATE))
+
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    # httpx registra una línea por cada petición a Telegram/Anthropic: demasiado volumen en INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    root._nutribot_configured = True
+
+def stop_logging() -> None:
+    """Vacía la cola de logs pendientes (al apagar el proceso)"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+def _reset_after_fork() -> None:
+    """El hilo del QueueListener no sobrevive a un fork: el proceso hijo arranca el suyo"""
+    global _listener
+    _listener = None
+    logging.getLogger()._nutribot_configured = False
+    configure_logging()
+
+configure_logging()
+os.register_at_fork(after_in_child=_reset_after_fork)
 
 # Crear un logger personalizado para nuestra aplicación
 logger = logging.getLogger('nutribot')
@@ -21,18 +139,24 @@ def log_info(message: str) -> None:
 def log_error(message: str, error: Exception = None) -> None:
     """Registra un mensaje de error"""
     if error:
-        logger.error(f"{message}: {str(error)}")
+        logger.error("%s: %s", message, error, extra={"error_type": type(error).__name__})
     else:
         logger.error(message)
 
 def log_user_action(telegram_id: int, action: str, details: str = None) -> None:
     """Registra una acción de usuario"""
-    message = f"Usuario {telegram_id} - {action}"
+    extra = {"user_id": telegram_id, "action": action, "sampled": True}
     if details:
-        message += f": {details}"
-    logger.info(message)
+        logger.info("Usuario %s - %s: %s", telegram_id, action, details, extra={**extra, "details": details})
+    else:
+        logger.info("Usuario %s - %s", telegram_id, action, extra=extra)
 
 def log_meal_record(telegram_id: int, meal_type: str, content: str) -> None:
     """Registra el registro de una comida"""
+    if not logger.isEnabledFor(logging.INFO):
+        return
     shortened_content = content[:50] + "..." if len(content) > 50 else content
-    logger.info(f"Usuario {telegram_id} registró {meal_type}: {shortened_content}")
\ No newline at end of file
+    logger.info(
+        "Usuario %s registró %s: %s", telegram_id, meal_type, shortened_content,
+        extra={"user_id": telegram_id, "meal_type": meal_type, "sampled": True}
+    )
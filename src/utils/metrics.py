@@ -0,0 +1,246 @@
+"""Métricas del bot en formato de Prometheus"""
+
+import asyncio
+import functools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.utils.logger import log_info, log_error
+from src.utils.tracing import span
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    metric_type = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, values)} {value}" for values, value in items]
+
+class Gauge(_Metric):
+    """
+    Gauge cuyo valor se obtiene al momento de exponer las métricas.
+    Con etiquetas, el callback devuelve un diccionario {valores_de_etiquetas: valor}.
+    """
+    metric_type = "gauge"
+
+    def __init__(self, name: str, help_text: str, callback: Callable[[], object], labels: Iterable[str] = ()):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        try:
+            value = self.callback()
+            if not self.label_names:
+                return [f"{self.name} {float(value)}"]
+            return [
+                f"{self.name}{_format_labels(self.label_names, values)} {float(series_value)}"
+                for values, series_value in value.items()
+            ]
+        except Exception as e:
+            log_error(f"Error al calcular la métrica {self.name}", e)
+            return []
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            # Cada serie: [conteo por bucket..., suma, conteo total]
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0.0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(values, list(series)) for values, series in self._series.items()]
+        lines = []
+        for values, series in items:
+            for index, bound in enumerate(self.buckets):
+                labels = _format_labels(self.label_names, values, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {series[index]}")
+            labels = _format_labels(self.label_names, values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            labels = _format_labels(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name: str, help_text: str, callback: Callable[[], object], labels: Iterable[str] = ()) -> Gauge:
+        """Registra (o reemplaza) un gauge calculado con callback"""
+        gauge = Gauge(name, help_text, callback, labels)
+        with self._lock:
+            self._metrics[name] = gauge
+        return gauge
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# Métricas comunes del bot
+UPDATE_DURATION = registry.histogram(
+    "nutribot_update_duration_seconds", "Duración total del procesamiento de cada actualización"
+)
+HANDLER_DURATION = registry.histogram(
+    "nutribot_handler_duration_seconds", "Duración de los handlers de Telegram", ["handler"]
+)
+CLAUDE_DURATION = registry.histogram(
+    "nutribot_claude_duration_seconds", "Duración de las llamadas de ClaudeService", ["method"]
+)
+DB_DURATION = registry.histogram(
+    "nutribot_db_duration_seconds", "Duración de las operaciones de DatabaseService", ["method"]
+)
+TELEGRAM_DURATION = registry.histogram(
+    "nutribot_telegram_duration_seconds", "Duración de las llamadas a la API de Bots", ["method"]
+)
+ERRORS = registry.counter("nutribot_errors_total", "Excepciones no controladas por componente", ["component", "name"])
+CLAUDE_TOKENS = registry.counter("nutribot_claude_tokens_total", "Tokens consumidos en Claude", ["method", "kind"])
+CACHE_REQUESTS = registry.counter("nutribot_cache_requests_total", "Consultas a cachés", ["cache", "result"])
+
+_COMPONENT_HISTOGRAMS = {
+    "handler": HANDLER_DURATION,
+    "claude": CLAUDE_DURATION,
+    "db": DB_DURATION,
+    "telegram": TELEGRAM_DURATION
+}
+
+def timed(component: str, name: Optional[str] = None):
+    """
+    Decorador que mide la duración de una función (síncrona o asíncrona)
+    en el histograma del componente ("handler", "claude", "db" o "telegram")
+    y la registra como span de la traza activa.
+    """
+    histogram = _COMPONENT_HISTOGRAMS[component]
+
+    def decorator(func):
+        label = name or func.__name__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    with span(component, label):
+                        return await func(*args, **kwargs)
+                except Exception:
+                    ERRORS.inc(component, label)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - started, label)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with span(component, label):
+                    return func(*args, **kwargs)
+            except Exception:
+                ERRORS.inc(component, label)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, label)
+        return wrapper
+
+    return decorator
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Registra un acierto o fallo de caché"""
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+def record_tokens(method: str, usage) -> None:
+    """Registra el uso de tokens de una respuesta de la API de Anthropic"""
+    if usage is None:
+        return
+    CLAUDE_TOKENS.inc(method, "input", amount=getattr(usage, "input_tokens", 0) or 0)
+    CLAUDE_TOKENS.inc(method, "output", amount=getattr(usage, "output_tokens", 0) or 0)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Evitar una línea de log por cada scrape
+        pass
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Sirve /metrics en un hilo en segundo plano"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="nutribot-metrics", daemon=True)
+    thread.start()
+    log_info(f"Métricas disponibles en http://{host}:{port}/metrics")
+    return server
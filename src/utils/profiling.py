@@ -0,0 +1,173 @@
+"""Perfilado por muestreo de las actualizaciones lentas"""
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter as FrameCounter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.config.settings import (
+    PROFILE_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_INTERVAL_MS,
+    PROFILE_SLOW_THRESHOLD_MS, PROFILE_DIR, PROFILE_MAX_FILES
+)
+from src.utils.logger import log_info, log_error
+from src.utils.metrics import registry
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROFILES_DUMPED = registry.counter("nutribot_profiles_dumped_total", "Perfiles de actualizaciones lentas guardados")
+
+class ProfileSession:
+    """Muestras acumuladas mientras se procesa una actualización (o una ráfaga de comidas)"""
+    def __init__(self, update_id: Optional[int], name: Optional[str] = None):
+        self.update_id = update_id
+        # Prefijo del archivo del perfil
+        self.name = name or f"update-{update_id}"
+        self.started = time.perf_counter()
+        self.samples = 0
+        self.stacks: FrameCounter = FrameCounter()
+
+class SamplingProfiler:
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SamplingProfiler, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self.sample_rate = PROFILE_SAMPLE_RATE
+        self.interval = PROFILE_INTERVAL_MS / 1000
+        self.threshold_ms = PROFILE_SLOW_THRESHOLD_MS
+        self.directory = PROFILE_DIR
+        self._sessions: List[ProfileSession] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.dumped = 0
+        if PROFILE_ENABLED:
+            self.enable()
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def enable(self, sample_rate: Optional[float] = None) -> None:
+        """Arranca el hilo de muestreo (idempotente)"""
+        if sample_rate is not None:
+            self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        if self.enabled:
+            return
+        # Cada hilo tiene su propio evento para que desactivar y reactivar no deje dos muestreadores
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), name="nutribot-profiler", daemon=True)
+        self._thread.start()
+        log_info(f"Perfilado activado (tasa {self.sample_rate}, umbral {self.threshold_ms} ms)")
+
+    def disable(self) -> None:
+        """Detiene el muestreo; las sesiones en curso se descartan"""
+        self._stop.set()
+        with self._lock:
+            self._sessions.clear()
+        self._thread = None
+        log_info("Perfilado desactivado")
+
+    def start(self, update_id: Optional[int], name: Optional[str] = None) -> Optional[ProfileSession]:
+        """Abre una sesión para la actualización si le toca ser perfilada"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        session = ProfileSession(update_id, name)
+        with self._lock:
+            self._sessions.append(session)
+        return session
+
+    def finish(self, session: ProfileSession) -> Optional[float]:
+        """Cierra la sesión y devuelve su duración en ms si hay que guardar el perfil"""
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+        elapsed_ms = (time.perf_counter() - session.started) * 1000
+        if elapsed_ms < self.threshold_ms or not session.stacks:
+            return None
+        return elapsed_ms
+
+    def _run(self, stop: threading.Event) -> None:
+        own_ident = threading.get_ident()
+        while not stop.wait(self.interval):
+            with self._lock:
+                if not self._sessions:
+                    continue
+                sessions = list(self._sessions)
+
+            stacks = self._sample(own_ident)
+            with self._lock:
+                for session in sessions:
+                    session.samples += 1
+                    session.stacks.update(stacks)
+
+    @staticmethod
+    def _sample(own_ident: int) -> List[str]:
+        """Pilas actuales de los hilos que están ejecutando código del bot"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            frames = []
+            in_project = False
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename.startswith(PROJECT_ROOT) and "site-packages" not in code.co_filename:
+                    in_project = True
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if in_project:
+                frames.append(names.get(ident, str(ident)))
+                stacks.append(";".join(reversed(frames)))
+        return stacks
+
+    def dump(self, session: ProfileSession, elapsed_ms: float) -> Optional[str]:
+        """Escribe el perfil en formato folded y poda los más antiguos"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(
+                self.directory,
+                f"{session.name}-{int(elapsed_ms)}ms-{datetime.now():%Y%m%d-%H%M%S}.folded"
+            )
+            with open(path, "w", encoding="utf-8") as profile_file:
+                for stack, count in session.stacks.most_common():
+                    profile_file.write(f"{stack} {count}\n")
+            self._prune()
+        except OSError as e:
+            log_error(f"Error al guardar el perfil {session.name}", e)
+            return None
+
+        self.dumped += 1
+        PROFILES_DUMPED.inc()
+        log_info(f"Perfil de actualización lenta guardado en {path} ({session.samples} muestras)")
+        return path
+
+    def _prune(self) -> None:
+        profiles = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".folded")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in profiles[:max(len(profiles) - PROFILE_MAX_FILES, 0)]:
+            os.remove(entry.path)
+
+    def status(self) -> Dict:
+        with self._lock:
+            active = len(self._sessions)
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold_ms,
+            "directory": self.directory,
+            "active_sessions": active,
+            "dumped": self.dumped
+        }
@@ -0,0 +1,82 @@
+"""Ayudantes para responder con la menor cantidad de llamadas a la API de Telegram"""
+
+import asyncio
+from typing import IO, Optional, Set
+from telegram import Bot, CallbackQuery, InputFile, Message
+from telegram.constants import ChatAction
+from telegram.error import BadRequest, TelegramError
+
+from src.config.settings import REPLY_TYPING_ACTION
+from src.utils.logger import log_error
+
+# Referencias a las tareas en segundo plano para que no las recolecte el GC
+_background_tasks: Set[asyncio.Task] = set()
+
+def start_typing(bot: Bot, chat_id: int) -> None:
+    """Muestra "escribiendo..." en el chat sin bloquear al handler"""
+    if not REPLY_TYPING_ACTION:
+        return
+
+    async def _send() -> None:
+        try:
+            await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+        except TelegramError as e:
+            log_error(f"No se pudo enviar la acción de escritura al chat {chat_id}", e)
+
+    task = asyncio.create_task(_send())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+def _is_parse_error(error: BadRequest) -> bool:
+    return "can't parse entities" in str(error).lower()
+
+async def send_reply(bot: Bot, chat_id: int, text: str, parse_mode: Optional[str] = None, reply_markup=None) -> Message:
+    """
+    Envía la respuesta final en un solo mensaje.
+    Si el texto no es Markdown válido (p. ej. generado por Claude) se reenvía sin formato
+    en lugar de fallar y obligar a un segundo mensaje de error.
+    """
+    try:
+        return await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode, reply_markup=reply_markup)
+    except BadRequest as e:
+        if not parse_mode or not _is_parse_error(e):
+            raise
+        return await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+
+async def send_document(bot: Bot, chat_id: int, document: IO[bytes], filename: str,
+                        caption: Optional[str] = None, write_timeout: Optional[float] = None) -> Message:
+    """
+    Envía un archivo abierto sin leerlo completo en memoria: el cliente HTTP lo sube por
+    partes desde el descriptor, que debe seguir abierto hasta que termine el envío
+    """
+    return await bot.send_document(
+        chat_id=chat_id,
+        document=InputFile(document, filename=filename, read_file_handle=False),
+        caption=caption,
+        write_timeout=write_timeout
+    )
+
+async def edit_reply(query: CallbackQuery, text: str, parse_mode: Optional[str] = None, reply_markup=None) -> None:
+    """
+    Edita el mensaje del teclado inline en lugar de enviar uno nuevo.
+    Ignora el error de Telegram cuando el contenido no cambió.
+    """
+    try:
+        await query.edit_message_text(text=text, parse_mode=parse_mode, reply_markup=reply_markup)
+    except BadRequest as e:
+        if "message is not modified" in str(e).lower():
+            return
+        if not parse_mode or not _is_parse_error(e):
+            raise
+        await query.edit_message_text(text=text, reply_markup=reply_markup)
+
+async def edit_message(bot: Bot, chat_id: int, message_id: int, text: str, parse_mode: Optional[str] = None) -> None:
+    """Edita un mensaje enviado por el bot (p. ej. el progreso de una tarea larga)"""
+    try:
+        await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, parse_mode=parse_mode)
+    except BadRequest as e:
+        if "message is not modified" in str(e).lower():
+            return
+        if not parse_mode or not _is_parse_error(e):
+            raise
+        await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text)
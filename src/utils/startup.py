@@ -0,0 +1,46 @@
+"""Medición de la duración de cada fase del arranque"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from src.utils.logger import log_info
+from src.utils.metrics import registry
+
+class StartupTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self._last = self.started
+
+    @contextmanager
+    def phase(self, name: str):
+        """Mide la duración del bloque como una fase del arranque"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last = time.perf_counter()
+            self.phases[name] = self._last - started
+
+    def mark(self, name: str) -> None:
+        """Registra una fase que va desde el fin de la anterior (o el inicio) hasta ahora"""
+        now = time.perf_counter()
+        self.phases[name] = now - self._last
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def log(self) -> None:
+        detail = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases.items())
+        log_info(f"Arranque completado en {self.total * 1000:.0f} ms ({detail})")
+
+startup_timer = StartupTimer()
+
+registry.gauge(
+    "nutribot_startup_phase_seconds", "Duración de cada fase del arranque",
+    lambda: {(name,): seconds for name, seconds in startup_timer.phases.items()},
+    labels=["phase"]
+)
@@ -0,0 +1,76 @@
+"""Zonas horarias y límites de días locales, memorizados por zona"""
+
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+import pytz
+
+from src.utils.metrics import registry
+
+# Límites de días que se memorizan: alcanza para un mes en cientos de zonas horarias
+DAY_BOUNDS_CACHE_SIZE = 8192
+
+@lru_cache(maxsize=None)
+def get_timezone(timezone_str: str) -> pytz.BaseTzInfo:
+    """Zona horaria por nombre (pytz.UnknownTimeZoneError si no existe)"""
+    return pytz.timezone(timezone_str)
+
+def to_local(timestamp: datetime, timezone_str: str) -> datetime:
+    """Convierte una fecha UTC (con o sin tzinfo, como las guarda MongoDB) a la hora local"""
+    if timestamp.tzinfo is None:
+        timestamp = pytz.UTC.localize(timestamp)
+    return timestamp.astimezone(get_timezone(timezone_str))
+
+def to_utc(local_time: datetime, timezone_str: str) -> datetime:
+    """Convierte una hora local (sin tzinfo) o con zona a UTC sin tzinfo, como se guarda en MongoDB"""
+    if local_time.tzinfo is None:
+        local_time = get_timezone(timezone_str).localize(local_time)
+    return local_time.astimezone(pytz.UTC).replace(tzinfo=None)
+
+def local_now(timezone_str: str, now: Optional[datetime] = None) -> datetime:
+    """Hora local actual (o la de now, en UTC) en la zona indicada"""
+    return to_local(now or datetime.utcnow(), timezone_str)
+
+def local_today(timezone_str: str) -> date:
+    return local_now(timezone_str).date()
+
+@lru_cache(maxsize=DAY_BOUNDS_CACHE_SIZE)
+def day_bounds_utc(timezone_str: str, local_date: date) -> Tuple[datetime, datetime]:
+    """Inicio y fin en UTC de un día local"""
+    timezone = get_timezone(timezone_str)
+    start = timezone.localize(datetime.combine(local_date, time.min)).astimezone(pytz.UTC)
+    end = timezone.localize(datetime.combine(local_date, time.max)).astimezone(pytz.UTC)
+    return start, end
+
+def range_bounds_utc(timezone_str: str, first_day: date, last_day: date) -> Tuple[datetime, datetime]:
+    """Inicio del primer día local y fin del último, en UTC"""
+    return day_bounds_utc(timezone_str, first_day)[0], day_bounds_utc(timezone_str, last_day)[1]
+
+def local_times(timezones: Iterable[str], now: Optional[datetime] = None) -> List[datetime]:
+    """Hora local de un lote de usuarios en el mismo instante; cada zona distinta se calcula una vez"""
+    now = now or datetime.utcnow()
+    by_timezone: Dict[str, datetime] = {}
+    result = []
+    for timezone_str in timezones:
+        if timezone_str not in by_timezone:
+            by_timezone[timezone_str] = local_now(timezone_str, now)
+        result.append(by_timezone[timezone_str])
+    return result
+
+def local_hours(timezones: Iterable[str], now: Optional[datetime] = None) -> List[int]:
+    """Versión de local_times que devuelve solo la hora"""
+    return [local_time.hour for local_time in local_times(timezones, now)]
+
+def meal_type_for_hour(hour: int) -> str:
+    """Tipo de comida habitual a una hora local"""
+    if 5 <= hour < 11:
+        return "breakfast"
+    elif 11 <= hour < 15:
+        return "lunch"
+    elif 15 <= hour < 18:
+        return "snack"
+    return "dinner"
+
+registry.gauge("nutribot_timezone_cache_entries", "Zonas horarias en caché", lambda: get_timezone.cache_info().currsize)
+registry.gauge("nutribot_day_bounds_cache_hits", "Límites de días locales servidos desde la caché",
+               lambda: day_bounds_utc.cache_info().hits)
@@ -0,0 +1,211 @@
+"""Trazas livianas por actualización de Telegram"""
+
+import json
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+import httpx
+
+from src.config.settings import TRACE_SLOW_THRESHOLD_MS, TRACE_SINK_PATH, TRACE_OTLP_ENDPOINT
+from src.utils.logger import log_error, log_context
+
+TRACING_ENABLED = bool(TRACE_SINK_PATH or TRACE_OTLP_ENDPOINT)
+
+class Trace:
+    def __init__(self, name: str, update_id: Optional[int] = None, user_id: Optional[int] = None):
+        self.trace_id = secrets.token_hex(16)
+        self.root_span_id = secrets.token_hex(8)
+        self.name = name
+        self.update_id = update_id
+        self.user_id = user_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.spans: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, span: Dict) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns or time.time_ns()
+        return (end_ns - self.start_ns) / 1_000_000
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "update_id": self.update_id,
+            "user_id": self.user_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "spans": spans
+        }
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("nutribot_trace", default=None)
+_current_span_id: ContextVar[Optional[str]] = ContextVar("nutribot_span", default=None)
+
+def current_trace() -> Optional[Trace]:
+    """Traza activa en el contexto actual (o None)"""
+    return _current_trace.get()
+
+@contextmanager
+def trace_scope(name: str, update_id: Optional[int] = None, user_id: Optional[int] = None):
+    """Abre una traza para el trabajo hecho dentro del bloque y la exporta si fue lenta"""
+    if not TRACING_ENABLED:
+        yield None
+        return
+
+    trace = Trace(name, update_id, user_id)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span_id.set(trace.root_span_id)
+    try:
+        with log_context(trace_id=trace.trace_id):
+            yield trace
+    finally:
+        trace.end_ns = time.time_ns()
+        _current_span_id.reset(span_token)
+        _current_trace.reset(trace_token)
+        if trace.duration_ms >= TRACE_SLOW_THRESHOLD_MS:
+            _exporter.submit(trace)
+
+@contextmanager
+def span(kind: str, name: str, **attributes):
+    """Registra un span (db, claude, telegram, handler...) dentro de la traza activa"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    span_id = secrets.token_hex(8)
+    parent_id = _current_span_id.get()
+    token = _current_span_id.set(span_id)
+    start_ns = time.time_ns()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        end_ns = time.time_ns()
+        _current_span_id.reset(token)
+        record = {
+            "span_id": span_id,
+            "parent_id": parent_id,
+            "kind": kind,
+            "name": name,
+            "start_ns": start_ns,
+            "duration_ms": round((end_ns - start_ns) / 1_000_000, 3)
+        }
+        if attributes:
+            record["attributes"] = attributes
+        if error:
+            record["error"] = error
+        trace.add_span(record)
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(values: Dict) -> List[Dict]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in values.items() if value is not None]
+
+def to_otlp(traces: List[Trace]) -> Dict:
+    """Convierte trazas al formato OTLP/JSON (ExportTraceServiceRequest)"""
+    spans = []
+    for trace in traces:
+        data = trace.to_dict()
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": trace.root_span_id,
+            "name": trace.name,
+            "kind": 2,
+            "startTimeUnixNano": str(trace.start_ns),
+            "endTimeUnixNano": str(trace.end_ns or time.time_ns()),
+            "attributes": _otlp_attributes({"telegram.update_id": trace.update_id, "telegram.user_id": trace.user_id})
+        })
+        for record in data["spans"]:
+            end_ns = record["start_ns"] + int(record["duration_ms"] * 1_000_000)
+            attributes = {"nutribot.kind": record["kind"], **record.get("attributes", {})}
+            if "error" in record:
+                attributes["error.type"] = record["error"]
+            spans.append({
+                "traceId": trace.trace_id,
+                "spanId": record["span_id"],
+                "parentSpanId": record["parent_id"] or "",
+                "name": f"{record['kind']}.{record['name']}",
+                "kind": 3,
+                "startTimeUnixNano": str(record["start_ns"]),
+                "endTimeUnixNano": str(end_ns),
+                "attributes": _otlp_attributes(attributes)
+            })
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": "nutribot"})},
+            "scopeSpans": [{"scope": {"name": "nutribot.tracing"}, "spans": spans}]
+        }]
+    }
+
+class TraceExporter:
+    """Exporta trazas lentas desde un hilo propio para no bloquear el event loop"""
+
+    def __init__(self, sink_path: str, otlp_endpoint: str, max_queue: int = 1000):
+        self.sink_path = sink_path
+        self.otlp_endpoint = otlp_endpoint.rstrip("/")
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, trace: Trace) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="nutribot-traces", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            # Si el exportador no da abasto se descartan trazas antes que frenar al bot
+            pass
+
+    def _run(self) -> None:
+        client = httpx.Client(timeout=10) if self.otlp_endpoint else None
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._export(batch, client)
+
+    def _export(self, batch: List[Trace], client: Optional[httpx.Client]) -> None:
+        if self.sink_path:
+            try:
+                with open(self.sink_path, "a", encoding="utf-8") as sink:
+                    for trace in batch:
+                        sink.write(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n")
+            except OSError as e:
+                log_error(f"No se pudieron escribir trazas en {self.sink_path}", e)
+
+        if client:
+            try:
+                client.post(f"{self.otlp_endpoint}/v1/traces", json=to_otlp(batch))
+            except httpx.HTTPError as e:
+                log_error("No se pudieron enviar trazas al colector OTLP", e)
+
+_exporter = TraceExporter(TRACE_SINK_PATH, TRACE_OTLP_ENDPOINT)
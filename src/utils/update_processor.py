@@ -0,0 +1,144 @@
+"""Procesador de actualizaciones concurrente con orden garantizado por chat"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from src.utils.metrics import UPDATE_DURATION
+from src.utils.tracing import trace_scope
+from src.utils.logger import log_context
+from src.utils.profiling import SamplingProfiler
+
+class ChatSequentialUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_waiters: Dict[int, int] = {}
+        # Tareas de las actualizaciones recibidas y cuáles ya empezaron a ejecutar su handler
+        self._tasks: Dict[asyncio.Task, object] = {}
+        self._started: Set[asyncio.Task] = set()
+        self._profiler = SamplingProfiler()
+        # Se invocan al terminar cada actualización (la deduplicación la registra y los
+        # workers del modo multiproceso la confirman)
+        self.done_callbacks: List[Callable[[object], None]] = []
+        # Actualizaciones cuyo handler terminó pero cuyo trabajo sigue en otra tarea (ráfagas de comidas)
+        self._held: Set[int] = set()
+
+    @staticmethod
+    def _sequence_key(update: object) -> Optional[int]:
+        """Clave de ordenación: el chat de la actualización o, si no hay, el usuario"""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+        return None
+
+    @property
+    def waiting_updates(self) -> int:
+        """Actualizaciones en cola o en curso agrupadas por chat"""
+        return sum(self._chat_waiters.values())
+
+    @property
+    def active_updates(self) -> int:
+        """Actualizaciones recibidas que todavía no terminaron (en curso o esperando turno)"""
+        return len(self._tasks)
+
+    def hold(self, update: object) -> Callable[[], None]:
+        """
+        Retrasa el aviso de fin de la actualización hasta que se llame a la función devuelta,
+        para que un worker que cae antes no la dé por procesada
+        """
+        if not isinstance(update, Update):
+            return lambda: None
+        self._held.add(update.update_id)
+
+        def release() -> None:
+            if update.update_id in self._held:
+                self._held.discard(update.update_id)
+                self._notify_done(update)
+        return release
+
+    def _notify_done(self, update: object) -> None:
+        for callback in self.done_callbacks:
+            callback(update)
+
+    def cancel_all(self) -> List[object]:
+        """
+        Cancela todas las actualizaciones sin terminar (apagado del bot) y devuelve las que
+        todavía no habían empezado, para que se puedan guardar y retomar
+        """
+        not_started = []
+        for task, update in list(self._tasks.items()):
+            if task not in self._started:
+                not_started.append(update)
+            task.cancel()
+        return not_started
+
+    async def wait_cancelled(self, timeout: float) -> None:
+        """Espera a que las actualizaciones canceladas terminen de limpiar"""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        task = asyncio.current_task()
+        self._tasks[task] = update
+        try:
+            await self._process_in_order(update, coroutine)
+        except asyncio.CancelledError:
+            if task not in self._started:
+                # El handler nunca empezó: se cierra la corrutina para no dejarla sin esperar
+                coroutine.close()
+            raise
+        finally:
+            self._tasks.pop(task, None)
+            self._started.discard(task)
+
+    async def _process_in_order(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # Se toma el turno del chat antes que el cupo global: así los mensajes encolados
+        # de un mismo chat no ocupan cupos mientras esperan y no frenan a otros usuarios
+        key = self._sequence_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        lock = self._chat_locks.setdefault(key, asyncio.Lock())
+        self._chat_waiters[key] = self._chat_waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                await super().process_update(update, coroutine)
+        finally:
+            self._chat_waiters[key] -= 1
+            if self._chat_waiters[key] == 0:
+                del self._chat_waiters[key]
+                del self._chat_locks[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        update_id = update.update_id if isinstance(update, Update) else None
+        user_id = update.effective_user.id if isinstance(update, Update) and update.effective_user else None
+
+        self._started.add(asyncio.current_task())
+        session = self._profiler.start(update_id)
+        started = time.perf_counter()
+        try:
+            with log_context(update_id=update_id, user_id=user_id), \
+                    trace_scope("update", update_id=update_id, user_id=user_id):
+                await coroutine
+        finally:
+            UPDATE_DURATION.observe(time.perf_counter() - started)
+            if update_id not in self._held:
+                self._notify_done(update)
+            if session:
+                elapsed_ms = self._profiler.finish(session)
+                if elapsed_ms is not None:
+                    # El archivo se escribe fuera del event loop y sin retener el turno del chat
+                    asyncio.get_running_loop().run_in_executor(None, self._profiler.dump, session, elapsed_ms)
+
+    async def initialize(self) -> None:
+        """No requiere recursos"""
+
+    async def shutdown(self) -> None:
+        """No requiere recursos"""
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import threading
+
+import mongomock
+import pymongo
+import pytest
+
+# Configuración mínima para importar los servicios sin Telegram, Claude ni MongoDB reales
+os.environ.setdefault("TELEGRAM_TOKEN", "123:test")
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017/nutribot_test")
+pymongo.MongoClient = mongomock.MongoClient
+
+from src.services.container import services  # noqa: E402
+
+
+def _without_utc(value):
+    """mongomock no implementa timezone en $dateToString; con UTC el resultado es el mismo"""
+    if isinstance(value, dict):
+        return {
+            key: _without_utc(item) for key, item in value.items()
+            if not (key == "timezone" and item == "UTC")
+        }
+    if isinstance(value, list):
+        return [_without_utc(item) for item in value]
+    return value
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Base de datos en memoria, vacía en cada prueba"""
+    database = services.db
+    for name in database.db.list_collection_names():
+        database.db.drop_collection(name)
+    database.ensure_indexes()
+    aggregate = mongomock.collection.Collection.aggregate
+    monkeypatch.setattr(
+        mongomock.collection.Collection, "aggregate",
+        lambda self, pipeline, *args, **kwargs: aggregate(self, _without_utc(pipeline), *args, **kwargs)
+    )
+    return database
+
+
+@pytest.fixture
+def fake_claude():
+    """API de Anthropic falsa (benchmarks/fake_claude.py) en su propio hilo: el cliente de Claude es síncrono"""
+    from benchmarks.fake_claude import FakeAnthropicServer, LatencyModel
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = FakeAnthropicServer(LatencyModel("fixed", 0), batch_seconds=0)
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result(5)
+    yield server
+    asyncio.run_coroutine_threadsafe(server.stop(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+@pytest.fixture
+def claude(fake_claude, monkeypatch):
+    """ClaudeService apuntando a la API falsa, también como services.claude"""
+    from src.services import claude_service
+
+    monkeypatch.setattr(claude_service, "ANTHROPIC_BASE_URL", fake_claude.base_url)
+    monkeypatch.setattr(claude_service.ClaudeService, "_instance", None)
+    service = claude_service.ClaudeService()
+    monkeypatch.setitem(services._instances, "claude", service)
+    yield service
+    service.close()
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from src.models.meal import Meal
+from src.models.user import User
+from src.services.batch_analysis import batch_analyzer
+from src.services.claude_service import ANALYSIS_PROMPT_VERSION
+
+
+def test_batch_results_map_custom_ids_and_failures(claude, fake_claude):
+    fake_claude.batch_results.update({"b": "errored", "c": "expired", "d": "canceled"})
+    batch_id = claude.submit_analysis_batch([
+        ("a", "pollo con arroz", {}), ("b", "pizza", {}), ("c", "ensalada", {}), ("d", "yogur", {"diet_type": "vegana"})
+    ])
+
+    assert claude.analysis_batch_status(batch_id) == "ended"
+    results = dict(claude.analysis_batch_results(batch_id))
+    assert set(results) == {"a", "b", "c", "d"}
+    assert results["a"]["foods"] == ["pollo", "arroz"]
+    assert results["a"]["prompt_version"] == ANALYSIS_PROMPT_VERSION
+    assert "error" not in results["a"]
+    assert results["b"]["error"] == "overloaded_error"
+    assert results["c"]["error"] == "expired"
+    assert results["d"]["error"] == "canceled"
+
+
+def test_batch_in_progress_until_it_ends(claude, fake_claude):
+    fake_claude.batch_seconds = 60
+    batch_id = claude.submit_analysis_batch([("a", "pan", {})])
+
+    assert claude.analysis_batch_status(batch_id) == "in_progress"
+
+
+def test_collect_saves_results_and_requeues_failures(db, claude, fake_claude):
+    db.save_user(User(telegram_id=3, username="u", first_name="U"))
+    meal_ids = [
+        db.save_meal(Meal(telegram_id=3, text=text, meal_type="lunch", timestamp=datetime(2024, 5, 1, 13),
+                          analysis={"summary": "preliminar"}, import_pending=True))
+        for text in ("pollo con arroz", "pizza")
+    ]
+    fake_claude.batch_results[meal_ids[1]] = "expired"
+
+    job_id = batch_analyzer.submit({"import_pending": True}, "import")
+    [record] = db.get_open_analysis_batches([job_id])
+    stats = batch_analyzer.collect(record)
+
+    assert stats == {"updated": 1, "failed": 1, "released": 1}
+    done = db.meals_collection.find_one({"text": "pollo con arroz"})
+    pending = db.meals_collection.find_one({"text": "pizza"})
+    assert done["analyzed"] and not done.get("import_pending") and "analysis_batch" not in done
+    assert pending["import_pending"] and pending["analysis"] == {"summary": "preliminar"}
+    assert "analysis_batch" not in pending
+    assert db.get_open_analysis_batches([job_id]) == []
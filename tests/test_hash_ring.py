@@ -0,0 +1,30 @@
+from src.cluster.hash_ring import HashRing
+
+KEYS = [str(user_id) for user_id in range(2000)]
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing().get_node("1") is None
+
+
+def test_assignment_is_stable_and_spread():
+    ring = HashRing(["0", "1", "2", "3"])
+    owners = {key: ring.get_node(key) for key in KEYS}
+
+    assert owners == {key: HashRing(["3", "2", "1", "0"]).get_node(key) for key in KEYS}
+    counts = [list(owners.values()).count(node) for node in ring.nodes]
+    assert min(counts) > len(KEYS) / 4 * 0.5
+
+
+def test_removing_a_node_only_moves_its_keys_and_adding_it_back_restores_them():
+    ring = HashRing(["0", "1", "2"])
+    before = {key: ring.get_node(key) for key in KEYS}
+
+    ring.remove("1")
+    during = {key: ring.get_node(key) for key in KEYS}
+    assert ring.nodes == ["0", "2"]
+    assert all(during[key] == before[key] for key in KEYS if before[key] != "1")
+    assert "1" not in during.values()
+
+    ring.add("1")
+    assert {key: ring.get_node(key) for key in KEYS} == before
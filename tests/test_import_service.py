@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from src.models.user import User
+from src.services.import_service import import_meals, row_to_meal
+from src.services.reanalysis import selection_query
+
+USER = User(telegram_id=7, username="u", first_name="U", timezone="UTC")
+
+
+async def _noop(stats):
+    pass
+
+
+def _import(path):
+    return asyncio.run(import_meals(str(path), "csv", USER, USER.telegram_id, _noop))
+
+
+def test_reimport_does_not_count_duplicates_in_sources(db, tmp_path):
+    path = tmp_path / "historial.csv"
+    path.write_text(
+        "fecha,comida,proteinas\n"
+        "2024-05-01 08:00,avena con fruta,alto\n"
+        "2024-05-01 13:00,pollo con arroz,\n"
+        "2024-05-02 13:00,ensalada,medio\n",
+        encoding="utf-8"
+    )
+    first = _import(path)
+    again = _import(path)
+
+    assert first["imported"] == 3
+    assert first["file"] + first["cache"] + first["local"] == first["imported"]
+    assert again["duplicates"] == 3
+    assert again["imported"] == again["file"] == again["cache"] == again["local"] == 0
+
+
+def test_imported_analyses_are_not_stale(db, tmp_path):
+    path = tmp_path / "exportado.csv"
+    path.write_text("fecha,comida,proteinas,carbohidratos\n2024-05-01 08:00,avena,bajo,alto\n", encoding="utf-8")
+    _import(path)
+
+    assert db.meals_collection.count_documents({"analyzed": True}) == 1
+    assert db.meals_collection.count_documents(selection_query(["stale"])) == 0
+
+
+@pytest.mark.parametrize("value", [1714550400, 1714550400.0, 1714550400000, "2024-05-01T08:00:00Z"])
+def test_row_to_meal_reads_epoch_seconds_and_milliseconds(value):
+    meal, source = row_to_meal({"date": value, "text": "avena"}, USER, 1)
+
+    assert source == "local"
+    assert meal.timestamp == datetime(2024, 5, 1, 8)
+    assert meal.meal_type == "breakfast"
+
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), 1e30, -1e20, True, "ayer", None])
+def test_row_to_meal_rejects_unparseable_dates(value):
+    assert row_to_meal({"date": value, "text": "avena"}, USER, 1) == (None, "invalid")
+
+
+def test_row_to_meal_uses_user_timezone_and_file_levels():
+    user = User(telegram_id=8, username="u", first_name="U", timezone="America/Mexico_City")
+
+    meal, source = row_to_meal(
+        {"fecha": "01/05/2024", "hora": "13:30", "comida": "tacos", "proteinas": "alto", "alimentos": "tortilla; carne"},
+        user, 1
+    )
+
+    assert source == "file"
+    assert meal.timestamp == datetime(2024, 5, 1, 19, 30)
+    assert meal.analyzed and not meal.import_pending
+    assert meal.analysis["foods"] == ["tortilla", "carne"]
+    assert meal.nutrients["protein"] == 3
+
+
+def test_row_to_meal_treats_exported_preliminary_levels_as_pending():
+    meal, source = row_to_meal({"date": "2024-05-01 13:30", "text": "tacos", "protein": "alto", "analyzed": "false"}, USER, 1)
+
+    assert source == "local"
+    assert meal.import_pending and not meal.analyzed
@@ -0,0 +1,42 @@
+import pytest
+
+from src.models.nutrients import HIGH, LOW, MEDIUM, UNKNOWN, decode_levels, encode_analysis, parse_level
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("alto", HIGH), ("Alto", HIGH), ("high", HIGH), ("Muy alto", HIGH), ("ELEVADA", HIGH),
+    ("medio-alto", MEDIUM), ("moderado", MEDIUM), ("Medium", MEDIUM),
+    ("bajo", LOW), ("Mínimo", LOW), ("nulo", LOW),
+    (1, LOW), (3.0, HIGH), (2.5, UNKNOWN), (4, UNKNOWN), (True, UNKNOWN),
+    ("", UNKNOWN), ("desconocido", UNKNOWN), (None, UNKNOWN), (["alto"], UNKNOWN)
+])
+def test_parse_level(value, expected):
+    assert parse_level(value) == expected
+
+
+def test_encode_analysis_keeps_only_meaningful_raw_text():
+    analysis, nutrients, raw = encode_analysis({
+        "foods": ["pollo"],
+        "nutrients": {"protein": "Alto", "carbs": "muy bajo", "fats": "raro", "fiber": "moderada"},
+        "calories": "450",
+        "grams": {"protein": 30, "carbs": "-5", "fats": "n/d"},
+        "summary": "ok"
+    })
+
+    assert analysis == {"foods": ["pollo"], "summary": "ok"}
+    assert nutrients == {"protein": HIGH, "carbs": LOW, "fats": UNKNOWN, "fiber": MEDIUM, "kcal": 450.0, "protein_g": 30.0}
+    assert raw == {"carbs": "muy bajo", "fats": "raro"}
+
+
+def test_encode_analysis_without_levels():
+    analysis, nutrients, raw = encode_analysis({"error": "overloaded"})
+
+    assert analysis == {"error": "overloaded"}
+    assert nutrients == {} and raw == {}
+    assert encode_analysis(None) == ({}, {}, {})
+
+
+def test_decode_levels_round_trip():
+    _, nutrients, _ = encode_analysis({"nutrients": {"protein": "alto", "carbs": "medio", "fats": "bajo"}})
+
+    assert decode_levels(nutrients) == {"protein": "alto", "carbs": "medio", "fats": "bajo"}
@@ -0,0 +1,80 @@
+from datetime import datetime, time, timedelta
+
+from src.models.nutrients import NUTRIENTS, NUTRIENT_DEFAULTS, has_levels
+from src.services.summary_service import get_day_summary, get_range_summary, level_value
+from src.utils.time_utils import local_today
+
+USER_ID = 42
+
+
+def _meal(minutes, days_ago=0, **fields):
+    today = datetime.combine(local_today("UTC"), time.min)
+    meal = {"telegram_id": USER_ID, "text": "comida", "meal_type": "lunch",
+            "timestamp": today - timedelta(days=days_ago) + timedelta(minutes=minutes), "analyzed": True, "analysis": {}}
+    meal.update(fields)
+    return meal
+
+
+def test_rollups_match_day_summary_for_unmigrated_text_levels(db):
+    db.meals_collection.insert_many([
+        # Guardadas antes de los niveles numéricos
+        _meal(1, analysis={"nutrients": {"protein": "Muy alto", "carbs": "medio-alto", "fats": "Mínimo"}}),
+        _meal(2, analysis={"nutrients": {"protein": "bajo", "carbs": "ALTO", "fats": "raro", "fiber": "Moderada"}}),
+        _meal(3, analysis={"error": "sin respuesta"}),
+        # Ya migradas
+        _meal(4, nutrients={"protein": 1, "carbs": 3, "fats": 0, "fiber": 2}),
+        _meal(5, nutrients={}),
+        _meal(6, analyzed=False, nutrients={"protein": 3}),
+    ])
+    day_start = datetime.combine(local_today("UTC"), time.min)
+    meals = db.get_meals_by_user_and_date(USER_ID, day_start, day_start + timedelta(days=1))
+    expected = {
+        nutrient: sum(level_value(meal.nutrients, nutrient) for meal in meals if meal.analyzed and has_levels(meal.nutrients))
+        for nutrient in NUTRIENTS
+    }
+
+    [rollup] = db.get_daily_rollups(USER_ID, day_start, day_start + timedelta(days=1), "UTC", NUTRIENT_DEFAULTS)
+
+    assert rollup["meals"] == 6
+    assert {nutrient: rollup[nutrient] for nutrient in NUTRIENTS} == expected
+    assert expected == {"protein": 3 + 1 + 1, "carbs": 2 + 3 + 3, "fats": 1 + 2 + 2, "fiber": 1 + 2 + 2}
+    assert get_range_summary(USER_ID, 1, "UTC")["nutrient_summary"] == get_day_summary(USER_ID, "UTC")["nutrient_summary"]
+
+
+def _levels(protein, carbs, fats, fiber):
+    return {"protein": protein, "carbs": carbs, "fats": fats, "fiber": fiber}
+
+
+def test_range_summary_streaks_and_trends(db):
+    # Sin comidas hace 4 días; la proteína sube, las grasas bajan y los carbohidratos no cambian
+    days = {6: 1, 5: 1, 3: 2, 2: 2, 1: 3, 0: 3}
+    db.meals_collection.insert_many([
+        _meal(minutes, days_ago, nutrients=_levels(protein, 2, 4 - protein, 1))
+        for days_ago, protein in days.items() for minutes in (60, 600)
+    ])
+
+    summary = get_range_summary(USER_ID, 7, "UTC")
+
+    assert summary["meals_count"] == 12
+    assert summary["days_logged"] == 6
+    assert summary["meals_per_day"] == 2.0
+    assert (summary["current_streak"], summary["longest_streak"]) == (4, 4)
+    assert summary["nutrient_trends"] == {"protein": "subiendo", "carbs": "estable", "fats": "bajando", "fiber": "estable"}
+    assert summary["nutrient_summary"] == {"protein": "medio", "carbs": "medio", "fats": "medio", "fiber": "bajo"}
+
+
+def test_current_streak_allows_today_without_meals(db):
+    db.meals_collection.insert_many([_meal(60, days_ago, nutrients=_levels(2, 2, 2, 2)) for days_ago in (3, 2, 1)])
+
+    summary = get_range_summary(USER_ID, 7, "UTC")
+
+    assert (summary["current_streak"], summary["longest_streak"]) == (3, 3)
+    assert summary["nutrient_trends"] == dict.fromkeys(NUTRIENTS, "estable")
+
+
+def test_range_summary_streak_broken_before_yesterday(db):
+    db.meals_collection.insert_many([_meal(60, days_ago, nutrients=_levels(2, 2, 2, 2)) for days_ago in (5, 4, 3, 2)])
+
+    summary = get_range_summary(USER_ID, 7, "UTC")
+
+    assert (summary["current_streak"], summary["longest_streak"]) == (0, 4)
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime
+
+from telegram import Chat, Message, Update, User
+
+from src.utils.update_processor import ChatSequentialUpdateProcessor
+
+
+def _update(update_id, chat_id):
+    return Update(update_id, message=Message(
+        update_id, datetime.now(), Chat(chat_id, "private"), from_user=User(chat_id, "u", False), text="hola"
+    ))
+
+
+async def _run(processor, updates, handler):
+    await asyncio.gather(*(processor.process_update(update, handler(update)) for update in updates))
+
+
+def test_updates_of_a_chat_run_in_order_and_chats_run_concurrently():
+    processor = ChatSequentialUpdateProcessor(8)
+    events = []
+    running = {"now": 0, "max": 0}
+
+    async def handler(update):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        events.append(("start", update.effective_chat.id, update.update_id))
+        # Las primeras tardan más: si no se respetara el orden, las siguientes se adelantarían
+        await asyncio.sleep(0.03 if update.update_id < 3 else 0.001)
+        events.append(("end", update.effective_chat.id, update.update_id))
+        running["now"] -= 1
+
+    updates = [_update(update_id, chat_id) for update_id in range(9) for chat_id in (update_id % 3,)]
+    asyncio.run(_run(processor, updates, handler))
+
+    for chat_id in range(3):
+        chat_events = [(kind, update_id) for kind, chat, update_id in events if chat == chat_id]
+        ids = [update.update_id for update in updates if update.effective_chat.id == chat_id]
+        assert chat_events == [(kind, update_id) for update_id in ids for kind in ("start", "end")]
+    assert running["max"] == 3
+    assert processor.active_updates == 0 and processor.waiting_updates == 0
+
+
+def test_concurrency_limit_applies_across_chats():
+    processor = ChatSequentialUpdateProcessor(2)
+    running = {"now": 0, "max": 0}
+
+    async def handler(update):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+
+    asyncio.run(_run(processor, [_update(update_id, update_id) for update_id in range(6)], handler))
+
+    assert running["max"] == 2
+
+
+def test_held_updates_are_reported_done_on_release():
+    processor = ChatSequentialUpdateProcessor(4)
+    done = []
+    processor.done_callbacks.append(lambda update: done.append(update.update_id))
+    releases = []
+
+    async def handler(update):
+        if update.update_id == 1:
+            releases.append(processor.hold(update))
+
+    asyncio.run(_run(processor, [_update(1, 5), _update(2, 5)], handler))
+    assert done == [2]
+
+    releases[0]()
+    releases[0]()
+    assert done == [2, 1]